@@ -3,7 +3,13 @@ import subprocess
 import json
 import tempfile
 import pkgutil
-from copy import deepcopy
+import functools
+import contextvars
+import time
+from . import manifest, preview, vox
+from .cache import RenderCache, RenderRegistry, render_key, scale_outputs
+from .diskgc import touch
+from .trace import tracer, total_size
 
 
 def get_executable_prefix():
@@ -15,16 +21,44 @@ def get_executable_prefix():
 PREFIX = get_executable_prefix()
 GORENDER_PATH = os.path.join(PREFIX, "gorender")
 CARGOPOSITOR_PATH = os.path.join(PREFIX, "positor")
-LAYERFILTER_PATH = os.path.join(PREFIX, "layer-filter")
+# "preview" swaps gorender for the approximate NumPy renderer, e.g. for quick iteration or CI without the binaries
+RENDERER = os.environ.get("AGRF_RENDERER", "gorender")
+# The render cache is opt-in: a shared directory is only useful, and only safe to write to, if the build names it
+RENDER_CACHE_PATH = os.environ.get("AGRF_RENDER_CACHE_PATH") or None
+
+render_cache = RenderCache(RENDER_CACHE_PATH) if RENDER_CACHE_PATH else None
+render_registry = RenderRegistry()
+
+
+def set_render_cache(path):
+    global render_cache
+    render_cache = None if path is None else RenderCache(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_json(path, stamp):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_json(path):
+    stat = os.stat(path)
+    return _load_json(os.path.abspath(path), (stat.st_mtime_ns, stat.st_size))
 
 
 class Config:
+    """
+    A gorender config plus the `agrf_*` settings consumed by agrf itself.
+
+    Configs are copy-on-write: everything below the top-level dict may be shared with other configs (and with the
+    parsed JSON file it came from), so derived configs replace nested values instead of mutating them.
+    """
+
     def __init__(self, load_from=None, config=None):
         if load_from is None:
             self.config = {}
         else:
-            with open(load_from) as f:
-                self.config = json.load(f)
+            self.config = dict(load_json(load_from))
         if config is not None:
             self.config.update(config)
 
@@ -38,10 +72,10 @@ class Config:
         return self._final_config
 
     def copy(self):
-        return Config(config=deepcopy(self.config))
+        return Config(config=self.config)
 
     def subset(self):
-        new_config = deepcopy(self.config)
+        new_config = dict(self.config)
 
         if "agrf_subset" in new_config:
             indices = new_config["agrf_subset"]
@@ -53,17 +87,60 @@ class Config:
         return new_config
 
 
-def render(config, vox_path, output_path=None):
+def default_jobs():
+    return int(os.environ.get("AGRF_JOBS", 0)) or os.cpu_count() or 1
+
+
+class ToolRun:
+    def __init__(self, args, returncode, stdout, stderr, duration):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+
+    def __repr__(self):
+        return f"<ToolRun:{os.path.basename(self.args[0])}:{self.returncode}:{self.duration:.3f}s>"
+
+
+# A list to capture tool output and timings into, instead of letting it through to the terminal; see agrf.gorender.aio
+tool_log = contextvars.ContextVar("tool_log", default=None)
+
+
+def run_tool(args):
+    log = tool_log.get()
+    with tracer.subprocess():
+        if log is None:
+            subprocess.run(args, check=True)
+            return
+        start = time.perf_counter()
+        result = subprocess.run(args, capture_output=True, text=True)
+        log.append(ToolRun(args, result.returncode, result.stdout, result.stderr, time.perf_counter() - start))
+        result.check_returncode()
+
+
+def render(config, vox_path, output_path=None, scales=None):
+    with tracer.span("render", "gorender", input=vox_path, output=output_path) as span:
+        if tracer.enabled:
+            span["input_size"] = total_size([vox_path])
+        do_render(config, vox_path, output_path, scales, span)
+        if tracer.enabled and output_path is not None:
+            span["output_size"] = sum(total_size(scale_outputs(output_path, scale)) for scale in span["scales"])
+
+
+def do_render(config, vox_path, output_path, scales, span):
     if output_path is not None:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         output_clause = ["-o", output_path]
     else:
         output_clause = []
 
-    scales = ",".join(map(str, config.config.get("agrf_scales", [1])))
+    if scales is None:
+        scales = [1] if config is None else config.config.get("agrf_scales", [1])
+    span["scales"] = list(scales)
 
     if config is None:
-        subprocess.run([GORENDER_PATH, "-s", scales, "-p"] + output_clause + [vox_path], check=True)
+        run_tool([GORENDER_PATH, "-s", ",".join(map(str, scales)), "-p"] + output_clause + [vox_path])
         return
 
     if config.config.get("agrf_palette"):
@@ -71,107 +148,205 @@ def render(config, vox_path, output_path=None):
     else:
         palette_clause = []
 
+    if output_path is None:
+        run_gorender(config, vox_path, scales, palette_clause, output_path)
+        return
+
+    renderer = preview.__file__ if RENDERER == "preview" else GORENDER_PATH
+    keys = {
+        scale: render_key(vox_path, config.final_config, scale, config.config.get("agrf_palette"), renderer)
+        for scale in scales
+    }
+    with render_registry.holding(keys.values()):
+        hits = {scale: restore_render(keys[scale], output_path, scale) for scale in scales}
+        missing = [scale for scale in scales if hits[scale] is None]
+        span["hits"] = {str(scale): hit or "miss" for scale, hit in hits.items()}
+        if len(missing) > 0:
+            # Outputs may be hard-linked to other renders or into the cache; never let gorender write through them
+            for scale in missing:
+                for path in scale_outputs(output_path, scale):
+                    os.unlink(path)
+
+            run_gorender(config, vox_path, missing, palette_clause, output_path)
+
+            if render_cache is not None:
+                for scale in missing:
+                    render_cache.store(keys[scale], output_path, scale)
+
+        for scale in scales:
+            render_registry.register(keys[scale], output_path, scale)
+            touch(*scale_outputs(output_path, scale))
+
+
+def restore_render(key, output_path, scale):
+    """Bring back an earlier render of `key`; returns where it came from, or None if it has to be rendered."""
+    if render_registry.alias(key, output_path, scale):
+        return "alias"
+    if render_cache is not None and render_cache.restore(key, output_path, scale):
+        return "cache"
+    return None
+
+
+def run_gorender(config, vox_path, scales, palette_clause, output_path):
+    if RENDERER == "preview":
+        with tracer.span("preview", "gorender", input=vox_path):
+            preview.render_sheets(config.final_config, vox_path, output_path or os.path.splitext(vox_path)[0], scales)
+        return
+
+    output_clause = [] if output_path is None else ["-o", output_path]
     with tempfile.NamedTemporaryFile("w") as f:
         json.dump(config.final_config, f)
         f.flush()
-        subprocess.run(
-            [GORENDER_PATH, "-s", scales, "-m", f.name, "-p"] + palette_clause + output_clause + [vox_path], check=True
+        run_tool(
+            [GORENDER_PATH, "-s", ",".join(map(str, scales)), "-m", f.name, "-p"]
+            + palette_clause
+            + output_clause
+            + [vox_path]
         )
 
 
-def positor(config, vox_path, new_path):
-    # FIXME: new_path isn't the .vox file path, but its containing directory
-    # if "file" in config["operations"][0]:
-    #     other = config["operations"][0]["file"]
-    #     try:
-    #         if os.path.getmtime(vox_path) < os.path.getmtime(new_path) and os.path.getmtime(other) < os.path.getmtime(
-    #             new_path
-    #         ):
-    #             return
-    #     except:
-    #         pass
-    # else:
-    #     try:
-    #         if os.path.getmtime(vox_path) < os.path.getmtime(new_path):
-    #             return
-    #     except:
-    #         pass
-
-    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-
-    conf = config.copy()
-    conf["files"] = [vox_path]
+def positor_output(vox_path, new_path, operation):
+    stem = os.path.splitext(os.path.basename(vox_path))[0]
+    return os.path.join(new_path, f"{stem}{operation['name']}.vox")
+
+
+def positor_inputs(vox_path, operation):
+    return [vox_path] + ([operation["file"]] if "file" in operation else [])
+
+
+def positor_many(vox_path, jobs):
+    """
+    Run `(operation, new_path)` jobs that all read `vox_path`, with a single positor process.
+
+    Each operation still produces its own output in its own directory; sharing the process saves a spawn and a parse
+    of the input per extra job. Jobs whose outputs are up-to-date are dropped.
+    """
+    with tracer.span("positor", "gorender", input=vox_path, jobs=len(jobs)) as span:
+        do_positor_many(vox_path, jobs, span)
+    for operation, new_path in jobs:
+        output = positor_output(vox_path, new_path, operation)
+        touch(output, manifest.manifest_path(output))
+
+
+def do_positor_many(vox_path, jobs, span):
+    jobs = [
+        (operation, new_path)
+        for operation, new_path in jobs
+        if not manifest.is_fresh(
+            positor_output(vox_path, new_path, operation),
+            operation,
+            positor_inputs(vox_path, operation),
+            CARGOPOSITOR_PATH,
+        )
+    ]
+    span["fresh"] = span["jobs"] - len(jobs)
+    if len(jobs) == 0:
+        return
+
+    for _, new_path in jobs:
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+
+    if len(set(new_path for _, new_path in jobs)) == 1:
+        run_positor([operation for operation, _ in jobs], vox_path, jobs[0][1])
+    else:
+        # Give every operation a unique name in a scratch directory, then move the outputs where they belong
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(jobs[0][1])) as scratch:
+            renamed = [{**operation, "name": f"{operation['name']}.{i}"} for i, (operation, _) in enumerate(jobs)]
+            run_positor(renamed, vox_path, scratch)
+            for (operation, new_path), scratch_operation in zip(jobs, renamed):
+                os.makedirs(new_path, exist_ok=True)
+                os.replace(
+                    positor_output(vox_path, scratch, scratch_operation), positor_output(vox_path, new_path, operation)
+                )
+
+    outputs = [positor_output(vox_path, new_path, operation) for operation, new_path in jobs]
+    for output, (operation, _) in zip(outputs, jobs):
+        manifest.record(output, operation, positor_inputs(vox_path, operation), CARGOPOSITOR_PATH)
+
+    if tracer.enabled:
+        span["input_size"] = total_size(
+            set(path for operation, _ in jobs for path in positor_inputs(vox_path, operation))
+        )
+        span["output_size"] = total_size(outputs)
+
+
+def run_positor(operations, vox_path, new_path):
     with tempfile.NamedTemporaryFile("w") as f:
-        json.dump(conf, f)
+        json.dump({"operations": operations, "files": [vox_path]}, f)
         f.flush()
-        subprocess.run([CARGOPOSITOR_PATH, "-o", new_path, f.name], check=True)
+        run_tool([CARGOPOSITOR_PATH, "-o", new_path, f.name])
 
 
-def hill_positor_1(vox_path, new_path, degree):
-    config = {"operations": [{"name": "", "type": "rotate_y", "angle": degree}]}
-
-    positor(config, vox_path, new_path)
+def positor(config, vox_path, new_path):
+    positor_many(vox_path, [(operation, new_path) for operation in config["operations"]])
 
 
-def stairstep(vox_path, new_path, x_steps):
-    config = {"operations": [{"name": "", "type": "stairstep", "x_steps": x_steps, "z_steps": 1}]}
+def rotate_y_operation(degree):
+    return {"name": "", "type": "rotate_y", "angle": degree}
 
-    positor(config, vox_path, new_path)
 
+def stairstep_operation(x_steps):
+    return {"name": "", "type": "stairstep", "x_steps": x_steps, "z_steps": 1}
 
-def compose(vox_path, subvox_path, new_path, extra_config):
-    config = {"operations": [{"name": "", "type": "repeat", "n": 1, "file": subvox_path, **extra_config}]}
 
-    positor(config, vox_path, new_path)
+def compose_operation(subvox_path, extra_config):
+    return {"name": "", "type": "repeat", "n": 1, "file": subvox_path, **extra_config}
 
 
-def self_compose(vox_path, new_path, extra_config):
-    config = {
-        "operations": [
-            {
-                "name": "",
-                "type": "repeat",
-                "n": 1,
-                "file": vox_path,
-                "ignore_mask": True,
-                "overwrite": True,
-                **extra_config,
-            }
-        ]
+def self_compose_operation(vox_path, extra_config):
+    return {
+        "name": "",
+        "type": "repeat",
+        "n": 1,
+        "file": vox_path,
+        "ignore_mask": True,
+        "overwrite": True,
+        **extra_config,
     }
 
-    positor(config, vox_path, new_path)
+
+def produce_empty_operation():
+    return {"name": "", "type": "produce_empty"}
+
+
+def hill_positor_1(vox_path, new_path, degree):
+    positor({"operations": [rotate_y_operation(degree)]}, vox_path, new_path)
+
+
+def stairstep(vox_path, new_path, x_steps):
+    positor({"operations": [stairstep_operation(x_steps)]}, vox_path, new_path)
+
+
+def compose(vox_path, subvox_path, new_path, extra_config):
+    positor({"operations": [compose_operation(subvox_path, extra_config)]}, vox_path, new_path)
+
+
+def self_compose(vox_path, new_path, extra_config):
+    positor({"operations": [self_compose_operation(vox_path, extra_config)]}, vox_path, new_path)
 
 
 def produce_empty(vox_path, new_path):
-    config = {"operations": [{"name": "", "type": "produce_empty"}]}
+    positor({"operations": [produce_empty_operation()]}, vox_path, new_path)
 
-    positor(config, vox_path, new_path)
+
+def layer_filter(flag, layers, vox_path, new_path):
+    with tracer.span(f"{flag}_layers", "gorender", input=vox_path, output=new_path, layers=list(layers)) as span:
+        operation = {flag: list(layers)}
+        # The filter lives in agrf now, so outputs go stale whenever its implementation changes
+        span["fresh"] = manifest.is_fresh(new_path, operation, [vox_path], vox.__file__)
+        touch(new_path, manifest.manifest_path(new_path))
+        if span["fresh"]:
+            return
+        vox.filter_layers(vox_path, new_path, **{flag: set(layers)})
+        manifest.record(new_path, operation, [vox_path], vox.__file__)
+        if tracer.enabled:
+            span["input_size"] = total_size([vox_path])
+            span["output_size"] = total_size([new_path])
 
 
 def discard_layers(discards, vox_path, new_path):
-    try:
-        if os.path.getmtime(vox_path) < os.path.getmtime(new_path):
-            return
-    except:
-        pass
-    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-    subprocess.run(
-        [LAYERFILTER_PATH, "--source", vox_path, "--destination", new_path]
-        + [x for discard in discards for x in ["--discard", discard]],
-        check=True,
-    )
+    layer_filter("discard", discards, vox_path, new_path)
 
 
 def keep_layers(keeps, vox_path, new_path):
-    try:
-        if os.path.getmtime(vox_path) < os.path.getmtime(new_path):
-            return
-    except:
-        pass
-    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-    subprocess.run(
-        [LAYERFILTER_PATH, "--source", vox_path, "--destination", new_path]
-        + [x for keep in keeps for x in ["--keep", keep]],
-        check=True,
-    )
+    layer_filter("keep", keeps, vox_path, new_path)
@@ -0,0 +1,98 @@
+"""
+Awaitable versions of the gorender, positor and layer filtering steps.
+
+Each step runs on a worker thread, so the event loop stays free for other work (e.g. compositing sprites) while tools
+run; a semaphore bounds how many steps run at once. Tool output and timings of every step are kept on its `Job`
+rather than printed:
+
+    pool = ToolPool(8)
+    await asyncio.gather(pool.render(config, vox_path, output_path), pool.discard_layers(["x"], vox_path, new_path))
+    for job in pool.jobs:
+        print(job.name, job.duration, [run.stderr for run in job.runs])
+"""
+
+import asyncio
+import time
+import weakref
+from . import default_jobs, discard_layers, keep_layers, positor, positor_many, render, tool_log
+
+
+class Job:
+    def __init__(self, name):
+        self.name = name
+        self.runs = []
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return f"<Job:{self.name}>"
+
+
+class ToolPool:
+    def __init__(self, limit=None):
+        self.semaphore = asyncio.Semaphore(limit or default_jobs())
+        self.jobs = []
+
+    async def run(self, name, func, *args, **kwargs):
+        """Run `func(*args, **kwargs)` on a worker thread once a slot is free, capturing the tools it runs."""
+        async with self.semaphore:
+            job = Job(name)
+            self.jobs.append(job)
+
+            def call():
+                # asyncio.to_thread runs this in a copy of the caller's context, so the log stays with this job
+                tool_log.set(job.runs)
+                return func(*args, **kwargs)
+
+            job.start = time.perf_counter()
+            try:
+                return await asyncio.to_thread(call)
+            except Exception as e:
+                job.error = e
+                raise
+            finally:
+                job.duration = time.perf_counter() - job.start
+
+    async def render(self, config, vox_path, output_path=None, scales=None):
+        return await self.run(f"render {vox_path}", render, config, vox_path, output_path, scales)
+
+    async def positor(self, config, vox_path, new_path):
+        return await self.run(f"positor {vox_path}", positor, config, vox_path, new_path)
+
+    async def positor_many(self, vox_path, jobs):
+        return await self.run(f"positor {vox_path}", positor_many, vox_path, jobs)
+
+    async def discard_layers(self, discards, vox_path, new_path):
+        return await self.run(f"discard_layers {vox_path}", discard_layers, discards, vox_path, new_path)
+
+    async def keep_layers(self, keeps, vox_path, new_path):
+        return await self.run(f"keep_layers {vox_path}", keep_layers, keeps, vox_path, new_path)
+
+
+# Semaphores belong to one event loop
+__pools = weakref.WeakKeyDictionary()
+
+
+def default_pool():
+    """The `ToolPool` shared by everything running on the current event loop, `AGRF_JOBS` steps at a time."""
+    loop = asyncio.get_running_loop()
+    if loop not in __pools:
+        __pools[loop] = ToolPool()
+    return __pools[loop]
+
+
+async def render_async(config, vox_path, output_path=None, scales=None):
+    return await default_pool().render(config, vox_path, output_path, scales)
+
+
+async def positor_async(config, vox_path, new_path):
+    return await default_pool().positor(config, vox_path, new_path)
+
+
+async def discard_layers_async(discards, vox_path, new_path):
+    return await default_pool().discard_layers(discards, vox_path, new_path)
+
+
+async def keep_layers_async(keeps, vox_path, new_path):
+    return await default_pool().keep_layers(keeps, vox_path, new_path)
@@ -0,0 +1,71 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import pytest
+from unittest.mock import patch
+from agrf.gorender import run_tool
+from agrf.gorender.aio import ToolPool
+from agrf.graphics.voxel import LazyVoxel
+
+
+def python_tool(code):
+    return [sys.executable, "-c", code]
+
+
+def test_jobs_capture_tool_output():
+    async def main():
+        pool = ToolPool(2)
+        await asyncio.gather(
+            pool.run("a", run_tool, python_tool("import sys; sys.stderr.write('from a')")),
+            pool.run("b", run_tool, python_tool("import sys; sys.stderr.write('from b')")),
+        )
+        with pytest.raises(subprocess.CalledProcessError) as e:
+            await pool.run("c", run_tool, python_tool("import sys; sys.stderr.write('broken'); sys.exit(3)"))
+        assert e.value.stderr == "broken"
+        return pool
+
+    pool = asyncio.run(main())
+    assert {job.name: [run.stderr for run in job.runs] for job in pool.jobs} == {
+        "a": ["from a"],
+        "b": ["from b"],
+        "c": ["broken"],
+    }
+    assert all(job.duration >= job.runs[0].duration for job in pool.jobs)
+    assert isinstance(pool.jobs[2].error, subprocess.CalledProcessError)
+
+
+def test_pool_limits_concurrent_steps():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def step():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.pop()
+
+    async def main():
+        pool = ToolPool(2)
+        await asyncio.gather(*(pool.run(str(i), step) for i in range(6)))
+
+    asyncio.run(main())
+    assert max(peak) == 2
+
+
+def test_lazy_voxel_render_async():
+    config = {"sprites": [{"width": 8, "angle": 0}], "size": {"x": 4, "y": 4, "z": 4}, "agrf_scales": [1, 2]}
+    voxels = [LazyVoxel(f"v{i}", prefix="/base", voxel_getter=lambda: "/src/v.vox", config=config) for i in range(3)]
+
+    with patch("agrf.graphics.voxel.render") as render:
+
+        async def main():
+            await asyncio.gather(*(voxel.render_async() for voxel in voxels))
+
+        asyncio.run(main())
+
+    assert render.call_count == 3
+    assert all(voxel.rendered for voxel in voxels)
@@ -0,0 +1,176 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+from .diskgc import UNIT_MARKER, touch
+
+__DIGESTS = {}
+__DIGESTS_LOCK = threading.Lock()
+
+
+def file_digest(path):
+    """sha256 of a file's content, memoized for as long as its size and mtime stay the same."""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with __DIGESTS_LOCK:
+        cached = __DIGESTS.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with __DIGESTS_LOCK:
+        __DIGESTS[path] = (stamp, digest)
+    return digest
+
+
+def optional_file_digest(path):
+    if path is None or not os.path.exists(path):
+        return None
+    return file_digest(path)
+
+
+def json_digest(thing):
+    return hashlib.sha256(json.dumps(thing, sort_keys=True).encode()).hexdigest()
+
+
+def scale_outputs(output_path, scale):
+    return sorted(glob.glob(f"{glob.escape(output_path)}_{scale}x_*.png"))
+
+
+def link_or_copy(src, dst):
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def render_key(vox_path, final_config, scale, palette, binary):
+    return json_digest(
+        {
+            "vox": file_digest(vox_path),
+            # `agrf_*` entries are consumed by agrf itself and never reach the renderer
+            "config": {k: v for k, v in final_config.items() if not k.startswith("agrf_")},
+            "scale": scale,
+            "palette": [palette, optional_file_digest(palette)],
+            "binary": optional_file_digest(binary),
+        }
+    )
+
+
+def link_outputs(src_path, dst_path, scale):
+    outputs = scale_outputs(src_path, scale)
+    if not outputs:
+        return False
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    prefix_len = len(f"{src_path}_{scale}x_")
+    for path in outputs:
+        link_or_copy(path, f"{dst_path}_{scale}x_{path[prefix_len:]}")
+    return True
+
+
+class RenderRegistry:
+    """
+    In-process map from render keys to the first output path rendered for them.
+
+    LazyVoxels reached along different code paths often end up with the same voxel and the same config under
+    different prefixes; the later ones get hard links to the first set of PNGs instead of a render of their own.
+    """
+
+    def __init__(self):
+        self.outputs = {}
+        self.owners = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def holding(self, keys):
+        # Equivalent renders wait for each other instead of racing
+        with self.lock:
+            locks = [self.locks.setdefault(key, threading.Lock()) for key in sorted(set(keys))]
+        with contextlib.ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
+
+    def alias(self, key, output_path, scale):
+        with self.lock:
+            first = self.outputs.get(key)
+            # The first output may since have been overwritten by a different render
+            if first is None or self.owners.get((first, scale)) != key:
+                return False
+        if first == output_path:
+            return len(scale_outputs(output_path, scale)) > 0
+        return link_outputs(first, output_path, scale)
+
+    def register(self, key, output_path, scale):
+        with self.lock:
+            self.owners[(output_path, scale)] = key
+            if self.owners.get((self.outputs.get(key), scale)) != key:
+                self.outputs[key] = output_path
+
+
+class RenderCache:
+    """
+    Content-addressed store for gorender outputs.
+
+    One entry holds the PNGs gorender writes for a single scale; it is keyed by everything that can change them.
+    Files are hard-linked in and out of the store whenever possible, so hits cost no copying.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def entry(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def restore(self, key, output_path, scale):
+        entry = self.entry(key)
+        try:
+            with open(os.path.join(entry, UNIT_MARKER)) as f:
+                names = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            names = []
+        paths = [os.path.join(entry, name) for name in names]
+        if not paths or not all(os.path.exists(path) for path in paths):
+            # Missing or partly deleted; whatever is left goes, so that the next store can replace it
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        try:
+            for name, path in zip(names, paths):
+                link_or_copy(path, f"{output_path}_{scale}x_{name}")
+        except FileNotFoundError:
+            return False
+        touch(os.path.join(entry, UNIT_MARKER), *paths)
+        return True
+
+    def store(self, key, output_path, scale):
+        outputs = scale_outputs(output_path, scale)
+        if not outputs:
+            return
+        entry = self.entry(key)
+        staging = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(staging, exist_ok=True)
+        prefix_len = len(f"{output_path}_{scale}x_")
+        names = [path[prefix_len:] for path in outputs]
+        for path, name in zip(outputs, names):
+            link_or_copy(path, os.path.join(staging, name))
+        # Lists what a complete entry holds, and marks the entry as a unit for agrf.gorender.diskgc
+        with open(os.path.join(staging, UNIT_MARKER), "w") as f:
+            json.dump({"files": names}, f)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Someone else stored the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+        touch(*(os.path.join(entry, name) for name in os.listdir(entry)))
@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+from agrf import gorender
+from agrf.gorender import Config, render
+from agrf.gorender.cache import RenderCache, RenderRegistry
+
+
+def fake_gorender(calls):
+    def run(args, check):
+        calls.append(args)
+        scales = args[args.index("-s") + 1].split(",")
+        output_path = args[args.index("-o") + 1]
+        for scale in scales:
+            for suffix in ["8bpp", "32bpp", "mask"]:
+                with open(f"{output_path}_{scale}x_{suffix}.png", "w") as f:
+                    f.write(f"{scale}-{suffix}")
+
+    return run
+
+
+def test_render_cache_restores_outputs_without_rendering(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    config = Config(config={"sprites": [{"angle": 0, "width": 8}], "agrf_scales": [1, 2]})
+    calls = []
+
+    monkeypatch.setattr(gorender, "render_cache", RenderCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    with patch("agrf.gorender.subprocess.run", fake_gorender(calls)):
+        render(config, str(vox_path), str(tmp_path / "a" / "model"))
+        # A fresh registry, as in the next build, so the outputs cannot be aliased from the first render
+        monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+        render(config, str(vox_path), str(tmp_path / "b" / "model"))
+
+    assert len(calls) == 1
+    cached = {os.stat(os.path.join(d, f)).st_ino for d, _, fs in os.walk(tmp_path / "cache") for f in fs}
+    for scale in [1, 2]:
+        for suffix in ["8bpp", "32bpp", "mask"]:
+            restored = tmp_path / "b" / f"model_{scale}x_{suffix}.png"
+            assert restored.read_text() == f"{scale}-{suffix}"
+            assert restored.stat().st_ino in cached
+
+
+def test_render_cache_misses_on_changed_input(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    config = Config(config={"sprites": [{"angle": 0, "width": 8}], "agrf_scales": [1]})
+    calls = []
+
+    monkeypatch.setattr(gorender, "render_cache", RenderCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    with patch("agrf.gorender.subprocess.run", fake_gorender(calls)):
+        render(config, str(vox_path), str(tmp_path / "out" / "model"))
+        vox_path.write_bytes(b"VOX model, edited")
+        render(config, str(vox_path), str(tmp_path / "out" / "model"))
+        render(Config(config={**config.config, "z_scale": 2.0}), str(vox_path), str(tmp_path / "out" / "model"))
+
+    assert len(calls) == 3
+
+
+def test_render_cache_misses_on_partly_deleted_entry(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    config = Config(config={"sprites": [{"angle": 0, "width": 8}], "agrf_scales": [1]})
+    cache = RenderCache(str(tmp_path / "cache"))
+    calls = []
+
+    monkeypatch.setattr(gorender, "render_cache", cache)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    with patch("agrf.gorender.subprocess.run", fake_gorender(calls)):
+        render(config, str(vox_path), str(tmp_path / "a" / "model"))
+        (entry,) = [dirpath for dirpath, _, names in os.walk(cache.path) if names]
+        os.unlink(os.path.join(entry, "mask.png"))
+
+        monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+        render(config, str(vox_path), str(tmp_path / "b" / "model"))
+
+    # The incomplete entry is not a hit; it is rendered again and stored whole
+    assert len(calls) == 2
+    assert (tmp_path / "b" / "model_1x_mask.png").read_text() == "1-mask"
+    assert sorted(os.listdir(entry)) == ["32bpp.png", "8bpp.png", "entry.json", "mask.png"]
+
+
+def test_render_registry_shares_equivalent_renders(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    calls = []
+
+    monkeypatch.setattr(gorender, "render_cache", None)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    with patch("agrf.gorender.subprocess.run", fake_gorender(calls)):
+        # Same voxel and renderer config, different prefixes and agrf-only settings
+        render(Config(config={"sprites": [{"angle": 0}], "agrf_scales": [1]}), str(vox_path), str(tmp_path / "a" / "m"))
+        render(
+            Config(config={"sprites": [{"angle": 0}], "agrf_scales": [1, 2]}), str(vox_path), str(tmp_path / "b" / "m")
+        )
+        render(Config(config={"sprites": [{"angle": 0}], "agrf_scales": [2]}), str(vox_path), str(tmp_path / "c" / "m"))
+
+    assert [call[call.index("-s") + 1] for call in calls] == ["1", "2"]
+    first = tmp_path / "a" / "m_1x_32bpp.png"
+    aliased = tmp_path / "b" / "m_1x_32bpp.png"
+    assert aliased.read_text() == "1-32bpp"
+    assert aliased.stat().st_ino == first.stat().st_ino
+    assert (tmp_path / "c" / "m_2x_mask.png").read_text() == "2-mask"
+
+
+def test_render_registry_forgets_overwritten_outputs(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    config = Config(config={"sprites": [{"angle": 0}]})
+    calls = []
+
+    monkeypatch.setattr(gorender, "render_cache", None)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    with patch("agrf.gorender.subprocess.run", fake_gorender(calls)):
+        render(config, str(vox_path), str(tmp_path / "a" / "m"))
+        render(Config(config={**config.config, "z_scale": 2.0}), str(vox_path), str(tmp_path / "a" / "m"))
+        render(config, str(vox_path), str(tmp_path / "b" / "m"))
+
+    assert len(calls) == 3
+
+
+def test_render_cache_is_opt_in(monkeypatch):
+    monkeypatch.delenv("AGRF_RENDER_CACHE_PATH", raising=False)
+    code = "from agrf import gorender; print(gorender.render_cache)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "None"
@@ -0,0 +1,238 @@
+"""
+Keep build output trees within a disk budget.
+
+Every file a build produces or reuses (renders, positor and layer filter outputs, their manifests, render cache
+entries, ...) is touched in a journal. Once saved, the journal knows when each file was last used and which files the
+latest build used. `collect` then deletes files the latest build did not use, least recently used first, until the
+trees fit in the budget:
+
+    AGRF_RENDER_CACHE_PATH=/var/cache/agrf AGRF_GC_BUDGET=20G AGRF_GC_ROOTS=build:/var/cache/agrf python build.py
+    python -m agrf.gorender.diskgc --budget 20G build /var/cache/agrf
+
+A build that dies of an uncaught exception neither saves its journal nor collects, as it did not use all it needs.
+
+Files never seen by the journal are left alone unless asked for, so pointing a root at sources is not destructive. A
+directory holding a `UNIT_MARKER` file (such as a render cache entry) is only usable whole, so it is kept or deleted as
+one, together with any files hard-linked to it.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+JOURNAL_PATH = os.environ.get("AGRF_GC_JOURNAL", os.path.join(".cache", "agrf-journal.json"))
+UNIT_MARKER = "entry.json"
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text):
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+class Journal:
+    """The files touched by this build, merged on `save` into a persistent record of when each was last used."""
+
+    def __init__(self):
+        self.enabled = False
+        self.touched = set()
+        self.lock = threading.Lock()
+
+    def touch(self, *paths):
+        if not self.enabled:
+            return
+        paths = [os.path.abspath(path) for path in paths]
+        with self.lock:
+            self.touched.update(paths)
+
+    def save(self, path=None):
+        path = path or JOURNAL_PATH
+        data = load_journal(path)
+        data["builds"] += 1
+        now = time.time()
+        with self.lock:
+            for touched in self.touched:
+                data["paths"][touched] = [data["builds"], now]
+            self.touched = set()
+        write_journal(path, data)
+        return data
+
+
+def load_journal(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"builds": 0, "paths": {}}
+
+
+def write_journal(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+journal = Journal()
+
+
+def touch(*paths):
+    journal.touch(*paths)
+
+
+def collect(roots, budget, journal_path=None, *, include_unknown=False, dry_run=False):
+    """
+    Delete files under `roots` that the latest saved build did not use, least recently used first, until the files
+    left take at most `budget` bytes. Hard links are accounted once, and units are only deleted whole. Returns
+    `(deleted paths, bytes left)`.
+    """
+    journal_path = os.path.abspath(journal_path or JOURNAL_PATH)
+    data = load_journal(journal_path)
+    paths = data["paths"]
+
+    inodes = {}
+    units = []
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            unit = [] if UNIT_MARKER in filenames else None
+            for name in filenames:
+                path = os.path.abspath(os.path.join(dirpath, name))
+                if path == journal_path:
+                    continue
+                st = os.lstat(path)
+                key = (st.st_dev, st.st_ino)
+                inode = inodes.setdefault(
+                    key, {"size": st.st_size, "paths": set(), "last_used": st.st_mtime, "used": False, "known": False}
+                )
+                inode["paths"].add(path)
+                if path in paths:
+                    build, last_used = paths[path]
+                    inode["known"] = True
+                    inode["used"] |= build == data["builds"]
+                    inode["last_used"] = max(inode["last_used"], last_used)
+                if unit is not None:
+                    unit.append(key)
+            if unit:
+                units.append(unit)
+
+    # Candidates are groups of inodes: on their own, or merged with the rest of the units they belong to
+    groups = {key: [key] for key in inodes}
+    group_of = {key: key for key in inodes}
+    for unit in units:
+        target = group_of[unit[0]]
+        for key in unit[1:]:
+            other = group_of[key]
+            if other != target:
+                for moved in groups.pop(other):
+                    group_of[moved] = target
+                    groups[target].append(moved)
+    candidates = []
+    for group in groups.values():
+        members = [inodes[key] for key in group]
+        candidates.append(
+            {
+                "size": sum(x["size"] for x in members),
+                "paths": set().union(*(x["paths"] for x in members)),
+                "last_used": max(x["last_used"] for x in members),
+                "used": any(x["used"] for x in members),
+                "known": any(x["known"] for x in members),
+            }
+        )
+
+    size = sum(inode["size"] for inode in inodes.values())
+    candidates = [x for x in candidates if not x["used"] and (x["known"] or include_unknown)]
+    candidates.sort(key=lambda x: x["last_used"])
+
+    deleted = []
+    for candidate in candidates:
+        if size <= budget:
+            break
+        for path in sorted(candidate["paths"]):
+            if not dry_run:
+                os.unlink(path)
+                paths.pop(path, None)
+            deleted.append(path)
+        size -= candidate["size"]
+
+    if not dry_run:
+        remove_empty_parents(deleted, roots)
+        write_journal(journal_path, data)
+    return deleted, size
+
+
+def remove_empty_parents(paths, roots):
+    """Remove the directories that deleting `paths` left empty, up to but not including `roots`."""
+    roots = set(os.path.abspath(root) for root in roots)
+    for path in paths:
+        dirpath = os.path.dirname(path)
+        while dirpath not in roots and os.path.dirname(dirpath) != dirpath:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                break
+            dirpath = os.path.dirname(dirpath)
+
+
+build_failed = False
+
+
+def note_failure(excepthook):
+    def hook(*args):
+        global build_failed
+        build_failed = True
+        excepthook(*args)
+
+    return hook
+
+
+def save_at_exit():
+    # A failed build used only part of what it needs, so its files must not become the only ones worth keeping
+    if not build_failed:
+        journal.save()
+
+
+def collect_at_exit():
+    if build_failed:
+        return
+    journal.save()
+    roots = os.environ.get("AGRF_GC_ROOTS", os.environ.get("AGRF_RENDER_CACHE_PATH", ""))
+    collect([root for root in roots.split(os.pathsep) if root], parse_size(os.environ["AGRF_GC_BUDGET"]))
+
+
+if os.environ.get("AGRF_GC_BUDGET"):
+    journal.enabled = True
+    sys.excepthook = note_failure(sys.excepthook)
+    atexit.register(collect_at_exit)
+elif os.environ.get("AGRF_GC_JOURNAL"):
+    # Record usage only, for a later `python -m agrf.gorender.diskgc`
+    journal.enabled = True
+    sys.excepthook = note_failure(sys.excepthook)
+    atexit.register(save_at_exit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink agrf build output trees to a disk budget")
+    parser.add_argument("roots", nargs="+", help="Directories to collect in")
+    parser.add_argument("--budget", required=True, type=parse_size, help="Byte budget, e.g. 500M or 20G")
+    parser.add_argument("--journal", default=None, help=f"Usage journal (default: {JOURNAL_PATH})")
+    parser.add_argument("--include-unknown", action="store_true", help="Also delete files the journal never saw")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Only list what would be deleted")
+    args = parser.parse_args()
+
+    deleted, size = collect(
+        args.roots, args.budget, args.journal, include_unknown=args.include_unknown, dry_run=args.dry_run
+    )
+    for path in deleted:
+        print(path)
+    print(f"{len(deleted)} files deleted, {size} bytes left")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+from unittest.mock import patch
+from agrf import gorender
+from agrf.gorender import Config, render
+from agrf.gorender.cache import RenderCache, RenderRegistry
+from agrf.gorender.cache_test import fake_gorender
+from agrf.gorender import diskgc
+from agrf.gorender.diskgc import UNIT_MARKER, Journal, collect, journal, parse_size
+
+
+def write(path, size, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_parse_size():
+    assert parse_size("1000") == 1000
+    assert parse_size("2k") == 2048
+    assert parse_size("1.5GB") == 3 << 29
+
+
+def test_collect_evicts_unused_files_oldest_first(tmp_path):
+    root = tmp_path / "build"
+    journal_path = str(tmp_path / "journal.json")
+    old = write(root / "old" / "a.png", 100, 1000)
+    older = write(root / "older.png", 100, 2000)
+    current = write(root / "current.png", 100, 3000)
+    unknown = write(root / "source.vox", 100, 0)
+
+    j = Journal()
+    j.enabled = True
+    j.touch(old)
+    j.save(journal_path)
+    j.touch(older)
+    j.save(journal_path)
+    j.touch(current)
+    j.save(journal_path)
+    (root / "empty").mkdir()
+
+    # `old` was used in the earliest build, so it goes first; files the journal never saw are kept
+    deleted, size = collect([str(root)], 300, journal_path)
+    assert deleted == [str(old)]
+    assert size == 300
+    # Only directories the collection emptied are removed
+    assert not (root / "old").exists()
+    assert (root / "empty").exists()
+
+    deleted, size = collect([str(root)], 0, journal_path)
+    assert deleted == [str(older)]
+    assert current.exists() and unknown.exists()
+
+    deleted, size = collect([str(root)], 0, journal_path, include_unknown=True, dry_run=True)
+    assert deleted == [str(unknown)]
+    assert unknown.exists()
+
+
+def test_nothing_is_collected_after_a_failed_build(monkeypatch):
+    monkeypatch.setattr(diskgc, "build_failed", False)
+    monkeypatch.setenv("AGRF_GC_BUDGET", "0")
+    hook = diskgc.note_failure(lambda *args: None)
+    with patch.object(journal, "save") as save, patch("agrf.gorender.diskgc.collect") as gc:
+        hook(ValueError, ValueError(), None)
+        diskgc.collect_at_exit()
+        diskgc.save_at_exit()
+    save.assert_not_called()
+    gc.assert_not_called()
+
+
+def test_collect_accounts_hard_links_once(tmp_path):
+    root = tmp_path / "build"
+    journal_path = str(tmp_path / "journal.json")
+    a = write(root / "a" / "model_1x_8bpp.png", 100, 1000)
+    b = root / "b" / "model_1x_8bpp.png"
+    b.parent.mkdir()
+    os.link(a, b)
+    current = write(root / "current.png", 100, 1000)
+
+    j = Journal()
+    j.enabled = True
+    j.touch(a, b)
+    j.save(journal_path)
+    j.touch(current)
+    j.save(journal_path)
+
+    assert collect([str(root)], 200, journal_path) == ([], 200)
+    assert collect([str(root)], 100, journal_path) == ([str(a), str(b)], 100)
+
+
+def test_collect_evicts_units_whole(tmp_path):
+    root = tmp_path / "cache"
+    journal_path = str(tmp_path / "journal.json")
+    entry = [write(root / "ab" / "abcd" / name, 100, 1000) for name in ["8bpp.png", "32bpp.png", UNIT_MARKER]]
+    other = write(root / "other.png", 100, 1000)
+
+    j = Journal()
+    j.enabled = True
+    j.touch(*entry)
+    j.save(journal_path)
+    j.touch(other)
+    j.save(journal_path)
+    # One file of the entry was used more recently, which keeps the whole entry until later
+    j.touch(entry[0])
+    j.save(journal_path)
+    j.touch(tmp_path / "current.png")
+    j.save(journal_path)
+
+    deleted, size = collect([str(root)], 300, journal_path)
+    assert deleted == [str(other)]
+    deleted, size = collect([str(root)], 250, journal_path)
+    assert deleted == sorted(str(path) for path in entry)
+    assert size == 0 and not (root / "ab").exists()
+
+
+def test_renders_and_cache_entries_are_journaled(tmp_path, monkeypatch):
+    vox_path = tmp_path / "model.vox"
+    vox_path.write_bytes(b"VOX model")
+    config = Config(config={"sprites": [{"angle": 0, "width": 8}], "agrf_scales": [1]})
+    cache = RenderCache(str(tmp_path / "cache"))
+
+    monkeypatch.setattr(gorender, "render_cache", cache)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    monkeypatch.setattr(journal, "enabled", True)
+    monkeypatch.setattr(journal, "touched", set())
+    with patch("agrf.gorender.subprocess.run", fake_gorender([])):
+        render(config, str(vox_path), str(tmp_path / "a" / "model"))
+
+    outputs = [str(tmp_path / "a" / f"model_1x_{suffix}.png") for suffix in ["32bpp", "8bpp", "mask"]]
+    entries = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(cache.path) for name in names]
+    assert len(entries) == 4
+    assert journal.touched == set(outputs + entries)
@@ -0,0 +1,12 @@
+import math
+
+
+def sprite_dimens(sprite, bbox, z_scale):
+    """Pixel `(width, height, pixels per voxel)` of the view gorender renders for one `sprites` entry of a config."""
+    radian = math.radians(sprite["angle"])
+    cos, sin = abs(math.cos(radian)), abs(math.sin(radian))
+    width_voxels = bbox["x"] * sin + bbox["y"] * cos
+    height_voxels = (bbox["x"] * cos + bbox["y"] * sin) * 0.5 + bbox["z"] * z_scale
+    width = sprite["width"]
+    height = sprite.get("height") or math.ceil(height_voxels / width_voxels * width)
+    return width, height, width / width_voxels
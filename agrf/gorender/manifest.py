@@ -0,0 +1,40 @@
+import json
+import os
+import threading
+from .cache import file_digest, optional_file_digest
+
+
+# Every intermediate .vox gets a sidecar manifest recording what it was produced from.
+# Unlike mtimes, content digests survive checkouts, copies and clock skew.
+def manifest_path(output):
+    return f"{output}.manifest.json"
+
+
+def describe(operation, inputs, tool):
+    # Round-trip through JSON so that tuples compare equal to the lists read back from disk
+    return json.loads(
+        json.dumps(
+            {
+                "operation": operation,
+                "inputs": [[path, file_digest(path)] for path in inputs],
+                "tool": optional_file_digest(tool),
+            }
+        )
+    )
+
+
+def is_fresh(output, operation, inputs, tool=None):
+    try:
+        with open(manifest_path(output)) as f:
+            manifest = json.load(f)
+        return manifest["output"] == file_digest(output) and manifest["source"] == describe(operation, inputs, tool)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def record(output, operation, inputs, tool=None):
+    manifest = {"source": describe(operation, inputs, tool), "output": file_digest(output)}
+    tmp = f"{manifest_path(output)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(tmp, manifest_path(output))
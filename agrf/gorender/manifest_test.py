@@ -0,0 +1,67 @@
+import json
+from unittest.mock import patch
+from agrf.gorender import manifest, positor_many, stairstep, stairstep_operation
+
+
+def test_manifest_tracks_inputs_and_operation(tmp_path):
+    source = tmp_path / "in.vox"
+    output = tmp_path / "out.vox"
+    source.write_bytes(b"source")
+    output.write_bytes(b"output")
+    operation = {"discard": ["roof"]}
+
+    assert not manifest.is_fresh(str(output), operation, [str(source)])
+    manifest.record(str(output), operation, [str(source)])
+    assert manifest.is_fresh(str(output), operation, [str(source)])
+    assert manifest.is_fresh(str(output), {"discard": ("roof",)}, [str(source)])
+    assert not manifest.is_fresh(str(output), {"discard": ["wall"]}, [str(source)])
+
+    source.write_bytes(b"source, edited")
+    assert not manifest.is_fresh(str(output), operation, [str(source)])
+
+
+def test_positor_skips_fresh_outputs(tmp_path):
+    source = tmp_path / "model.vox"
+    source.write_bytes(b"source")
+    new_path = tmp_path / "stairstep"
+    calls = []
+
+    def fake_positor(args, check):
+        calls.append(args)
+        new_path.mkdir(exist_ok=True)
+        (new_path / "model.vox").write_bytes(b"stepped")
+
+    with patch("agrf.gorender.subprocess.run", fake_positor):
+        stairstep(str(source), str(new_path), 2)
+        stairstep(str(source), str(new_path), 2)
+        assert len(calls) == 1
+
+        stairstep(str(source), str(new_path), 3)
+        assert len(calls) == 2
+
+        (new_path / "model.vox").write_bytes(b"tampered")
+        stairstep(str(source), str(new_path), 3)
+        assert len(calls) == 3
+
+
+def test_positor_many_shares_one_process(tmp_path):
+    source = tmp_path / "model.vox"
+    source.write_bytes(b"source")
+    calls = []
+
+    def fake_positor(args, check):
+        with open(args[-1]) as f:
+            config = json.load(f)
+        calls.append(config)
+        for operation in config["operations"]:
+            (tmp_path / args[2] / f"model{operation['name']}.vox").write_text(str(operation["x_steps"]))
+
+    jobs = [(stairstep_operation(x), str(tmp_path / f"step{x}")) for x in [1, 2, 3]]
+    with patch("agrf.gorender.subprocess.run", fake_positor):
+        positor_many(str(source), jobs)
+        positor_many(str(source), jobs)
+
+    assert len(calls) == 1
+    assert len(calls[0]["operations"]) == 3
+    for x in [1, 2, 3]:
+        assert (tmp_path / f"step{x}" / "model.vox").read_text() == str(x)
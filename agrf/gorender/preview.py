@@ -0,0 +1,147 @@
+import math
+import os
+import struct
+import numpy as np
+from PIL import Image
+from .geometry import sprite_dimens
+from .vox import VoxFile
+
+# Remappable company colour ramps; gorender writes these to the mask layer
+COMPANY_COLOURS = np.zeros(256, dtype=bool)
+COMPANY_COLOURS[0xC6:0xCE] = True
+COMPANY_COLOURS[0x50:0x58] = True
+
+
+def rotation_matrix(r):
+    # nTRN "_r": bits 0-1 and 2-3 pick the non-zero column of rows 0 and 1, bits 4-6 are the row signs
+    first, second = r & 3, (r >> 2) & 3
+    third = ({0, 1, 2} - {first, second}).pop()
+    m = np.zeros((3, 3), dtype=np.int64)
+    for row, (col, bit) in enumerate([(first, 4), (second, 5), (third, 6)]):
+        m[row, col] = -1 if r >> bit & 1 else 1
+    return m
+
+
+def frame_transform(frame):
+    rotation = rotation_matrix(int(frame["_r"])) if "_r" in frame else np.eye(3, dtype=np.int64)
+    translation = np.array([int(x) for x in frame["_t"].split()], dtype=np.int64) if "_t" in frame else np.zeros(3)
+    return rotation, translation
+
+
+def load_voxels(vox_path):
+    """
+    All voxels of a .vox file: centred `(N, 3)` float positions, `(N,)` colour indices and the `(256, 4)` RGBA palette.
+    """
+    with VoxFile(vox_path) as vox:
+        sizes = [np.array(struct.unpack_from("<3i", size.content), dtype=np.int64) for size, _ in vox.models]
+        models = [np.frombuffer(xyzi.content, dtype=np.uint8, offset=4).reshape(-1, 4).copy() for _, xyzi in vox.models]
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        for chunk in vox.chunks:
+            if chunk.id == b"RGBA":
+                # Colour index i lives in RGBA entry i - 1
+                palette[1:] = np.frombuffer(chunk.content, dtype=np.uint8)[: 255 * 4].reshape(-1, 4)
+        nodes = vox.nodes
+
+    placed = []
+    if not nodes:
+        for size, voxels in zip(sizes, models):
+            placed.append((voxels[:, :3] - size / 2, voxels[:, 3]))
+    else:
+        stack = [(0, np.eye(3, dtype=np.int64), np.zeros(3))] if 0 in nodes else []
+        while stack:
+            node_id, rotation, translation = stack.pop()
+            node = nodes[node_id]
+            if node["type"] == "nTRN":
+                r, t = frame_transform(node["frames"][0] if node["frames"] else {})
+                stack.append((node["child"], rotation @ r, rotation @ t + translation))
+            elif node["type"] == "nGRP":
+                stack.extend((child, rotation, translation) for child in node["children"])
+            else:
+                for model, _ in node["models"]:
+                    local = models[model][:, :3] - sizes[model] // 2
+                    placed.append((local @ rotation.T + translation, models[model][:, 3]))
+
+    if not placed:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.uint8), palette
+    positions = np.concatenate([p for p, _ in placed]).astype(np.float64) + 0.5
+    colours = np.concatenate([c for _, c in placed])
+    return positions, colours, palette
+
+
+def render_indices(positions, colours, sprite, bbox, z_scale, scale):
+    """Project voxels orthographically, 2:1 isometric, into a `(h, w)` array of colour indices (0 is empty)."""
+    width, height, pixels_per_voxel = sprite_dimens(sprite, bbox, z_scale)
+    w, h = int(width * scale), int(height * scale)
+    ppv = pixels_per_voxel * scale
+
+    radian = math.radians(sprite["angle"])
+    cos, sin = math.cos(radian), math.sin(radian)
+    x, y, z = positions[:, 0], positions[:, 1], positions[:, 2] * z_scale
+    u = x * sin + y * cos
+    d = x * cos - y * sin
+    if sprite.get("flip", False):
+        u = -u
+
+    top = (bbox["x"] * abs(cos) + bbox["y"] * abs(sin)) / 4 + bbox["z"] * z_scale / 2
+    k = max(1, math.ceil(ppv))
+    cols = np.floor(u * ppv + w / 2 - k / 2).astype(np.int64)
+    rows = np.floor((0.5 * d - z + top) * ppv - k / 2).astype(np.int64)
+    # Nearer and higher voxels are drawn last
+    priority = d + z
+
+    dy, dx = np.divmod(np.arange(k * k), k)
+    cols = (cols[:, None] + dx).ravel()
+    rows = (rows[:, None] + dy).ravel()
+    priority = np.repeat(priority, k * k)
+    colours = np.repeat(colours, k * k)
+
+    inside = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h) & (colours != 0)
+    pixels = rows[inside] * w + cols[inside]
+    order = np.lexsort((priority[inside], pixels))
+    pixels, colours = pixels[order], colours[inside][order]
+    last = np.append(pixels[1:] != pixels[:-1], True)
+
+    ret = np.zeros(h * w, dtype=np.uint8)
+    ret[pixels[last]] = colours[last]
+    return ret.reshape(h, w)
+
+
+def render_layers(positions, colours, palette, sprite, bbox, z_scale, scale):
+    """Return `(indices, rgb, alpha, mask)` for one view."""
+    indices = render_indices(positions, colours, sprite, bbox, z_scale, scale)
+    rgb = palette[indices, :3]
+    alpha = np.where(indices != 0, 255, 0).astype(np.uint8)
+    mask = np.where(COMPANY_COLOURS[indices], indices, 0).astype(np.uint8)
+    return indices, rgb, alpha, mask
+
+
+def render_sheets(final_config, vox_path, output_path, scales):
+    """Stand-in for gorender: write `{output_path}_{scale}x_{8bpp,32bpp,mask}.png` sheets with the same strip layout."""
+    positions, colours, palette = load_voxels(vox_path)
+    bbox = final_config["size"]
+    z_scale = final_config.get("z_scale", 1.0)
+    sprites = final_config["sprites"]
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    for scale in scales:
+        views = [render_layers(positions, colours, palette, s, bbox, z_scale, scale) for s in sprites]
+        sheet_h = max((v[0].shape[0] for v in views), default=1)
+        offsets = [(sum(s["width"] for s in sprites[:i]) + 8 * i) * scale for i in range(len(sprites))]
+        sheet_w = max((o + v[0].shape[1] for o, v in zip(offsets, views)), default=1)
+
+        indices = np.zeros((sheet_h, sheet_w), dtype=np.uint8)
+        rgba = np.zeros((sheet_h, sheet_w, 4), dtype=np.uint8)
+        mask = np.zeros((sheet_h, sheet_w), dtype=np.uint8)
+        for offset, (v_indices, v_rgb, v_alpha, v_mask) in zip(offsets, views):
+            h, w = v_indices.shape
+            indices[:h, offset : offset + w] = v_indices
+            rgba[:h, offset : offset + w, :3] = v_rgb
+            rgba[:h, offset : offset + w, 3] = v_alpha
+            mask[:h, offset : offset + w] = v_mask
+
+        palette_bytes = palette[:, :3].tobytes()
+        for name, array, mode in [("8bpp", indices, "P"), ("32bpp", rgba, "RGBA"), ("mask", mask, "P")]:
+            im = Image.fromarray(array, mode)
+            if mode == "P":
+                im.putpalette(palette_bytes)
+            im.save(f"{output_path}_{scale}x_{name}.png")
@@ -0,0 +1,60 @@
+import numpy as np
+from PIL import Image
+from agrf import gorender
+from agrf.gorender import Config, render
+from agrf.gorender.cache import RenderRegistry
+from agrf.gorender.preview import load_voxels, render_indices
+from agrf.gorender.vox import pack_chunk, pack_int32
+from agrf.graphics.voxel import LazySpriteSheet, LazyVoxel
+
+
+def write_cube(path, n=4, colour=0xC6):
+    voxels = [(x, y, z, colour) for x in range(n) for y in range(n) for z in range(n)]
+    xyzi = pack_int32(len(voxels)) + b"".join(bytes(v) for v in voxels)
+    chunks = pack_chunk(b"SIZE", pack_int32(n, n, n)) + pack_chunk(b"XYZI", xyzi)
+    path.write_bytes(b"VOX " + pack_int32(150) + pack_chunk(b"MAIN", b"", chunks))
+
+
+def test_render_indices_fills_the_view(tmp_path):
+    write_cube(tmp_path / "cube.vox")
+    positions, colours, _ = load_voxels(str(tmp_path / "cube.vox"))
+    assert positions.shape == (64, 3)
+
+    bbox = {"x": 4, "y": 4, "z": 4}
+    indices = render_indices(positions, colours, {"angle": 0, "width": 8}, bbox, 1.0, 2)
+    assert indices.shape == (2 * 12, 16)
+    assert (indices[:, 1:-1] != 0).any(axis=0).all()
+    assert set(np.unique(indices)) == {0, 0xC6}
+
+
+def test_preview_renderer_stands_in_for_gorender(tmp_path, monkeypatch):
+    write_cube(tmp_path / "cube.vox")
+    config = {
+        "sprites": [{"angle": a, "width": 8} for a in (0, 45)],
+        "size": {"x": 4, "y": 4, "z": 4},
+        "agrf_scales": [1, 2],
+        "agrf_bpps": [8, 32],
+    }
+    voxel = LazyVoxel(
+        "cube", prefix=str(tmp_path / "out"), voxel_getter=lambda: str(tmp_path / "cube.vox"), config=config
+    )
+
+    monkeypatch.setattr(gorender, "RENDERER", "preview")
+    monkeypatch.setattr(gorender, "render_cache", None)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    voxel.render()
+
+    with Image.open(tmp_path / "out" / "cube_2x_32bpp.png") as im:
+        assert im.mode == "RGBA"
+        assert im.size[0] == (8 + 8 + 8) * 2
+    with Image.open(tmp_path / "out" / "cube_1x_mask.png") as im:
+        assert np.asarray(im).max() == 0xC6
+
+    image = voxel.preview(1, scale=2)
+    assert (image.w, image.h) == (16, image.alpha.shape[0])
+    assert image.mask.max() == 0xC6
+
+    # A sheet assembled from several voxels previews the view it would cut
+    sheet = LazySpriteSheet((voxel, voxel.flip("flipped")), [(1, 0), (0, 1)])
+    assert (sheet.preview(0, scale=2).alpha == voxel.flip("flipped").preview(0, scale=2).alpha).all()
+    assert (sheet.preview(1, scale=2).alpha == image.alpha).all()
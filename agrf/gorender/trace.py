@@ -0,0 +1,175 @@
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class Tracer:
+    """
+    Opt-in record of where build time goes.
+
+    Spans cover tool invocations (gorender, positor, layer filtering) and LazyVoxel steps; the graph records which
+    LazyVoxel was derived from which, so that the critical path of a build can be recovered afterwards.
+    Nothing is recorded unless the tracer is enabled, either explicitly or through `AGRF_TRACE`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.events = []
+            self.nodes = {}
+            self.edges = set()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        """Time a block; the yielded dict can be filled with extra details such as sizes and cache hits."""
+        if not self.enabled:
+            yield args
+            return
+        stack = self._stack()
+        stack.append(args)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            event = {
+                "name": name,
+                "category": category,
+                "start": start - self.origin,
+                "duration": end - start,
+                "thread": threading.get_ident(),
+                "args": args,
+            }
+            with self.lock:
+                self.events.append(event)
+
+    @contextlib.contextmanager
+    def subprocess(self):
+        """Charge the time spent in an external process to every open span of this thread."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for args in self._stack():
+                args["subprocess_time"] = args.get("subprocess_time", 0.0) + elapsed
+
+    def node(self, key, **attrs):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.nodes.setdefault(key, {}).update(attrs)
+
+    def edge(self, source, target, label):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.nodes.setdefault(source, {})
+            self.nodes.setdefault(target, {})
+            self.edges.add((source, target, label))
+
+    def node_times(self):
+        # Steps shared by several nodes (e.g. one positor run for many siblings) are split evenly between them
+        times = defaultdict(float)
+        for event in self.events:
+            nodes = [node for node in event["args"].get("nodes", ()) if node is not None]
+            for node in nodes:
+                times[node] += event["duration"] / len(nodes)
+        return times
+
+    def critical_path(self):
+        """Return `(seconds, [node, ...])` for the most expensive chain of dependent LazyVoxel steps."""
+        times = self.node_times()
+        parents = defaultdict(list)
+        for source, target, _ in self.edges:
+            parents[target].append(source)
+
+        best = {}
+
+        def visit(node):
+            # Transform graphs are shallow enough that recursion is fine
+            if node not in best:
+                choices = [visit(parent) for parent in parents[node]]
+                cost, path = max(choices, default=(0.0, []))
+                best[node] = (cost + times[node], path + [node])
+            return best[node]
+
+        return max((visit(node) for node in set(self.nodes) | set(times)), default=(0.0, []))
+
+    def to_json(self):
+        cost, path = self.critical_path()
+        return {
+            "events": self.events,
+            "graph": {
+                "nodes": self.nodes,
+                "edges": [{"source": s, "target": t, "label": l} for s, t, l in sorted(self.edges)],
+            },
+            "critical_path": {"duration": cost, "nodes": path},
+        }
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        trace_events = [
+            {
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": pid,
+                "tid": event["thread"],
+                "args": event["args"],
+            }
+            for event in self.events
+        ]
+        # Extra top-level keys are ignored by trace viewers but keep the graph next to the timeline
+        data = self.to_json()
+        return {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "graph": data["graph"],
+            "critical_path": data["critical_path"],
+        }
+
+    def dump(self, path, format="chrome"):
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        with open(path, "w") as f:
+            json.dump(data, f, default=str)
+
+
+def total_size(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+tracer = Tracer()
+
+TRACE_PATH = os.environ.get("AGRF_TRACE")
+TRACE_FORMAT = os.environ.get("AGRF_TRACE_FORMAT", "chrome")
+if TRACE_PATH:
+    tracer.enable()
+    atexit.register(lambda: tracer.dump(TRACE_PATH, TRACE_FORMAT))
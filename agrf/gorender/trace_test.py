@@ -0,0 +1,54 @@
+import json
+import os
+from unittest.mock import patch
+from agrf import gorender
+from agrf.gorender.cache import RenderRegistry
+from agrf.gorender.trace import tracer
+from agrf.graphics.voxel import LazyVoxel
+
+
+def fake_tools(args, check):
+    if "-o" in args and args[0] == gorender.CARGOPOSITOR_PATH:
+        with open(args[-1]) as f:
+            config = json.load(f)
+        os.makedirs(args[args.index("-o") + 1], exist_ok=True)
+        for operation in config["operations"]:
+            with open(gorender.positor_output(config["files"][0], args[args.index("-o") + 1], operation), "wb") as f:
+                f.write(b"positor output")
+    else:
+        output_path = args[args.index("-o") + 1]
+        for scale in args[args.index("-s") + 1].split(","):
+            with open(f"{output_path}_{scale}x_32bpp.png", "wb") as f:
+                f.write(b"png")
+
+
+def test_tracer_records_steps_and_graph(tmp_path, monkeypatch):
+    source = tmp_path / "model.vox"
+    source.write_bytes(b"VOX model")
+    config = {"sprites": [{"width": 8, "angle": 0}], "size": {"x": 4, "y": 4, "z": 4}, "agrf_scales": [1]}
+    base = LazyVoxel("model", prefix=str(tmp_path / "build"), voxel_getter=lambda: str(source), config=config)
+
+    monkeypatch.setattr(gorender, "render_cache", None)
+    monkeypatch.setattr(gorender, "render_registry", RenderRegistry())
+    tracer.clear()
+    tracer.enable()
+    try:
+        stepped = base.change_pitch(5, "pitch").stairstep(2, "step")
+        with patch("agrf.gorender.subprocess.run", fake_tools):
+            stepped.render()
+    finally:
+        tracer.disable()
+
+    tool_events = {e["name"]: e for e in tracer.events if e["category"] == "gorender"}
+    assert tool_events["render"]["args"]["hits"] == {"1": "miss"}
+    assert tool_events["render"]["args"]["input_size"] == len(b"positor output")
+    assert tool_events["render"]["args"]["output_size"] == len(b"png")
+    assert "subprocess_time" in tool_events["positor"]["args"]
+
+    edges = {(e["source"], e["target"]) for e in tracer.to_json()["graph"]["edges"]}
+    assert (base.trace_key, base.change_pitch(5, "pitch").trace_key) in edges
+    assert tracer.critical_path()[1] == [base.trace_key, base.change_pitch(5, "pitch").trace_key, stepped.trace_key]
+
+    chrome = tracer.to_chrome_trace()
+    assert all(e["ph"] == "X" for e in chrome["traceEvents"])
+    json.dumps(chrome)
@@ -0,0 +1,252 @@
+import mmap
+import os
+import struct
+import threading
+
+# MagicaVoxel .vox files: https://github.com/ephtracy/voxel-model/blob/master/MagicaVoxel-file-format-vox.txt
+# Everything lives in a flat list of chunks under MAIN; the scene graph is made of nTRN/nGRP/nSHP nodes that refer to
+# each other (and to models, in SIZE/XYZI order) by id.
+
+
+class Chunk:
+    def __init__(self, id, content, children, raw):
+        self.id = id
+        self.content = content
+        self.children = children
+        self.raw = raw
+
+
+class Reader:
+    def __init__(self, buf, offset=0):
+        self.buf = buf
+        self.offset = offset
+
+    def int32(self):
+        (value,) = struct.unpack_from("<i", self.buf, self.offset)
+        self.offset += 4
+        return value
+
+    def string(self):
+        n = self.int32()
+        value = bytes(self.buf[self.offset : self.offset + n]).decode("utf-8", "replace")
+        self.offset += n
+        return value
+
+    def dict(self):
+        return dict((self.string(), self.string()) for _ in range(self.int32()))
+
+
+def pack_int32(*values):
+    return struct.pack(f"<{len(values)}i", *values)
+
+
+def pack_string(value):
+    value = value.encode()
+    return pack_int32(len(value)) + value
+
+
+def pack_dict(d):
+    return pack_int32(len(d)) + b"".join(pack_string(k) + pack_string(v) for k, v in d.items())
+
+
+def pack_chunk(id, content, children=b""):
+    return id + pack_int32(len(content), len(children)) + content + children
+
+
+def parse_node(chunk):
+    r = Reader(chunk.content)
+    node = {"type": chunk.id.decode(), "id": r.int32(), "attrs": r.dict()}
+    if chunk.id == b"nTRN":
+        node["child"] = r.int32()
+        node["reserved"] = r.int32()
+        node["layer"] = r.int32()
+        node["frames"] = [r.dict() for _ in range(r.int32())]
+    elif chunk.id == b"nGRP":
+        node["children"] = [r.int32() for _ in range(r.int32())]
+    else:
+        node["models"] = [(r.int32(), r.dict()) for _ in range(r.int32())]
+    return node
+
+
+def pack_node(node):
+    content = pack_int32(node["id"]) + pack_dict(node["attrs"])
+    if node["type"] == "nTRN":
+        content += pack_int32(node["child"], node["reserved"], node["layer"], len(node["frames"]))
+        content += b"".join(pack_dict(frame) for frame in node["frames"])
+    elif node["type"] == "nGRP":
+        content += pack_int32(len(node["children"]), *node["children"])
+    else:
+        content += pack_int32(len(node["models"]))
+        content += b"".join(pack_int32(model) + pack_dict(attrs) for model, attrs in node["models"])
+    return pack_chunk(node["type"].encode(), content)
+
+
+class VoxFile:
+    """
+    A memory-mapped .vox file.
+
+    Chunks are views into the mapping, so models can be inspected or written elsewhere without being copied.
+    Use as a context manager; views must not outlive it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: empty .vox file")
+        self._views = []
+        self.view = self._slice(memoryview(self._map), 0, len(self._map))
+        try:
+            self._parse()
+        except ValueError:
+            self.close()
+            raise
+        except (struct.error, IndexError) as e:
+            self.close()
+            raise ValueError(f"{path}: malformed .vox file") from e
+
+    def _slice(self, view, start, end):
+        ret = view[start:end]
+        self._views.append(ret)
+        return ret
+
+    def _chunks(self, start, end):
+        ret = []
+        offset = start
+        while offset < end:
+            id = bytes(self.view[offset : offset + 4])
+            content_size, children_size = struct.unpack_from("<ii", self.view, offset + 4)
+            content_start = offset + 12
+            children_start = content_start + content_size
+            children_end = children_start + children_size
+            if children_end > end:
+                raise ValueError(f"{self.path}: chunk {id!r} overruns its parent")
+            ret.append(
+                Chunk(
+                    id,
+                    self._slice(self.view, content_start, children_start),
+                    self._slice(self.view, children_start, children_end),
+                    self._slice(self.view, offset, children_end),
+                )
+            )
+            offset = children_end
+        return ret
+
+    def _parse(self):
+        if bytes(self.view[:4]) != b"VOX ":
+            raise ValueError(f"{self.path}: not a .vox file")
+        (self.version,) = struct.unpack_from("<i", self.view, 4)
+        (main,) = self._chunks(8, len(self.view))[:1]
+        if main.id != b"MAIN":
+            raise ValueError(f"{self.path}: missing MAIN chunk")
+        self.chunks = self._chunks(8 + 12 + len(main.content), len(self.view))
+
+        self.models = []
+        self.nodes = {}
+        self.layers = {}
+        for i, chunk in enumerate(self.chunks):
+            if chunk.id == b"XYZI":
+                self.models.append((self.chunks[i - 1], chunk))
+            elif chunk.id in (b"nTRN", b"nGRP", b"nSHP"):
+                node = parse_node(chunk)
+                self.nodes[node["id"]] = node
+            elif chunk.id == b"LAYR":
+                r = Reader(chunk.content)
+                layer_id = r.int32()
+                self.layers[layer_id] = r.dict()
+
+    def layer_name(self, layer_id):
+        return self.layers.get(layer_id, {}).get("_name")
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def filter_layers(vox_path, new_path, *, keep=None, discard=None):
+    """
+    Write a copy of `vox_path` without the objects on some layers, like the `layer-filter` tool did.
+
+    With `keep`, top-level objects survive only if their layer is named in it; with `discard`, those on named layers
+    are dropped. Only top-level layers count: anything nested in a group stays or goes with it. Models no longer used
+    are dropped too, and nodes and models are renumbered densely. Untouched chunks (notably the voxel data) are written
+    straight from the mapped source.
+    """
+    with VoxFile(vox_path) as vox:
+
+        def removed(node):
+            if node["type"] != "nTRN" or node["layer"] < 0:
+                return False
+            name = vox.layer_name(node["layer"])
+            if keep is not None:
+                return name not in keep
+            return discard is not None and name in discard
+
+        # Walk the scene graph from the root, pruning removed top-level subtrees; transforms nested in a group belong
+        # to their top-level object whatever their own layer says
+        order = []
+        used_models = set()
+        stack = [(0, 0)] if 0 in vox.nodes else []
+        while stack:
+            node_id, depth = stack.pop()
+            node = vox.nodes[node_id]
+            if depth == 1 and removed(node):
+                continue
+            order.append(node["id"])
+            if node["type"] == "nTRN":
+                stack.append((node["child"], depth))
+            elif node["type"] == "nGRP":
+                stack.extend((child, depth + 1) for child in reversed(node["children"]))
+            else:
+                used_models.update(model for model, _ in node["models"])
+
+        if not vox.nodes:
+            # Files without a scene graph have no layers either
+            used_models = set(range(len(vox.models)))
+
+        node_ids = {old: new for new, old in enumerate(order)}
+        model_ids = {old: new for new, old in enumerate(sorted(used_models))}
+        dropped_models = set(id(chunk) for i, pair in enumerate(vox.models) if i not in used_models for chunk in pair)
+
+        pieces = []
+        for chunk in vox.chunks:
+            if id(chunk) in dropped_models:
+                continue
+            if chunk.id in (b"nTRN", b"nGRP", b"nSHP"):
+                node = parse_node(chunk)
+                if node["id"] not in node_ids:
+                    continue
+                node["id"] = node_ids[node["id"]]
+                if node["type"] == "nTRN":
+                    node["child"] = node_ids[node["child"]]
+                elif node["type"] == "nGRP":
+                    node["children"] = [node_ids[x] for x in node["children"] if x in node_ids]
+                else:
+                    node["models"] = [(model_ids[model], attrs) for model, attrs in node["models"]]
+                pieces.append(pack_node(node))
+            elif chunk.id == b"PACK":
+                pieces.append(pack_chunk(b"PACK", pack_int32(len(model_ids))))
+            else:
+                pieces.append(chunk.raw)
+
+        children_size = sum(len(piece) for piece in pieces)
+        os.makedirs(os.path.dirname(new_path) or ".", exist_ok=True)
+        tmp = f"{new_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"VOX " + pack_int32(vox.version))
+            f.write(b"MAIN" + pack_int32(0, children_size))
+            for piece in pieces:
+                f.write(piece)
+        os.replace(tmp, new_path)
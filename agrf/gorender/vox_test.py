@@ -0,0 +1,99 @@
+import pytest
+from agrf.gorender import discard_layers, keep_layers
+from agrf.gorender.vox import VoxFile, pack_chunk, pack_dict, pack_int32, pack_node
+
+
+def model(size, voxels):
+    xyzi = pack_int32(len(voxels)) + b"".join(bytes(v) for v in voxels)
+    return [pack_chunk(b"SIZE", pack_int32(*size)), pack_chunk(b"XYZI", xyzi)]
+
+
+def transform(id, child, layer):
+    return pack_node(
+        {"type": "nTRN", "id": id, "attrs": {}, "child": child, "reserved": -1, "layer": layer, "frames": [{}]}
+    )
+
+
+def layer(id, name):
+    return pack_chunk(b"LAYR", pack_int32(id) + pack_dict({"_name": name}) + pack_int32(-1))
+
+
+def write_vox(path):
+    chunks = (
+        model((2, 2, 2), [(0, 0, 0, 1)])
+        + model((3, 3, 3), [(1, 1, 1, 2), (2, 2, 2, 3)])
+        + [
+            transform(0, 1, -1),
+            pack_node({"type": "nGRP", "id": 1, "attrs": {}, "children": [2, 4]}),
+            transform(2, 3, 0),
+            pack_node({"type": "nSHP", "id": 3, "attrs": {}, "models": [(0, {})]}),
+            transform(4, 5, 1),
+            pack_node({"type": "nSHP", "id": 5, "attrs": {}, "models": [(1, {})]}),
+            layer(0, "body"),
+            layer(1, "roof"),
+            pack_chunk(b"RGBA", bytes(1024)),
+        ]
+    )
+    path.write_bytes(b"VOX " + pack_int32(150) + pack_chunk(b"MAIN", b"", b"".join(chunks)))
+
+
+def test_discard_layers_drops_objects_and_models(tmp_path):
+    write_vox(tmp_path / "in.vox")
+    discard_layers(("roof",), str(tmp_path / "in.vox"), str(tmp_path / "out" / "out.vox"))
+
+    with VoxFile(str(tmp_path / "out" / "out.vox")) as vox:
+        assert len(vox.models) == 1
+        assert bytes(vox.models[0][0].content) == pack_int32(2, 2, 2)
+        assert sorted(vox.nodes) == [0, 1, 2, 3]
+        assert vox.nodes[1]["children"] == [2]
+        assert vox.layer_name(vox.nodes[2]["layer"]) == "body"
+        assert [c.id for c in vox.chunks][-3:] == [b"LAYR", b"LAYR", b"RGBA"]
+
+
+def test_keep_layers_renumbers_models(tmp_path):
+    write_vox(tmp_path / "in.vox")
+    keep_layers(("roof",), str(tmp_path / "in.vox"), str(tmp_path / "out.vox"))
+
+    with VoxFile(str(tmp_path / "in.vox")) as source, VoxFile(str(tmp_path / "out.vox")) as vox:
+        assert len(vox.models) == 1
+        assert bytes(vox.models[0][1].raw) == bytes(source.models[1][1].raw)
+        assert vox.nodes[1]["children"] == [2]
+        assert vox.nodes[3]["models"] == [(0, {})]
+
+
+def test_nested_transforms_follow_their_top_level_object(tmp_path):
+    chunks = (
+        model((2, 2, 2), [(0, 0, 0, 1)])
+        + model((3, 3, 3), [(1, 1, 1, 2)])
+        + [
+            transform(0, 1, -1),
+            pack_node({"type": "nGRP", "id": 1, "attrs": {}, "children": [2]}),
+            transform(2, 3, 0),
+            pack_node({"type": "nGRP", "id": 3, "attrs": {}, "children": [4, 6]}),
+            transform(4, 5, 1),
+            pack_node({"type": "nSHP", "id": 5, "attrs": {}, "models": [(0, {})]}),
+            transform(6, 7, 0),
+            pack_node({"type": "nSHP", "id": 7, "attrs": {}, "models": [(1, {})]}),
+            layer(0, "body"),
+            layer(1, "roof"),
+        ]
+    )
+    (tmp_path / "in.vox").write_bytes(b"VOX " + pack_int32(150) + pack_chunk(b"MAIN", b"", b"".join(chunks)))
+
+    # The nested transform on "roof" stays with the "body" group it is part of
+    discard_layers(("roof",), str(tmp_path / "in.vox"), str(tmp_path / "discard.vox"))
+    with VoxFile(str(tmp_path / "discard.vox")) as vox:
+        assert len(vox.models) == 2
+        assert sorted(vox.nodes) == list(range(8))
+
+    keep_layers(("roof",), str(tmp_path / "in.vox"), str(tmp_path / "keep.vox"))
+    with VoxFile(str(tmp_path / "keep.vox")) as vox:
+        assert len(vox.models) == 0
+        assert sorted(vox.nodes) == [0, 1]
+        assert vox.nodes[1]["children"] == []
+
+
+def test_rejects_other_files(tmp_path):
+    (tmp_path / "bad.vox").write_bytes(b"PNG not a voxel file")
+    with pytest.raises(ValueError):
+        VoxFile(str(tmp_path / "bad.vox"))
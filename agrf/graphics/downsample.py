@@ -0,0 +1,66 @@
+import os
+import threading
+import numpy as np
+from PIL import Image
+from agrf.gorender.cache import scale_outputs
+from agrf.gorender.diskgc import touch
+
+
+def blocks(array, factor):
+    """View `array` as `(h / factor, w / factor, factor * factor, ...)` blocks, padding with zeros as needed."""
+    h, w = array.shape[:2]
+    ph, pw = -h % factor, -w % factor
+    if ph or pw:
+        array = np.pad(array, ((0, ph), (0, pw)) + ((0, 0),) * (array.ndim - 2))
+    h, w = array.shape[:2]
+    array = array.reshape((h // factor, factor, w // factor, factor) + array.shape[2:])
+    return np.moveaxis(array, 2, 1).reshape((h // factor, w // factor, factor * factor) + array.shape[4:])
+
+
+def downsample_rgba(rgba, factor):
+    """Box filter, weighting colours by alpha so that transparent pixels do not darken edges."""
+    b = blocks(rgba, factor).astype(np.uint32)
+    alpha = b[..., 3]
+    total = alpha.sum(axis=2)
+    rgb = (b[..., :3] * alpha[..., None]).sum(axis=2)
+    ret = np.zeros(b.shape[:2] + (4,), dtype=np.uint8)
+    ret[..., :3] = (rgb + total[..., None] // 2) // np.maximum(total, 1)[..., None]
+    ret[..., 3] = (total + factor * factor // 2) // (factor * factor)
+    return ret
+
+
+def downsample_indices(indices, factor):
+    """
+    Palette indices cannot be averaged; each block takes its most common non-zero index, or 0 if fewer than half of
+    its pixels are non-zero.
+    """
+    b = blocks(indices, factor)
+    k = b.shape[2]
+    nonzero = b != 0
+    # Blocks are tiny (4 or 16 pixels), so counting every pixel's matches is cheaper than a 256-bin histogram
+    counts = np.stack([((b == b[..., j : j + 1]) & nonzero[..., j : j + 1]).sum(axis=2) for j in range(k)], axis=2)
+    mode = np.take_along_axis(b, counts.argmax(axis=2)[..., None], axis=2)[..., 0]
+    return np.where(nonzero.sum(axis=2) * 2 >= k, mode, 0).astype(np.uint8)
+
+
+def downsample_render(path, scale):
+    """Write the `scale` (0.5 or 0.25) sheets of `path` by box filtering its already rendered 1x sheets."""
+    factor = round(1 / scale)
+    prefix_len = len(f"{path}_1x_")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    for src in scale_outputs(path, 1):
+        with Image.open(src) as im:
+            mode = im.mode
+            palette = im.getpalette() if mode == "P" else None
+            array = np.asarray(im if mode in ("P", "RGBA") else im.convert("RGBA"))
+        if mode == "P":
+            out = Image.fromarray(downsample_indices(array, factor), "P")
+            out.putpalette(palette)
+        else:
+            out = Image.fromarray(downsample_rgba(array, factor), "RGBA")
+        # The old sheet may be a hard link into the render cache, so never write through it
+        out_path = f"{path}_{scale}x_{src[prefix_len:]}"
+        tmp = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        out.save(tmp, format="PNG")
+        os.replace(tmp, out_path)
+        touch(out_path)
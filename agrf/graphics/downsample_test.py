@@ -0,0 +1,66 @@
+import os
+import grf
+import numpy as np
+from PIL import Image
+from unittest.mock import patch
+from agrf.graphics.downsample import downsample_indices, downsample_render, downsample_rgba
+from agrf.graphics.voxel import LazyVoxel
+
+
+def test_downsample_rgba_weights_by_alpha():
+    rgba = np.zeros((2, 4, 4), dtype=np.uint8)
+    rgba[0, 0] = (200, 100, 0, 255)
+    rgba[:, 2:] = (10, 20, 30, 255)
+    assert downsample_rgba(rgba, 2).tolist() == [[[200, 100, 0, 64], [10, 20, 30, 255]]]
+
+
+def test_downsample_indices_takes_majority():
+    indices = np.array([[0, 5, 7, 7], [5, 5, 0, 0], [0, 0, 1, 2], [0, 3, 3, 4]], dtype=np.uint8)
+    assert downsample_indices(indices, 2).tolist() == [[5, 7], [0, 1]]
+
+
+def test_zoom_out_sprites_are_downsampled(tmp_path):
+    config = {
+        "sprites": [{"angle": 45, "width": 7, "height": 6}, {"angle": 315, "width": 7, "height": 6}],
+        "size": {"x": 4, "y": 4, "z": 4},
+        "agrf_scales": [1],
+        "agrf_bpps": [32],
+        "agrf_no_mask": True,
+    }
+    voxel = LazyVoxel("model", prefix=str(tmp_path), voxel_getter=lambda: "model.vox", config=config)
+    rendered = []
+
+    def fake_render(voxel, vox_path, output_path, scales=None):
+        rendered.append(scales)
+        rgba = np.zeros((6, 22, 4), dtype=np.uint8)
+        rgba[:, 0:7] = (255, 0, 0, 255)
+        rgba[:, 15:22] = (0, 0, 255, 255)
+        Image.fromarray(rgba, "RGBA").save(f"{output_path}_1x_32bpp.png")
+
+    sheet = voxel.spritesheet(zoom_out=(0.5,))
+    normal, half = sheet[1].sprites
+    assert half.zoom == grf.ZOOM_OUT_2X
+
+    with patch("agrf.graphics.voxel.render", fake_render):
+        w, h, rgb, alpha, mask = half.get_data_layers(grf.DummyWriteContext())
+
+    # Only the 1x sheet is rendered; the second strip starts at x = 15, mid-pixel at half size
+    assert rendered == [[1]]
+    assert (half.x, w, h) == (7, 4, 3)
+    assert (rgb[:, 1:] == (0, 0, 255)).all() and alpha[:, 1:].all()
+    # Offsets are the 1x ones halved, less the half pixel the strip's left edge moved by
+    assert (normal.xofs, normal.yofs) == (-2, 0)
+    assert (half.xofs, half.yofs) == (-1, 0)
+
+
+def test_downsample_render_does_not_write_through_hard_links(tmp_path):
+    Image.fromarray(np.full((4, 4, 4), 255, dtype=np.uint8), "RGBA").save(tmp_path / "model_1x_32bpp.png")
+    Image.fromarray(np.zeros((2, 2, 4), dtype=np.uint8), "RGBA").save(tmp_path / "cached.png")
+    os.link(tmp_path / "cached.png", tmp_path / "model_0.5x_32bpp.png")
+
+    downsample_render(str(tmp_path / "model"), 0.5)
+
+    with Image.open(tmp_path / "model_0.5x_32bpp.png") as im:
+        assert (np.asarray(im) == 255).all()
+    with Image.open(tmp_path / "cached.png") as im:
+        assert not np.asarray(im).any()
@@ -1,10 +1,133 @@
-from dataclasses import dataclass, replace
+from dataclasses import dataclass, field, replace
 from dataclass_type_validator import dataclass_type_validator
 import grf
 import numpy as np
 from .palette import NUMPY_PALETTE
 from PIL import Image
 
+PIXEL = np.dtype((np.void, 3))
+
+
+def pixels(rgb):
+    """View an `(h, w, 3)` array as `(h, w)` 3-byte pixels, so that boolean masks move whole pixels at once."""
+    return rgb.view(PIXEL)[:, :, 0]
+
+
+def blend_rgba(rgb, alpha, other_rgb, other_alpha, opacity=255):
+    """
+    Blend `other_rgb`/`other_alpha` (scaled by `opacity`) over `rgb`/`alpha`, in place.
+
+    Byte-exact with the straightforward formula in 32-bit integers:
+
+        c1 = alpha * (65025 - other_alpha * opacity)
+        c2 = other_alpha * opacity * 255
+        rgb = (c1 * rgb + c2 * other_rgb + (c1 + c2) // 2) // max(c1 + c2, 1)
+        alpha = (c1 + c2 + 32513) // 65025
+
+    but cheaper: most overlay pixels are fully transparent or fully opaque and are kept or copied as they are, and
+    partly transparent pixels over an opaque base reduce to `(rgb * (255 - a) + other_rgb * a + 127) // 255` in
+    16 bits. Only the remaining pixels go through the full formula.
+    """
+    dst = pixels(rgb)
+    src = pixels(other_rgb if other_rgb.strides[2] == 1 else other_rgb.copy())
+    clear = other_alpha == 0 if opacity > 0 else np.ones(other_alpha.shape, dtype=bool)
+    # Nothing over nothing yields black
+    black = clear & (alpha == 0)
+    if black.any():
+        dst[black] = np.zeros((), dtype=PIXEL)
+    partial = ~clear
+    if opacity == 255:
+        opaque = other_alpha == 255
+        dst[opaque] = src[opaque]
+        alpha[opaque] = 255
+        partial &= ~opaque
+        fast = partial & (alpha == 255)
+        partial &= ~fast
+
+        if fast.any():
+            a2 = other_alpha[fast].astype(np.uint16)[:, np.newaxis]
+            mixed = dst[fast].view(np.uint8).reshape(-1, 3).astype(np.uint16)
+            mixed *= 255 - a2
+            mixed += a2 * src[fast].view(np.uint8).reshape(-1, 3)
+            mixed += 127
+            # x // 255 for x < 65535
+            mixed += 1 + (mixed >> 8)
+            mixed >>= 8
+            dst[fast] = mixed.astype(np.uint8).view(PIXEL)[:, 0]
+
+    if partial.any():
+        alpha1 = alpha[partial].astype(np.uint32)
+        alpha2 = other_alpha[partial].astype(np.uint32) * opacity
+        alpha1_component = (alpha1 * (65025 - alpha2))[:, np.newaxis]
+        alpha2_component = (alpha2 * 255)[:, np.newaxis]
+        new_alpha = alpha1_component + alpha2_component
+        rgb1 = dst[partial].view(np.uint8).reshape(-1, 3)
+        rgb2 = src[partial].view(np.uint8).reshape(-1, 3)
+        mixed = (alpha1_component * rgb1 + alpha2_component * rgb2 + new_alpha // 2) // np.maximum(new_alpha, 1)
+        dst[partial] = mixed.astype(np.uint8).view(PIXEL)[:, 0]
+        alpha[partial] = (new_alpha[:, 0] + 32513) // 65025
+
+
+__mask_luts = {}
+
+
+def mask_lut(palette):
+    """
+    Company colour shading of a masked pixel only depends on its mask index and on the darkest channel of its colour,
+    so it is computed once per palette for all 256 x 256 pairs, as a table of pixels indexed by `index << 8 | darkest`.
+    """
+    key = palette.tobytes()
+    if key not in __mask_luts:
+        v = np.arange(256, dtype=np.uint16)[np.newaxis, :, np.newaxis]
+        mask_colour = palette.astype(np.uint16)[:, np.newaxis, :] * v
+        mask_colour //= 2**7
+        # Channels that overflow brighten the others
+        ob = (np.maximum(mask_colour, 255) - 255).sum(axis=2, dtype=np.uint16) // 2
+
+        above = mask_colour >= 255
+        below = np.minimum(mask_colour + ob[:, :, np.newaxis] * (255 - mask_colour) // 256, 255).astype(np.uint8)
+        __mask_luts[key] = np.where(above, 255, below).astype(np.uint8).reshape(-1, 3).view(PIXEL)[:, 0]
+    return __mask_luts[key]
+
+
+def block_sums(array, dtype=np.uint16):
+    """Sums of the complete 2x2 blocks of an `(h, w, ...)` array, as `dtype`."""
+    h, w = array.shape[0] // 2 * 2, array.shape[1] // 2 * 2
+    sums = array[0:h:2, 0:w:2].astype(dtype)
+    sums += array[1:h:2, 0:w:2]
+    sums += array[0:h:2, 1:w:2]
+    sums += array[1:h:2, 1:w:2]
+    return sums
+
+
+EMPTY_BBOX = (0, 0, 0, 0)
+
+
+def occupied_bbox(rgb, alpha, mask):
+    """Bounds `(x0, y0, x1, y1)` of the non-zero alpha and mask pixels, or of the non-black pixels if both are None."""
+    used = None
+    if alpha is not None:
+        used = alpha != 0
+    if mask is not None:
+        used = mask != 0 if used is None else used | (mask != 0)
+    if used is None:
+        if rgb is None:
+            return EMPTY_BBOX
+        used = rgb.any(axis=2)
+    rows = np.flatnonzero(used.any(axis=1))
+    if len(rows) == 0:
+        return EMPTY_BBOX
+    cols = np.flatnonzero(used.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def union_bbox(a, b):
+    if a[0] == a[2] or a[1] == a[3]:
+        return b
+    if b[0] == b[2] or b[1] == b[3]:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
 
 # An intermediate representation of image, based on grf.Sprite.get_data_layers()
 # Most non-IO methods are in-place for `self` for performance purposes, but will not change `other`
@@ -17,13 +140,17 @@ class LayeredImage:
     rgb: np.ndarray | None
     alpha: np.ndarray | None
     mask: np.ndarray | None
+    # Bounds (x0, y0, x1, y1) outside of which alpha and mask (or rgb, if there are neither) are all zero, or None if
+    # unknown. Operations keep it up to date and leave everything outside alone, so code writing into the layers
+    # directly has to reset it
+    bbox: tuple | None = field(default=None, compare=False)
 
     def __post_init__(self):
         dataclass_type_validator(self)
 
     @staticmethod
     def empty():
-        return LayeredImage(0, 0, 0, 0, None, None, None)
+        return LayeredImage(0, 0, 0, 0, None, None, None, EMPTY_BBOX)
 
     @staticmethod
     def canvas(xofs, yofs, w, h, bpp=32, has_mask=True):
@@ -35,6 +162,7 @@ class LayeredImage:
             np.zeros((h, w, 3), dtype=np.uint8) if bpp == 32 else None,
             np.zeros((h, w), dtype=np.uint8) if bpp == 32 else None,
             np.zeros((h, w), dtype=np.uint8) if has_mask else None,
+            EMPTY_BBOX,
         )
 
     @staticmethod
@@ -52,6 +180,7 @@ class LayeredImage:
             None if self.rgb is None else self.rgb.copy(),
             None if self.alpha is None else self.alpha.copy(),
             None if self.mask is None else self.mask.copy(),
+            self.bbox,
         )
 
     def copy_from(self, other):
@@ -62,9 +191,16 @@ class LayeredImage:
         self.rgb = None if other.rgb is None else other.rgb.copy()
         self.alpha = None if other.alpha is None else other.alpha.copy()
         self.mask = None if other.mask is None else other.mask.copy()
+        self.bbox = other.bbox
 
         return self
 
+    def occupied(self):
+        """`bbox`, measured if not known yet."""
+        if self.bbox is None:
+            self.bbox = occupied_bbox(self.rgb, self.alpha, self.mask)
+        return self.bbox
+
     def apply_mask(self):
         if self.mask is None:
             return
@@ -74,67 +210,101 @@ class LayeredImage:
             self.alpha = self.mask > 0
             self.mask = None
             return
-        v = np.min(self.rgb, axis=2, keepdims=True)
-        mask_colour = NUMPY_PALETTE[self.mask].astype(np.uint16)
-        mask_colour *= v
-        mask_colour //= 2**7
-        r_ob = np.maximum(mask_colour[:, :, 0], 255) - 255
-        g_ob = np.maximum(mask_colour[:, :, 1], 255) - 255
-        b_ob = np.maximum(mask_colour[:, :, 2], 255) - 255
-        ob = (r_ob + g_ob + b_ob) // 2
+        # Pixels without mask keep their colour, and there are none outside `bbox`
+        x0, y0, x1, y1 = self.occupied()
+        rgb = self.rgb[y0:y1, x0:x1]
+        mask = self.mask[y0:y1, x0:x1]
+        index = mask.astype(np.uint16) << 8
+        index |= np.minimum(np.minimum(rgb[:, :, 0], rgb[:, :, 1]), rgb[:, :, 2])
+        mixed = mask_lut(NUMPY_PALETTE).take(index)
+
+        self.rgb = self.rgb.copy()
+        masked = mask != 0
+        pixels(self.rgb[y0:y1, x0:x1])[masked] = mixed[masked]
+        self.mask = None
 
-        above = mask_colour >= 255
-        below = np.minimum(mask_colour + ob[:, :, np.newaxis] * (255 - mask_colour) // 256, 255).astype(np.uint8)
-        mixed = np.where(above, 255, below)
+        return self
 
-        mask_pal = self.mask == 0
-        blended = np.where(np.broadcast_to(mask_pal[:, :, np.newaxis], (*mask_pal.shape, 3)), self.rgb, mixed)
+    def extend(self, xofs, yofs, w, h):
+        """Grow the canvas to also cover the given area, keeping its content and the set of layers it has."""
+        new_w = max(w + xofs - self.xofs, self.w) - min(0, xofs - self.xofs)
+        new_h = max(h + yofs - self.yofs, self.h) - min(0, yofs - self.yofs)
+        if new_w == self.w and new_h == self.h:
+            return self
+        x0 = max(0, self.xofs - xofs)
+        y0 = max(0, self.yofs - yofs)
 
-        self.rgb = blended
-        self.mask = None
+        for k in ["rgb", "alpha", "mask"]:
+            layer = getattr(self, k)
+            if layer is not None:
+                new_layer = np.zeros((new_h, new_w) + layer.shape[2:], dtype=np.uint8)
+                new_layer[y0 : y0 + self.h, x0 : x0 + self.w] = layer
+                setattr(self, k, new_layer)
+
+        self.w = new_w
+        self.h = new_h
+        self.xofs -= x0
+        self.yofs -= y0
+        if self.bbox is not None:
+            bx0, by0, bx1, by1 = self.bbox
+            self.bbox = (bx0 + x0, by0 + y0, bx1 + x0, by1 + y0)
 
         return self
 
     def adjust_canvas(self, other, childsprite=None):
-        w = max(other.w + other.xofs - self.xofs, self.w) - min(0, other.xofs - self.xofs)
-        h = max(other.h + other.yofs - self.yofs, self.h) - min(0, other.yofs - self.yofs)
-        x0 = max(0, self.xofs - other.xofs)
-        y0 = max(0, self.yofs - other.yofs)
-
-        if w == self.w and h == self.h:
-            if self.rgb is None and other.rgb is not None:
-                self.rgb = np.zeros((h, w, 3), dtype=np.uint8)
-            if self.alpha is None and other.alpha is not None:
-                self.alpha = np.zeros((h, w), dtype=np.uint8)
-            if self.mask is None and other.mask is not None:
-                self.mask = np.zeros((h, w), dtype=np.uint8)
-            return
+        self.extend(other.xofs, other.yofs, other.w, other.h)
+        if self.rgb is None and other.rgb is not None:
+            self.rgb = np.zeros((self.h, self.w, 3), dtype=np.uint8)
+        if self.alpha is None and other.alpha is not None:
+            self.alpha = np.zeros((self.h, self.w), dtype=np.uint8)
+        if self.mask is None and other.mask is not None:
+            self.mask = np.zeros((self.h, self.w), dtype=np.uint8)
 
-        if self.rgb is not None:
-            new_rgb = np.zeros((h, w, 3), dtype=np.uint8)
-            new_rgb[y0 : y0 + self.h, x0 : x0 + self.w] = self.rgb
-            self.rgb = new_rgb
-        elif other.rgb is not None:
-            self.rgb = np.zeros((h, w, 3), dtype=np.uint8)
+        return self
 
-        if self.alpha is not None:
-            new_alpha = np.zeros((h, w), dtype=np.uint8)
-            new_alpha[y0 : y0 + self.h, x0 : x0 + self.w] = self.alpha
-            self.alpha = new_alpha
-        elif other.rgb is not None:
-            self.alpha = np.zeros((h, w), dtype=np.uint8)
+    def blend_all(self, others, alpha=255):
+        """
+        Blend every image of `others` over this one, in order; the same as calling `blend_over` for each of them, but
+        the canvas is sized for all of them up front instead of growing (and being copied) once per image.
+        """
+        others = [
+            other for other in others if other.rgb is not None or other.alpha is not None or other.mask is not None
+        ]
+        if len(others) == 0:
+            return self
 
-        if self.mask is not None:
-            new_mask = np.zeros((h, w), dtype=np.uint8)
-            new_mask[y0 : y0 + self.h, x0 : x0 + self.w] = self.mask
-            self.mask = new_mask
-        elif other.rgb is not None:
-            self.mask = np.zeros((h, w), dtype=np.uint8)
+        areas = [(other.xofs, other.yofs, other.w, other.h) for other in others]
+        if self.rgb is None and self.alpha is None and self.mask is None:
+            # `blend_over` would start from a copy of the first image; paste it into the final canvas instead
+            first = others.pop(0)
+            if first.rgb is None and first.mask is None:
+                raise NotImplementedError()
+            xofs = min(x for x, _, _, _ in areas)
+            yofs = min(y for _, y, _, _ in areas)
+            w = max(x + w for x, _, w, _ in areas) - xofs
+            h = max(y + h for _, y, _, h in areas) - yofs
+            x1 = first.xofs - xofs
+            y1 = first.yofs - yofs
+            self.xofs, self.yofs, self.w, self.h = xofs, yofs, w, h
+            for k in ["rgb", "alpha", "mask"]:
+                layer = getattr(first, k)
+                if layer is None:
+                    setattr(self, k, None)
+                    continue
+                new_layer = np.zeros((h, w) + layer.shape[2:], dtype=layer.dtype)
+                new_layer[y1 : y1 + first.h, x1 : x1 + first.w] = layer
+                setattr(self, k, new_layer)
+            bx0, by0, bx1, by1 = first.occupied()
+            self.bbox = (bx0 + x1, by0 + y1, bx1 + x1, by1 + y1)
+        else:
+            xofs = min(self.xofs, *(x for x, _, _, _ in areas))
+            yofs = min(self.yofs, *(y for _, y, _, _ in areas))
+            w = max(self.xofs + self.w, *(x + w for x, _, w, _ in areas)) - xofs
+            h = max(self.yofs + self.h, *(y + h for _, y, _, h in areas)) - yofs
+            self.extend(xofs, yofs, w, h)
 
-        self.w = w
-        self.h = h
-        self.xofs -= x0
-        self.yofs -= y0
+        for other in others:
+            self.blend_over(other, alpha)
 
         return self
 
@@ -181,33 +351,38 @@ class LayeredImage:
             return self
 
         self.adjust_canvas(other)
-        x1 = other.xofs - self.xofs
-        y1 = other.yofs - self.yofs
+        # Only the occupied part of `other` can show; blending the rest would at most blacken invisible pixels
+        bx0, by0, bx1, by1 = other.occupied()
+        x1 = other.xofs - self.xofs + bx0
+        y1 = other.yofs - self.yofs + by0
+        w = bx1 - bx0
+        h = by1 - by0
+        if self.bbox is not None:
+            self.bbox = union_bbox(self.bbox, (x1, y1, x1 + w, y1 + h))
+        if w == 0 or h == 0:
+            return self
 
         if self.mask is not None:
-            mask_viewport = self.mask[y1 : y1 + other.h, x1 : x1 + other.w]
+            mask_viewport = self.mask[y1 : y1 + h, x1 : x1 + w]
             if self.rgb is None:
-                opacity = other.mask != 0
+                opacity = other.mask[by0:by1, bx0:bx1] != 0
+            elif other.alpha is None:
+                opacity = True
             else:
-                opacity = other.alpha != 0
+                opacity = other.alpha[by0:by1, bx0:bx1] != 0
             if other.mask is None:
-                mask_viewport[:, :] = mask_viewport * (1 - opacity)
+                mask_viewport[opacity] = 0
             else:
-                mask_viewport[:, :] = mask_viewport * (1 - opacity) + other.mask * opacity
+                np.copyto(mask_viewport, other.mask[by0:by1, bx0:bx1], where=opacity)
 
         if self.rgb is not None and other.rgb is not None:
-            rgb_viewport = self.rgb[y1 : y1 + other.h, x1 : x1 + other.w]
-            alpha_viewport = self.alpha[y1 : y1 + other.h, x1 : x1 + other.w]
-
-            alpha1 = alpha_viewport.astype(np.uint32)
-            alpha2 = other.alpha.astype(np.uint32)
-            alpha1_component = np.expand_dims(alpha1 * (65025 - alpha2 * alpha), 2)
-            alpha2_component = np.expand_dims(alpha2 * alpha * 255, 2)
-            new_alpha = alpha1_component + alpha2_component
-            rgb_viewport[:, :] = (
-                alpha1_component * rgb_viewport + alpha2_component * other.rgb + new_alpha // 2
-            ) // np.maximum(new_alpha, 1)
-            alpha_viewport[:, :] = (new_alpha[:, :, 0] + 32513) // 65025
+            blend_rgba(
+                self.rgb[y1 : y1 + h, x1 : x1 + w],
+                self.alpha[y1 : y1 + h, x1 : x1 + w],
+                other.rgb[by0:by1, bx0:bx1],
+                other.alpha[by0:by1, bx0:bx1],
+                alpha,
+            )
 
         return self
 
@@ -219,25 +394,39 @@ class LayeredImage:
         return self
 
     def remap(self, remap):
-        if self.mask is not None:
+        if self.mask is None:
+            return self
+        if remap.remap_array(np.zeros(1, dtype=np.uint8))[0] != 0:
             self.mask = remap.remap_array(self.mask)
+            self.bbox = (0, 0, self.w, self.h)
+            return self
+        x0, y0, x1, y1 = self.occupied()
+        mask = self.mask.copy()
+        mask[y0:y1, x0:x1] = remap.remap_array(self.mask[y0:y1, x0:x1])
+        self.mask = mask
         return self
 
     def crop(self):
+        if self.alpha is None and self.rgb is None and self.mask is None:
+            raise Exception("All data layers are None")
+        if self.alpha is None and self.rgb is not None and self.mask is not None:
+            # Cropped by rgb, which `bbox` does not cover here
+            x0, y0, x1, y1 = 0, 0, self.w, self.h
+        else:
+            x0, y0, x1, y1 = self.occupied()
+
         if self.alpha is not None:
-            cols_bitset = self.alpha.any(0)
-            rows_bitset = self.alpha.any(1)
+            cols_bitset = self.alpha[y0:y1, x0:x1].any(0)
+            rows_bitset = self.alpha[y0:y1, x0:x1].any(1)
         elif self.rgb is not None:
-            cols_bitset = self.rgb.any((0, 2))
-            rows_bitset = self.rgb.any((1, 2))
-        elif self.mask is not None:
-            cols_bitset = self.mask.any(0)
-            rows_bitset = self.mask.any(1)
+            cols_bitset = self.rgb[y0:y1, x0:x1].any((0, 2))
+            rows_bitset = self.rgb[y0:y1, x0:x1].any((1, 2))
         else:
-            raise Exception("All data layers are None")
+            cols_bitset = self.mask[y0:y1, x0:x1].any(0)
+            rows_bitset = self.mask[y0:y1, x0:x1].any(1)
 
-        cols_used = np.arange(self.w)[cols_bitset]
-        rows_used = np.arange(self.h)[rows_bitset]
+        cols_used = np.arange(x0, x1)[cols_bitset]
+        rows_used = np.arange(y0, y1)[rows_bitset]
 
         crop_x = min(cols_used, default=0)
         crop_y = min(rows_used, default=0)
@@ -254,6 +443,7 @@ class LayeredImage:
         self.h = h
         self.xofs += crop_x
         self.yofs += crop_y
+        self.bbox = (0, 0, w, h)
 
         return self
 
@@ -268,7 +458,15 @@ class LayeredImage:
     # Keep aspect ratio
     # Using given w and h as maximum
     # offsets updated approximately
+    # Exact halving or quartering is box filtered with `pyramid` instead
     def resize(self, w, h, force_nearest=False):
+        for f in [2, 4]:
+            if (w, h) == (self.w // f, self.h // f) and w > 0 and h > 0:
+                scaled = self.pyramid((f,), force_nearest)[f]
+                self.xofs, self.yofs, self.w, self.h = scaled.xofs, scaled.yofs, scaled.w, scaled.h
+                self.rgb, self.alpha, self.mask, self.bbox = scaled.rgb, scaled.alpha, scaled.mask, scaled.bbox
+                return self
+
         metadata_updated = False
         for k in ["rgb", "alpha", "mask"]:
             img = getattr(self, k)
@@ -287,9 +485,58 @@ class LayeredImage:
                 self.h = new_h
                 self.xofs = (self.xofs * new_w + old_w // 2) // old_w
                 self.yofs = (self.yofs * new_h + old_h // 2) // old_h
+                self.bbox = None
                 metadata_updated = True
         return self
 
+    def pyramid(self, factors=(2, 4), force_nearest=False):
+        """
+        Copies scaled down by each of `factors` (powers of two from 2 up), as `{factor: LayeredImage}`.
+
+        Layers are box filtered, the same as `Image.reduce`, except that incomplete blocks at the right and bottom
+        edges are dropped. All factors are summed up from the same 2x2 block sums, so the 1/4 copy costs little more
+        than the 1/2 one. The mask (or every layer, with `force_nearest`) takes the centre pixel of each block, which is
+        what nearest neighbour resampling picks.
+        """
+        for f in factors:
+            if f < 2 or f & (f - 1):
+                raise ValueError(f"Pyramid factors must be powers of two from 2 up, not {f}")
+        # Block sums of 8-bit values fit in uint16 up to 16x16 blocks
+        dtype = np.uint16 if max(factors) <= 16 else np.uint32
+        ret = {}
+        for f in factors:
+            bbox = None
+            if self.bbox is not None:
+                x0, y0, x1, y1 = self.bbox
+                bbox = (x0 // f, y0 // f, min(-(-x1 // f), self.w // f), min(-(-y1 // f), self.h // f))
+            ret[f] = LayeredImage(
+                (self.xofs * (self.w // f) + self.w // 2) // max(self.w, 1),
+                (self.yofs * (self.h // f) + self.h // 2) // max(self.h, 1),
+                self.w // f,
+                self.h // f,
+                None,
+                None,
+                None,
+                bbox,
+            )
+
+        for k in ["rgb", "alpha", "mask"]:
+            layer = getattr(self, k)
+            if layer is None:
+                continue
+            if k == "mask" or force_nearest:
+                for f in factors:
+                    setattr(ret[f], k, layer[f // 2 :: f, f // 2 :: f][: self.h // f, : self.w // f].copy())
+                continue
+            sums, f = layer, 1
+            while f < max(factors):
+                sums = block_sums(sums, dtype)
+                f *= 2
+                if f in ret:
+                    setattr(ret[f], k, ((sums + f * f // 2) // (f * f)).astype(layer.dtype))
+
+        return ret
+
     def to_rgb(self):
         if self.rgb is not None:
             return self
@@ -318,4 +565,4 @@ class LayeredImage:
             new_alpha[-self.yofs][-self.xofs] = 255
         else:
             new_alpha = None
-        return replace(self, rgb=new_rgb, alpha=new_alpha)
+        return replace(self, rgb=new_rgb, alpha=new_alpha, bbox=None)
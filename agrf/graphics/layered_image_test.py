@@ -1,6 +1,8 @@
 import pytest
 import numpy as np
-from .layered_image import LayeredImage
+from .layered_image import LayeredImage, blend_rgba, occupied_bbox
+from .palette import NUMPY_PALETTE
+from PIL import Image
 
 
 def test_blend_over_basic_rgb_alpha():
@@ -343,3 +345,250 @@ def test_blend_over_custom_alpha_parameter():
 
     assert result.rgb[0, 0, 0] > 0
     assert result.rgb[0, 0, 0] < 255
+
+
+@pytest.mark.parametrize("grow", [False, True])
+def test_adjust_canvas_adds_the_layers_the_overlay_has(grow):
+    # Whether or not the canvas has to grow, a missing layer is added exactly when the overlay has it
+    def image(xofs, layers):
+        return LayeredImage(
+            xofs,
+            0,
+            2,
+            2,
+            np.ones((2, 2, 3), dtype=np.uint8) if "rgb" in layers else None,
+            np.ones((2, 2), dtype=np.uint8) if "alpha" in layers else None,
+            np.ones((2, 2), dtype=np.uint8) if "mask" in layers else None,
+        )
+
+    for layers, other_layers, expected in [
+        (("rgb", "alpha"), ("mask",), ("rgb", "alpha", "mask")),
+        (("mask",), ("rgb", "alpha"), ("rgb", "alpha", "mask")),
+        (("mask",), ("rgb",), ("rgb", "mask")),
+        (("rgb", "alpha"), ("rgb", "alpha"), ("rgb", "alpha")),
+    ]:
+        base = image(0, layers)
+        base.adjust_canvas(image(3 if grow else 0, other_layers))
+        assert base.w == (5 if grow else 2)
+        assert tuple(k for k in ["rgb", "alpha", "mask"] if getattr(base, k) is not None) == expected
+
+
+def random_image(rng, has_mask):
+    w, h = rng.integers(1, 12, size=2)
+    return LayeredImage(
+        xofs=int(rng.integers(-10, 10)),
+        yofs=int(rng.integers(-10, 10)),
+        w=int(w),
+        h=int(h),
+        rgb=rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8),
+        alpha=rng.choice(np.array([0, 1, 128, 254, 255], dtype=np.uint8), size=(h, w)),
+        mask=rng.integers(0, 3, size=(h, w), dtype=np.uint8) if has_mask else None,
+    )
+
+
+@pytest.mark.parametrize("start_empty", [True, False])
+def test_blend_all_matches_repeated_blend_over(start_empty):
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        base = LayeredImage.empty() if start_empty else random_image(rng, rng.random() < 0.5)
+        layers = [random_image(rng, rng.random() < 0.5) for _ in range(rng.integers(1, 6))]
+        layers.insert(int(rng.integers(0, len(layers))), LayeredImage.empty())
+
+        expected = base.copy()
+        for layer in layers:
+            expected.blend_over(layer)
+        result = base.copy().blend_all(layers)
+
+        assert (result.xofs, result.yofs, result.w, result.h) == (expected.xofs, expected.yofs, expected.w, expected.h)
+        for k in ["rgb", "alpha", "mask"]:
+            if getattr(expected, k) is None:
+                assert getattr(result, k) is None
+            else:
+                np.testing.assert_array_equal(getattr(result, k), getattr(expected, k))
+
+
+def test_blend_all_allocates_the_canvas_once():
+    a = LayeredImage.canvas(0, 0, 2, 2)
+    b = LayeredImage.canvas(-3, 1, 2, 2)
+    c = LayeredImage.canvas(4, -2, 1, 1)
+    layers = [a.copy(), b.copy(), c.copy()]
+
+    base = LayeredImage.canvas(0, 0, 1, 1)
+    rgb = base.rgb
+    base.blend_all(layers)
+    assert base.rgb is not rgb
+    canvas = base.rgb
+    assert (base.xofs, base.yofs, base.w, base.h) == (-3, -2, 8, 5)
+    base.blend_all(layers)
+    assert base.rgb is canvas
+
+
+def reference_blend(rgb, alpha, other_rgb, other_alpha, opacity):
+    alpha1 = alpha.astype(np.uint32)
+    alpha2 = other_alpha.astype(np.uint32)
+    alpha1_component = np.expand_dims(alpha1 * (65025 - alpha2 * opacity), 2)
+    alpha2_component = np.expand_dims(alpha2 * opacity * 255, 2)
+    new_alpha = alpha1_component + alpha2_component
+    rgb = (alpha1_component * rgb + alpha2_component * other_rgb + new_alpha // 2) // np.maximum(new_alpha, 1)
+    return rgb.astype(np.uint8), ((new_alpha[:, :, 0] + 32513) // 65025).astype(np.uint8)
+
+
+@pytest.mark.parametrize("opacity", [255, 128, 1, 0])
+def test_blend_rgba_is_exact(opacity):
+    # Every pair of alphas, with random colours; a second pass with extreme colours
+    alpha, other_alpha = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+    rng = np.random.default_rng(opacity)
+    for low, high in [(0, 256), (250, 256), (0, 6)]:
+        rgb = rng.integers(low, high, size=(256, 256, 3), dtype=np.uint8)
+        other_rgb = rng.integers(0, 256, size=(256, 256, 3), dtype=np.uint8)
+        expected_rgb, expected_alpha = reference_blend(rgb, alpha, other_rgb, other_alpha, opacity)
+
+        result_rgb, result_alpha = rgb.copy(), alpha.copy()
+        blend_rgba(result_rgb, result_alpha, other_rgb, other_alpha, opacity)
+        np.testing.assert_array_equal(result_rgb, expected_rgb)
+        np.testing.assert_array_equal(result_alpha, expected_alpha)
+
+
+def sparse_image(rng, xofs, yofs):
+    image = random_image(rng, True)
+    image.xofs, image.yofs = xofs, yofs
+    keep = np.zeros((image.h, image.w), dtype=bool)
+    keep[image.h // 3 : image.h // 3 + 2, image.w // 4 : image.w // 4 + 3] = True
+    image.alpha = np.where(keep, image.alpha, 0).astype(np.uint8)
+    image.mask = np.where(keep, image.mask, 0).astype(np.uint8)
+    return image
+
+
+def test_bbox_tracks_blended_content():
+    canvas = LayeredImage.canvas(-20, -20, 40, 40)
+    sprite = LayeredImage.canvas(3, -5, 6, 6)
+    sprite.rgb[:] = 100
+    sprite.alpha[1, 2] = 255
+    sprite.bbox = None
+    canvas.blend_over(sprite)
+    assert canvas.bbox == (25, 16, 26, 17)
+    assert canvas.occupied() == occupied_bbox(canvas.rgb, canvas.alpha, canvas.mask)
+
+    canvas.blend_over(LayeredImage.canvas(30, 30, 5, 5))
+    assert canvas.bbox == (25, 16, 26, 17)
+    assert canvas.w == 55
+
+
+class Remap:
+    def __init__(self, remap):
+        self.remap = remap
+
+    def remap_array(self, a):
+        return self.remap[a]
+
+
+@pytest.mark.parametrize("zero_to", [0, 7])
+def test_bbox_skipping_keeps_visible_results(zero_to):
+    rng = np.random.default_rng(zero_to)
+    for _ in range(20):
+        layers = [sparse_image(rng, int(rng.integers(-10, 10)), int(rng.integers(-10, 10))) for _ in range(4)]
+        tracked = LayeredImage.canvas(-8, -8, 16, 16)
+        untracked = LayeredImage.canvas(-8, -8, 16, 16)
+        remap = Remap(np.roll(np.arange(256, dtype=np.uint8), zero_to))
+
+        tracked.blend_all([layer.copy() for layer in layers]).remap(remap)
+        for layer in layers:
+            layer.bbox = None
+            untracked.blend_over(layer)
+            untracked.bbox = None
+        untracked.remap(remap)
+        untracked.bbox = None
+
+        np.testing.assert_array_equal(tracked.mask, untracked.mask)
+        for image in [tracked, untracked]:
+            image.apply_mask()
+        np.testing.assert_array_equal(tracked.alpha, untracked.alpha)
+        visible = tracked.alpha != 0
+        np.testing.assert_array_equal(tracked.rgb[visible], untracked.rgb[visible])
+
+        untracked.bbox = None
+        tracked.crop()
+        untracked.crop()
+        assert (tracked.xofs, tracked.yofs, tracked.w, tracked.h) == (
+            untracked.xofs,
+            untracked.yofs,
+            untracked.w,
+            untracked.h,
+        )
+
+
+def reference_apply_mask(rgb, mask):
+    v = np.min(rgb, axis=2, keepdims=True)
+    mask_colour = NUMPY_PALETTE[mask].astype(np.uint16)
+    mask_colour *= v
+    mask_colour //= 2**7
+    r_ob = np.maximum(mask_colour[:, :, 0], 255) - 255
+    g_ob = np.maximum(mask_colour[:, :, 1], 255) - 255
+    b_ob = np.maximum(mask_colour[:, :, 2], 255) - 255
+    ob = (r_ob + g_ob + b_ob) // 2
+
+    above = mask_colour >= 255
+    below = np.minimum(mask_colour + ob[:, :, np.newaxis] * (255 - mask_colour) // 256, 255).astype(np.uint8)
+    mixed = np.where(above, 255, below)
+    return np.where((mask == 0)[:, :, np.newaxis], rgb, mixed)
+
+
+def test_apply_mask_matches_per_pixel_shading():
+    # Every (mask index, darkest channel) pair, with random brighter channels
+    mask, v = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+    rng = np.random.default_rng(0)
+    rgb = np.maximum(rng.integers(0, 256, size=(256, 256, 3), dtype=np.uint8), v[:, :, np.newaxis])
+    rgb[:, :, 0] = v
+
+    image = LayeredImage(0, 0, 256, 256, rgb.copy(), np.full((256, 256), 255, dtype=np.uint8), mask.copy())
+    image.apply_mask()
+    assert image.mask is None
+    np.testing.assert_array_equal(image.rgb, reference_apply_mask(rgb, mask))
+
+
+def test_pyramid_matches_pillow():
+    rng = np.random.default_rng(0)
+    image = LayeredImage(
+        -124,
+        -30,
+        256,
+        127,
+        rng.integers(0, 256, size=(127, 256, 3), dtype=np.uint8),
+        rng.integers(0, 256, size=(127, 256), dtype=np.uint8),
+        rng.integers(0, 256, size=(127, 256), dtype=np.uint8),
+    )
+    pyramid = image.pyramid((2, 4))
+    assert [(x.xofs, x.yofs, x.w, x.h) for x in pyramid.values()] == [(-62, -15, 128, 63), (-31, -7, 64, 31)]
+
+    for f, scaled in pyramid.items():
+        # Box filtered like Image.reduce over the complete blocks; the mask takes the pixel nearest to the centre
+        h, w = 127 // f * f, 256
+        for k in ["rgb", "alpha"]:
+            reduced = np.asarray(Image.fromarray(getattr(image, k)[:h, :w]).reduce(f))
+            np.testing.assert_array_equal(getattr(scaled, k), reduced)
+        nearest = Image.fromarray(image.mask[:h, :w])
+        nearest.thumbnail((w // f, h // f), Image.Resampling.NEAREST)
+        np.testing.assert_array_equal(scaled.mask, np.asarray(nearest))
+        assert not np.shares_memory(scaled.mask, image.mask)
+
+
+def test_pyramid_factors():
+    rng = np.random.default_rng(0)
+    image = LayeredImage(0, 0, 64, 64, None, rng.integers(200, 256, size=(64, 64), dtype=np.uint8), None)
+    # 32x32 blocks of 8-bit values overflow uint16 sums
+    scaled = image.pyramid((32,))[32]
+    np.testing.assert_array_equal(scaled.alpha, np.asarray(Image.fromarray(image.alpha).reduce(32)))
+
+    for f in [1, 3, 6]:
+        with pytest.raises(ValueError):
+            image.pyramid((2, f))
+
+
+def test_resize_halving_uses_pyramid():
+    image = LayeredImage.canvas(0, 0, 8, 6)
+    image.rgb[2:4, 2:6] = 200
+    image.alpha[2:4, 2:6] = 255
+    image.bbox = (2, 2, 6, 4)
+    image.resize(4, 3)
+    assert (image.w, image.h, image.bbox) == (4, 3, (1, 1, 3, 2))
+    assert image.alpha.tolist() == [[0, 0, 0, 0], [0, 255, 255, 0], [0, 0, 0, 0]]
@@ -0,0 +1,66 @@
+import os
+import threading
+import numpy as np
+from PIL import Image
+from agrf.gorender.cache import scale_outputs
+from agrf.gorender.diskgc import touch
+
+
+def mirror_angle(angle):
+    return (-angle) % 360
+
+
+def mirror_mapping(sprites, flipped_sprites):
+    """
+    For every flipped sprite, find the unflipped sprite whose horizontally mirrored render looks the same.
+
+    Returns a list of indices into `sprites`, or None if some view has no mirror image among them.
+    """
+
+    def rest(sprite):
+        return {k: v for k, v in sprite.items() if k not in ("angle", "flip")}
+
+    mapping = []
+    for flipped in flipped_sprites:
+        for j, sprite in enumerate(sprites):
+            if (
+                sprite["angle"] % 360 == mirror_angle(flipped["angle"])
+                and sprite.get("flip", False) != flipped.get("flip", False)
+                and rest(sprite) == rest(flipped)
+            ):
+                mapping.append(j)
+                break
+        else:
+            return None
+    return mapping
+
+
+def strip_positions(widths, scale):
+    return [(sum(widths[:i]) + 8 * i) * scale for i in range(len(widths))]
+
+
+def mirror_render(src_path, dst_path, src_widths, widths, mapping, scale):
+    """Write the sheets of `dst_path` by flipping strips of the already rendered `src_path` sheets."""
+    src_positions = strip_positions(src_widths, scale)
+    positions = strip_positions(widths, scale)
+    sheet_width = positions[-1] + widths[-1] * scale if widths else 0
+    prefix_len = len(f"{src_path}_{scale}x_")
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    for path in scale_outputs(src_path, scale):
+        with Image.open(path) as im:
+            src = np.asarray(im)
+            palette = im.getpalette() if im.mode == "P" else None
+            mode = im.mode
+        dst = np.zeros((src.shape[0], sheet_width) + src.shape[2:], dtype=src.dtype)
+        for i, j in enumerate(mapping):
+            w = widths[i] * scale
+            dst[:, positions[i] : positions[i] + w] = src[:, src_positions[j] : src_positions[j] + w][:, ::-1]
+        out = Image.fromarray(dst, mode)
+        if palette is not None:
+            out.putpalette(palette)
+        # The old sheet may be a hard link into the render cache, so never write through it
+        out_path = f"{dst_path}_{scale}x_{path[prefix_len:]}"
+        tmp = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        out.save(tmp, format="PNG")
+        os.replace(tmp, out_path)
+        touch(out_path)
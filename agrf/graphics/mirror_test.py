@@ -0,0 +1,80 @@
+import os
+import grf
+import numpy as np
+from PIL import Image
+from unittest.mock import patch
+from agrf.graphics.mirror import mirror_mapping, mirror_render
+from agrf.graphics.voxel import LazyVoxel
+
+
+def test_mirror_mapping():
+    sprites = [{"angle": a, "width": 4} for a in [0, 45, 180, 315]]
+    flipped = [{**x, "flip": True} for x in sprites]
+    assert mirror_mapping(sprites, flipped) == [0, 3, 2, 1]
+    assert mirror_mapping(sprites[:2], flipped[:2]) is None
+    assert mirror_mapping(sprites, [{**x, "width": 5} for x in flipped]) is None
+
+
+def test_flip_mirrors_rendered_strips(tmp_path):
+    config = {
+        "sprites": [{"angle": 45, "width": 2, "height": 3}, {"angle": 315, "width": 2, "height": 3}],
+        "size": {"x": 4, "y": 4, "z": 4},
+        "agrf_scales": [1],
+        "agrf_mirror_flip": True,
+        "agrf_bbox_joggle": [(1, 2), (3, 4)],
+    }
+    base = LazyVoxel("model", prefix=str(tmp_path), voxel_getter=lambda: "model.vox", config=config)
+    flipped = base.flip("flipped")
+    assert flipped.config["agrf_bbox_joggle"] == [(-3, 4), (-1, 2)]
+
+    rgba = np.random.default_rng(0).integers(0, 256, (3, 12, 4), dtype=np.uint8)
+
+    def fake_render(voxel, vox_path, output_path, scales=None):
+        Image.fromarray(rgba, "RGBA").save(f"{output_path}_1x_32bpp.png")
+
+    with patch("agrf.graphics.voxel.render", fake_render):
+        flipped.render()
+
+    assert base.rendered and flipped.rendered
+    with Image.open(tmp_path / "flipped" / "model_1x_32bpp.png") as im:
+        mirrored = np.asarray(im)
+    assert (mirrored[:, 0:2] == rgba[:, 10:12][:, ::-1]).all()
+    assert (mirrored[:, 10:12] == rgba[:, 0:2][:, ::-1]).all()
+
+
+def test_flip_mirrors_per_view_shifts(tmp_path):
+    config = {
+        "sprites": [{"angle": a, "width": 2, "height": 3} for a in [0, 45, 90, 315]],
+        "size": {"x": 4, "y": 4, "z": 4},
+        "agrf_scales": [1],
+        "agrf_bpps": [32],
+        "agrf_mirror_flip": True,
+        "agrf_deltas": [(1, 2), (3, 4), (5, 6), (7, 8)],
+        "agrf_offsets": [(0, 1), (2, 3), (4, 5), (6, 7)],
+        "agrf_subset": [0, 1, 3],
+    }
+    base = LazyVoxel("model", prefix=str(tmp_path), voxel_getter=lambda: "model.vox", config=config)
+    flipped = base.flip("flipped")
+
+    # 45 and 315 swap places; the view left out of the subset is untouched
+    assert flipped.mirror_of[1] == [0, 2, 1]
+    assert flipped.config["agrf_deltas"] == [(-1, 2), (-7, 8), (5, 6), (-3, 4)]
+    assert flipped.final_config["agrf_offsets"] == [(0, 1), (-6, 7), (-2, 3)]
+
+    # The sheet is cut with the shifts of the mirrored views
+    sprites = [x.get_sprite(zoom=grf.ZOOM_NORMAL, bpp=32) for x in flipped.spritesheet(xdiff=1)]
+    assert [x.xofs for x in sprites] == [-1, -7, -3]
+
+
+def test_mirror_render_does_not_write_through_hard_links(tmp_path):
+    rgba = np.random.default_rng(0).integers(0, 256, (3, 2, 4), dtype=np.uint8)
+    Image.fromarray(rgba, "RGBA").save(tmp_path / "src_1x_32bpp.png")
+    Image.fromarray(np.zeros_like(rgba), "RGBA").save(tmp_path / "cached.png")
+    os.link(tmp_path / "cached.png", tmp_path / "dst_1x_32bpp.png")
+
+    mirror_render(str(tmp_path / "src"), str(tmp_path / "dst"), [2], [2], [0], 1)
+
+    with Image.open(tmp_path / "dst_1x_32bpp.png") as im:
+        assert (np.asarray(im) == rgba[:, ::-1]).all()
+    with Image.open(tmp_path / "cached.png") as im:
+        assert not np.asarray(im).any()
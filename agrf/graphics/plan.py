@@ -0,0 +1,141 @@
+"""
+Declarative render plans.
+
+A plan lists every step needed to render a set of LazyVoxels: sources, positor operations, layer filters, renders and
+mirrors. Each node is identified by the path it writes, and names the nodes it reads. Plans are plain JSON, so they
+can be diffed between builds, inspected, or run by a separate process:
+
+    python -m agrf.graphics.plan plan.json --jobs 8
+"""
+
+import argparse
+import json
+import os
+from agrf.gorender import Config, render, positor_many, positor_output, discard_layers, keep_layers
+from agrf.graphics.mirror import mirror_render
+from agrf.graphics.scheduler import RenderTask, run_tasks
+from agrf.graphics.voxel import VoxelGetter, PositorStep, LayerFilterStep
+
+PLAN_VERSION = 1
+
+
+class Plan:
+    def __init__(self):
+        self.nodes = {}
+        self._getters = {}
+
+    def _add(self, id, op, params, inputs):
+        self.nodes.setdefault(id, {"id": id, "op": op, "params": params, "inputs": inputs})
+        return id
+
+    def getter(self, voxel_getter):
+        """Add the steps producing a voxel getter's .vox and return its path; nothing is run."""
+        if id(voxel_getter) in self._getters:
+            return self._getters[id(voxel_getter)]
+
+        if isinstance(voxel_getter, PositorStep):
+            inputs = [self.getter(d) for d in voxel_getter.dependencies]
+            operation = voxel_getter.operation(*inputs)
+            ret = self._add(
+                positor_output(inputs[0], voxel_getter.new_path, operation),
+                "positor",
+                {"operation": operation, "new_path": voxel_getter.new_path},
+                inputs,
+            )
+        elif isinstance(voxel_getter, LayerFilterStep):
+            ret = self._add(
+                voxel_getter.new_path,
+                f"{voxel_getter.flag}_layers",
+                {"layers": list(voxel_getter.layers)},
+                [self.getter(voxel_getter.source)],
+            )
+        elif isinstance(voxel_getter, VoxelGetter):
+            raise ValueError(f"Cannot plan an opaque voxel getter: {voxel_getter!r}")
+        else:
+            # Source voxels are plain callables that merely return a path
+            ret = self._add(voxel_getter(), "source", {}, [])
+
+        self._getters[id(voxel_getter)] = ret
+        return ret
+
+    def voxel(self, voxel):
+        """Add the steps rendering a LazyVoxel's sheets and return the node that writes them."""
+        shared = voxel.shared_strips()
+        if shared is not None:
+            return self.voxel(shared[0])
+
+        output = os.path.join(voxel.prefix, voxel.name)
+        if voxel.mirror_of is not None:
+            source, mapping = voxel.mirror_source()
+            return self._add(
+                output,
+                "mirror",
+                {
+                    "src_widths": [x["width"] for x in source.final_config["sprites"]],
+                    "widths": [x["width"] for x in voxel.final_config["sprites"]],
+                    "mapping": mapping,
+                    "scales": voxel.scales,
+                },
+                [self.voxel(source)],
+            )
+
+        return self._add(
+            output, "render", {"config": voxel.final_config, "scales": voxel.scales}, [self.getter(voxel.voxel_getter)]
+        )
+
+    def to_json(self):
+        # Sorted so that plans of two builds diff cleanly
+        return {"version": PLAN_VERSION, "nodes": [self.nodes[id] for id in sorted(self.nodes)]}
+
+
+def make_plan(voxels):
+    plan = Plan()
+    for voxel in voxels:
+        plan.voxel(voxel)
+    return plan.to_json()
+
+
+def run_node(node):
+    op, params, inputs = node["op"], node["params"], node["inputs"]
+    if op == "source":
+        if not os.path.exists(node["id"]):
+            raise FileNotFoundError(node["id"])
+    elif op == "positor":
+        positor_many(inputs[0], [(params["operation"], params["new_path"])])
+    elif op == "discard_layers":
+        discard_layers(params["layers"], inputs[0], node["id"])
+    elif op == "keep_layers":
+        keep_layers(params["layers"], inputs[0], node["id"])
+    elif op == "render":
+        render(Config(config=params["config"]), inputs[0], node["id"], scales=params["scales"])
+    elif op == "mirror":
+        for scale in params["scales"]:
+            mirror_render(inputs[0], node["id"], params["src_widths"], params["widths"], params["mapping"], scale)
+    else:
+        raise ValueError(f"Unknown plan operation: {op}")
+
+
+def execute_plan(plan, jobs=None):
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version: {plan.get('version')}")
+
+    tasks = {node["id"]: RenderTask(node["id"], lambda node=node: run_node(node), False) for node in plan["nodes"]}
+    for node in plan["nodes"]:
+        for input in node["inputs"]:
+            tasks[node["id"]].dependencies.append(tasks[input])
+            tasks[input].dependents.append(tasks[node["id"]])
+    run_tasks(list(tasks.values()), jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a render plan written by agrf.graphics.plan.make_plan")
+    parser.add_argument("plan", help="Plan JSON file")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of steps to run at once")
+    args = parser.parse_args()
+
+    with open(args.plan) as f:
+        execute_plan(json.load(f), args.jobs)
+
+
+if __name__ == "__main__":
+    main()
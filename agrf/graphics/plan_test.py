@@ -0,0 +1,53 @@
+import json
+import threading
+from unittest.mock import patch
+from agrf.graphics.plan import make_plan, execute_plan
+from agrf.graphics.voxel import LazyVoxel
+
+
+def make_voxels():
+    config = {"sprites": [{"width": 8, "angle": 0}], "size": {"x": 4, "y": 4, "z": 4}, "agrf_scales": [1, 2]}
+    base = LazyVoxel("model", prefix="/build", voxel_getter=lambda: "/src/model.vox", config=config)
+    pitched = base.change_pitch(5, "pitch")
+    return [pitched.stairstep(2, "a"), pitched.discard_layers(("roof",), "noroof"), pitched.compose(base, "double")]
+
+
+def test_plan_is_declarative_json():
+    plan = make_plan(make_voxels())
+    nodes = {node["id"]: node for node in plan["nodes"]}
+
+    assert nodes["/src/model.vox"]["op"] == "source"
+    assert nodes["/build/pitch/model.vox"]["params"]["operation"]["type"] == "rotate_y"
+    assert nodes["/build/pitch/a/model.vox"]["inputs"] == ["/build/pitch/model.vox"]
+    assert nodes["/build/pitch/noroof/model.vox"]["params"] == {"layers": ["roof"]}
+    assert nodes["/build/pitch/double/model.vox"]["inputs"] == ["/build/pitch/model.vox", "/src/model.vox"]
+    assert nodes["/build/pitch/double/model.vox"]["params"]["operation"]["file"] == "/src/model.vox"
+    assert nodes["/build/pitch/a/model"]["params"]["scales"] == [1, 2]
+
+    assert json.loads(json.dumps(plan)) == plan
+    assert make_plan(make_voxels()) == plan
+
+
+def test_execute_plan_runs_steps_in_dependency_order():
+    lock = threading.Lock()
+    log = []
+
+    def record(kind):
+        def run(*args, **kwargs):
+            with lock:
+                log.append((kind, args[1] if kind == "render" else args[-1]))
+
+        return run
+
+    plan = make_plan(make_voxels())
+    with (
+        patch("agrf.graphics.plan.positor_many", lambda path, jobs: record("positor")(jobs[0][1])),
+        patch("agrf.graphics.plan.discard_layers", record("discard")),
+        patch("agrf.graphics.plan.render", record("render")),
+        patch("os.path.exists", lambda path: True),
+    ):
+        execute_plan(plan, jobs=4)
+
+    assert len(log) == 7
+    assert log[0] == ("positor", "/build/pitch")
+    assert log.index(("positor", "/build/pitch/a")) < log.index(("render", "/build/pitch/a/model.vox"))
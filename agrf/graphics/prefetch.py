@@ -0,0 +1,120 @@
+"""
+Render every voxel sheet a NewGRF needs concurrently, instead of one at a time as grf-py's writer reaches them.
+
+    prefetch(g, jobs=8, memory_limit=2 << 30)
+    g.write("out.grf")
+
+Rendering starts in the background as soon as `write` has evaluated the sprite generators, so it overlaps with the rest
+of the build; the writer simply waits on any sheet still being rendered when it gets there.
+"""
+
+import sys
+import threading
+import grf
+from agrf.gorender.geometry import sprite_dimens
+from .scheduler import RenderGraph, run_tasks
+from .spritesheet import LazyAlternativeSprites, VoxelFile
+
+# 8bpp, 32bpp and mask sheets, in bytes per pixel
+BYTES_PER_PIXEL = 1 + 4 + 1
+
+
+def find_voxels(sprites):
+    """Return `(voxel, scales)` for every LazyVoxel whose sheets the given sprites are cut from, without rendering."""
+    found = {}
+    seen = set()
+
+    def visit(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        if isinstance(obj, LazyAlternativeSprites):
+            # Its sprites are cut from the sheets of this voxel (or of the one it shares strips with)
+            found.setdefault(id(obj.voxel), (obj.voxel, set()))[1].update(obj.scales)
+        elif isinstance(obj, VoxelFile):
+            found.setdefault(id(obj.voxel), (obj.voxel, set()))[1].add(obj.scale)
+        elif isinstance(obj, (list, tuple)):
+            for x in obj:
+                visit(x)
+        elif isinstance(obj, dict):
+            for x in obj.values():
+                visit(x)
+        elif isinstance(obj, (grf.ResourceAction, grf.Resource)):
+            for x in vars(obj).values():
+                visit(x)
+
+    visit(sprites)
+    return [(voxel, sorted(scales)) for voxel, scales in found.values()]
+
+
+def render_cost(voxel, scales):
+    """Rough peak memory of rendering some scales of a voxel, in bytes."""
+    final_config = voxel.final_config
+    bbox = final_config["size"]
+    z_scale = final_config.get("z_scale", 1.0)
+    area = 0
+    for sprite in final_config["sprites"]:
+        width, height, _ = sprite_dimens(sprite, bbox, z_scale)
+        area += width * height
+    return int(area * sum(scale * scale for scale in scales) * BYTES_PER_PIXEL)
+
+
+def print_progress(done, total):
+    sys.stderr.write(f"\rRendering voxels: {done}/{total}")
+    if done == total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def prefetch_sprites(sprites, jobs=None, memory_limit=None, progress=None):
+    """
+    Render all voxel sheets reachable from `sprites` concurrently.
+
+    `memory_limit` caps the estimated memory of renders in flight; `progress(done, total)` is called as steps finish.
+    """
+    graph = RenderGraph()
+    for voxel, scales in find_voxels(sprites):
+        graph.add(voxel, scales, render_cost(voxel, scales))
+    run_tasks(graph.pending, jobs, memory_limit, progress)
+
+
+class Prefetcher:
+    """Starts `prefetch_sprites` in a background thread once a NewGRF's sprite generators have been evaluated."""
+
+    def __init__(self, g, jobs=None, memory_limit=None, progress=None):
+        self.jobs = jobs
+        self.memory_limit = memory_limit
+        self.progress = progress
+        self.thread = None
+        self.error = None
+
+        generate_sprites = g.generate_sprites
+
+        def wrapper():
+            sprites = generate_sprites()
+            self.start(sprites)
+            return sprites
+
+        g.generate_sprites = wrapper
+
+    def run(self, sprites):
+        try:
+            prefetch_sprites(sprites, self.jobs, self.memory_limit, self.progress)
+        except BaseException as e:
+            # The writer renders whatever failed again itself, so the error surfaces there too
+            self.error = e
+
+    def start(self, sprites):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, args=(sprites,), daemon=True)
+            self.thread.start()
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def prefetch(g, jobs=None, memory_limit=None, progress=None):
+    return Prefetcher(g, jobs, memory_limit, progress)
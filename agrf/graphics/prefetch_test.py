@@ -0,0 +1,87 @@
+import threading
+import grf
+from unittest.mock import patch
+from agrf.graphics.voxel import LazyVoxel
+from agrf.graphics.scheduler import RenderTask, run_tasks
+from agrf.graphics.prefetch import find_voxels, prefetch, prefetch_sprites
+
+
+def make_voxel(name, scales=(1, 2)):
+    config = {
+        "sprites": [{"width": 32, "height": 32, "angle": 45}, {"width": 32, "height": 32, "angle": 135}],
+        "size": {"x": 10, "y": 10, "z": 20},
+        "agrf_scales": list(scales),
+        "agrf_bpps": [8, 32],
+    }
+    return LazyVoxel(name, prefix="/base", voxel_getter=lambda: f"/src/{name}.vox", config=config)
+
+
+def test_find_voxels_does_not_render():
+    a = make_voxel("a")
+    b = make_voxel("b", scales=(1, 2, 4))
+    sprites = [grf.Action1(feature=grf.TRAIN, set_count=1, sprite_count=2), *a.spritesheet(), *b.spritesheet()]
+
+    with patch("agrf.graphics.voxel.render") as render:
+        found = find_voxels(sprites)
+
+    assert render.call_count == 0
+    assert [(v.name, scales) for v, scales in found] == [("a", [1, 2]), ("b", [1, 2, 4])]
+
+
+def test_prefetch_renders_during_write():
+    rendered = []
+    voxels = [make_voxel(f"v{i}") for i in range(4)]
+
+    class FakeNewGRF:
+        def generate_sprites(self):
+            return [s for v in voxels for s in v.spritesheet()]
+
+        def write(self):
+            for s in self.generate_sprites():
+                s.get_resource_files()
+
+    def fake_render(voxel, vox_path, output_path, scales=None):
+        rendered.append((output_path, tuple(scales)))
+
+    g = FakeNewGRF()
+    with patch("agrf.graphics.voxel.render", fake_render):
+        prefetcher = prefetch(g, jobs=2)
+        g.write()
+        prefetcher.join()
+
+    assert sorted(rendered) == [(f"/base/v{i}", (1, 2)) for i in range(4)]
+    assert all(v.rendered for v in voxels)
+
+
+def test_prefetch_sprites_reports_progress():
+    reports = []
+    voxels = [make_voxel(f"v{i}") for i in range(3)]
+
+    with patch("agrf.graphics.voxel.render"):
+        prefetch_sprites([v.spritesheet() for v in voxels], jobs=2, progress=lambda done, total: reports.append(done))
+
+    assert reports == [1, 2, 3]
+
+
+def test_run_tasks_memory_limit():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def run():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.pop()
+
+    tasks = [RenderTask(i, run, False, cost=60) for i in range(6)]
+    run_tasks(tasks, jobs=4, memory_limit=100)
+    assert all(t.done for t in tasks)
+    assert max(peak) == 1
+
+    # A task larger than the limit still runs on its own
+    tasks = [RenderTask(i, run, False, cost=200) for i in range(2)]
+    run_tasks(tasks, jobs=4, memory_limit=100)
+    assert all(t.done for t in tasks)
@@ -1,4 +1,6 @@
+import functools
 import math
+import numpy as np
 
 
 def natural_dimens(angle, bbox, scale):
@@ -22,3 +24,51 @@ def unnatural_dimens(angle, bbox, scale, *, unnaturalness=1):
     new_x = bbox["x"] / math.cos(radian * unnaturalness)
 
     return natural_dimens(angle, {**bbox, "x": new_x}, scale)
+
+
+def trig(angles):
+    # Through math rather than NumPy's vectorized kernels, which may differ in the last bit and flip a ceil()
+    radians = [math.radians(angle) for angle in angles]
+    return np.array([math.cos(r) for r in radians]), np.array([math.sin(r) for r in radians])
+
+
+def natural_dimens_array(angles, bbox, scale):
+    """`natural_dimens` of many angles at once; `bbox["x"]` may also be an array, one entry per angle."""
+    cos, sin = trig(angles)
+    x, y, z = bbox["x"], bbox["y"], bbox["z"]
+    width = np.abs(x * sin) + np.abs(y * cos)
+    height = (np.abs(x * cos) + np.abs(y * sin)) * 0.5 + z
+    return width * scale, height * scale
+
+
+def unnatural_dimens_array(angles, bbox, scale, *, unnaturalness=1):
+    skew = np.array([math.cos(math.radians(abs(angle % 90 - 45)) * unnaturalness) for angle in angles])
+    return natural_dimens_array(angles, {**bbox, "x": bbox["x"] / skew}, scale)
+
+
+@functools.lru_cache(maxsize=None)
+def unnatural_sprite_dimens(angles, bbox, scale, unnaturalness):
+    """Whole-pixel `(widths, heights)` of sprites at `angles`; arguments are frozen so that results are shared."""
+    widths, heights = unnatural_dimens_array(angles, dict(bbox), scale, unnaturalness=unnaturalness)
+    return tuple(np.ceil(widths).astype(int).tolist()), tuple(np.ceil(heights).astype(int).tolist())
+
+
+def rotation_mapping(sprites, rotated_sprites):
+    """
+    For every rotated sprite, find an existing sprite that shows the very same view.
+
+    Returns a list of indices into `sprites`, or None if the rotation produces a view that was never rendered.
+    """
+
+    def rest(sprite):
+        return {k: v for k, v in sprite.items() if k != "angle"}
+
+    mapping = []
+    for rotated in rotated_sprites:
+        for j, sprite in enumerate(sprites):
+            if sprite["angle"] % 360 == rotated["angle"] % 360 and rest(sprite) == rest(rotated):
+                mapping.append(j)
+                break
+        else:
+            return None
+    return mapping
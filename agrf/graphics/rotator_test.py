@@ -1,7 +1,7 @@
 import numpy as np
 import pytest
 
-from .rotator import natural_dimens, unnatural_dimens
+from .rotator import natural_dimens, unnatural_dimens, unnatural_dimens_array
 
 _TEST_SCALE = 2**0.5 / 13
 _TEST_BBOX = {"x": 252, "y": 80, "z": 96}
@@ -34,3 +34,9 @@ def test_natural_dimens_matches_reference_values(angle, expected):
 @pytest.mark.parametrize("angle,expected", zip(_TEST_ANGLES, UNNATURAL_DIMENS))
 def test_unnatural_dimens_matches_reference_values(angle, expected):
     np.testing.assert_allclose(unnatural_dimens(angle, _TEST_BBOX, _TEST_SCALE), expected, rtol=1e-6, atol=1e-6)
+
+
+def test_unnatural_dimens_array_matches_scalar():
+    widths, heights = unnatural_dimens_array(list(_TEST_ANGLES), _TEST_BBOX, _TEST_SCALE, unnaturalness=1.5)
+    for angle, width, height in zip(_TEST_ANGLES, widths, heights):
+        assert (width, height) == unnatural_dimens(angle, _TEST_BBOX, _TEST_SCALE, unnaturalness=1.5)
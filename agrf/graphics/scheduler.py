@@ -0,0 +1,117 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from agrf.gorender import default_jobs
+from .voxel import VoxelGetter, getter_dependencies, want
+
+
+class RenderTask:
+    def __init__(self, key, run, done, cost=0):
+        self.key = key
+        self.run = run
+        self.done = done
+        self.cost = cost
+        self.dependencies = []
+        self.dependents = []
+
+    def __repr__(self):
+        return f"<RenderTask:{self.key}>"
+
+
+class RenderGraph:
+    """Dependency graph of the positor, layer filtering and gorender steps needed by a set of LazyVoxels."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def _getter_task(self, voxel_getter):
+        key = ("voxel", id(voxel_getter))
+        if key in self.tasks:
+            return self.tasks[key]
+        if isinstance(voxel_getter, VoxelGetter):
+            task = RenderTask(key, voxel_getter, voxel_getter.done)
+        else:
+            # Source voxels are plain callables; they are cheap and are resolved by whoever needs them
+            task = RenderTask(key, voxel_getter, True)
+        self.tasks[key] = task
+        for dependency in getter_dependencies(voxel_getter):
+            self._link(self._getter_task(dependency), task)
+        return task
+
+    def _link(self, dependency, task):
+        task.dependencies.append(dependency)
+        dependency.dependents.append(task)
+
+    def add(self, voxel, scales=None, cost=0):
+        key = ("render", id(voxel))
+        if key in self.tasks:
+            return self.tasks[key]
+        # By default only the scales sprite sheets will actually load, not every `agrf_scales` entry
+        scales = voxel.wanted_scales if scales is None else scales
+        task = RenderTask(key, functools.partial(voxel.render, scales=scales), voxel.has_rendered(scales), cost)
+        self.tasks[key] = task
+        want(voxel.voxel_getter)
+        self._link(self._getter_task(voxel.voxel_getter), task)
+        return task
+
+    @property
+    def pending(self):
+        return [t for t in self.tasks.values() if not t.done]
+
+
+def render_all(voxels, jobs=None):
+    """
+    Render every given LazyVoxel, running independent positor/layer filtering/gorender steps concurrently.
+
+    Each worker thread drives one external process at a time, so `jobs` bounds the number of tool processes alive at
+    once. The first failure cancels everything that has not started yet and is re-raised once running steps finish.
+    """
+    graph = RenderGraph()
+    for voxel in voxels:
+        graph.add(voxel)
+    run_tasks(graph.pending, jobs)
+
+
+def run_tasks(pending, jobs=None, memory_limit=None, progress=None):
+    """
+    Run `RenderTask`s as soon as their dependencies are done, `jobs` at a time.
+
+    With `memory_limit`, ready tasks wait while the `cost` of those running would exceed it; one task always runs, however
+    large. `progress(done, total)` is called after each task finishes.
+    """
+    waiting = {t.key: sum(1 for d in t.dependencies if not d.done) for t in pending}
+    ready = [t for t in pending if waiting[t.key] == 0]
+    running = {}
+    in_flight = 0
+    finished_count = 0
+
+    with ThreadPoolExecutor(max_workers=jobs or default_jobs()) as executor:
+        try:
+            while ready or running:
+                held = []
+                for task in ready:
+                    if memory_limit is not None and running and in_flight + task.cost > memory_limit:
+                        held.append(task)
+                        continue
+                    running[executor.submit(task.run)] = task
+                    in_flight += task.cost
+                ready = held
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    future.result()
+                    task.done = True
+                    in_flight -= task.cost
+                    finished_count += 1
+                    if progress is not None:
+                        progress(finished_count, len(pending))
+                    for dependent in task.dependents:
+                        if dependent.done:
+                            continue
+                        waiting[dependent.key] -= 1
+                        if waiting[dependent.key] == 0:
+                            ready.append(dependent)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
@@ -0,0 +1,96 @@
+import gc
+import threading
+import weakref
+import pytest
+from unittest.mock import patch
+from agrf.graphics import voxel
+from agrf.graphics.voxel import LazyVoxel, PositorStep, VoxelGetter, positor_siblings
+from agrf.graphics.scheduler import RenderGraph, render_all
+
+
+def make_voxel(prefix="/base"):
+    config = {"sprites": [{"width": 32, "height": 32, "angle": 45}], "size": {"x": 10, "y": 10, "z": 20}}
+    return LazyVoxel("test_voxel", prefix=prefix, voxel_getter=lambda: "/src/test_voxel.vox", config=config)
+
+
+def test_render_graph_shares_ancestors():
+    base = make_voxel()
+    pitched = base.change_pitch(5, "pitch")
+    a = pitched.stairstep(2, "a")
+    b = pitched.stairstep(-2, "b")
+
+    graph = RenderGraph()
+    graph.add(a)
+    graph.add(b)
+
+    # Two renders, two stairsteps, one shared pitch change; the source getter is already available
+    assert len(graph.pending) == 5
+
+
+def test_render_all_runs_each_step_once_in_dependency_order():
+    lock = threading.Lock()
+    log = []
+
+    def fake_positor(old_path, jobs):
+        with lock:
+            log.append(("positor", old_path, tuple(new_path for _, new_path in jobs)))
+
+    def fake_render(voxel, vox_path, output_path, scales=None):
+        with lock:
+            log.append(("render", vox_path, output_path))
+
+    base = make_voxel()
+    pitched = base.change_pitch(5, "pitch")
+    voxels = [pitched.stairstep(x, f"s{x}") for x in [1, 2, 3, 4]]
+
+    with patch("agrf.graphics.voxel.positor_many", fake_positor), patch("agrf.graphics.voxel.render", fake_render):
+        render_all(voxels, jobs=4)
+        render_all(voxels, jobs=4)
+
+    # The four sibling stairsteps share one positor process
+    positor_runs = [e for e in log if e[0] == "positor"]
+    assert len(positor_runs) == 2
+    assert positor_runs[0] == ("positor", "/src/test_voxel.vox", ("/base/pitch",))
+    assert positor_runs[1][1] == "/base/pitch/test_voxel.vox"
+    assert sorted(positor_runs[1][2]) == [f"/base/pitch/s{x}" for x in [1, 2, 3, 4]]
+    assert sum(1 for e in log if e[0] == "render") == 4
+    for x in [1, 2, 3, 4]:
+        rendered = log.index(("render", f"/base/pitch/s{x}/test_voxel.vox", f"/base/pitch/s{x}/test_voxel"))
+        assert log.index(positor_runs[1]) < rendered
+    assert all(v.rendered for v in voxels)
+
+
+def test_render_all_fails_fast():
+    rendered = []
+
+    def failing_positor(old_path, jobs):
+        raise RuntimeError("positor failed")
+
+    base = make_voxel()
+    voxels = [base.change_pitch(5, "pitch"), base.flip("flip")]
+
+    with (
+        patch("agrf.graphics.voxel.positor_many", failing_positor),
+        patch("agrf.graphics.voxel.render", lambda voxel, *args, **kwargs: rendered.append(voxel)),
+    ):
+        with pytest.raises(RuntimeError, match="positor failed"):
+            render_all(voxels, jobs=1)
+
+    assert not voxels[0].rendered
+
+
+def test_positor_groups_do_not_outlive_their_steps():
+    groups = getattr(voxel, "__positor_groups")
+    source = VoxelGetter(lambda: "/src/test_voxel.vox")
+    steps = [PositorStep(source, f"/base/{i}", lambda path: {"name": ""}) for i in range(3)]
+    assert all(step.group is steps[0].group for step in steps)
+    assert source in groups
+
+    del steps[1:]
+    gc.collect()
+    assert len(positor_siblings(steps[0].group)) == 1
+
+    source = weakref.ref(source)
+    del steps
+    gc.collect()
+    assert source() is None
@@ -1,9 +1,14 @@
 import os
+import threading
 import numpy as np
 import grf
 import math
 import functools
+from collections import OrderedDict
+from agrf.gorender.diskgc import touch
+from agrf.utils import freeze
 from .misc import SCALE_TO_ZOOM, ZOOM_TO_SCALE
+from .rotator import trig
 
 THIS_FILE = grf.PythonFile(__file__)
 
@@ -11,20 +16,179 @@ THIS_FILE = grf.PythonFile(__file__)
 __image_file_cache = {}
 
 
+class ImageCache:
+    """Decoded VoxelFiles, least recently used first; the oldest are unloaded while they total more than `limit` bytes."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.files = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def touch(self, file, size):
+        evicted = []
+        with self.lock:
+            if file in self.files:
+                self.files.move_to_end(file)
+                return
+            self.files[file] = size
+            self.size += size
+            # The file just touched is about to be read, so it always stays
+            while self.limit is not None and self.size > self.limit and len(self.files) > 1:
+                old, old_size = self.files.popitem(last=False)
+                self.size -= old_size
+                evicted.append(old)
+        for old in evicted:
+            old.unload()
+
+    def forget(self, file):
+        with self.lock:
+            self.size -= self.files.pop(file, 0)
+
+
+image_cache = ImageCache(int(os.environ.get("AGRF_IMAGE_CACHE_BYTES", 0)) or None)
+
+# Split sheets into per-sprite crops stored beside them, so that sprites can be decoded without the whole strip
+SPLIT_SHEETS = os.environ.get("AGRF_SPLIT_SHEETS", "1") != "0"
+LAYERS = ("rgb", "alpha", "mask")
+
+
+def used_bounds(rgb, alpha, mask):
+    """`(x0, y0, x1, y1)` of the used area of the layer grf.Sprite._do_crop would scan; all zeros if nothing is used."""
+    if alpha is not None:
+        cols, rows = alpha.any(0), alpha.any(1)
+    elif rgb is not None:
+        cols, rows = rgb.any((0, 2)), rgb.any((1, 2))
+    else:
+        cols, rows = mask.any(0), mask.any(1)
+    cols, rows = np.flatnonzero(cols), np.flatnonzero(rows)
+    if len(cols) == 0:
+        return (0, 0, 0, 0)
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def union_bounds(a, b):
+    if a[2] == 0:
+        return b
+    if b[2] == 0:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def place(layer, origin, box):
+    """`layer`, whose top left pixel sits at `origin`, cut or zero padded to `box` = `(x0, y0, x1, y1)`."""
+    x0, y0, x1, y1 = box
+    ret = np.zeros((y1 - y0, x1 - x0) + layer.shape[2:], dtype=layer.dtype)
+    lx, ly = origin
+    ox0, oy0 = max(lx, x0), max(ly, y0)
+    ox1, oy1 = min(lx + layer.shape[1], x1), min(ly + layer.shape[0], y1)
+    if ox0 < ox1 and oy0 < oy1:
+        ret[oy0 - y0 : oy1 - y0, ox0 - x0 : ox1 - x0] = layer[oy0 - ly : oy1 - ly, ox0 - lx : ox1 - lx]
+    return ret
+
+
+def split_path(path):
+    return os.path.splitext(path)[0] + ".crops.npz"
+
+
+def source_stamp(path):
+    st = os.stat(path)
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+
 class VoxelFile(grf.ImageFile):
-    def __init__(self, voxel, path):
+    def __init__(self, voxel, path, scale):
         super().__init__(path)
         self._voxel = voxel
+        self.scale = scale
+        self.users = 0
+        self.sprites = []
+        self._users_lock = threading.Lock()
+        self._split_lock = threading.Lock()
+        self._split_keys = None
+        self._crops = None
+
+    @property
+    def voxel(self):
+        return self._voxel
+
+    def add_sprite(self, sprite):
+        with self._users_lock:
+            self.sprites.append(sprite)
+
+    def add_user(self):
+        with self._users_lock:
+            self.users += 1
+
+    def release(self):
+        """Called once per `add_user` when that sprite has been decoded; the last one frees the pixels."""
+        with self._users_lock:
+            self.users -= 1
+            unused = self.users == 0
+        if unused:
+            self.unload()
 
     def load(self):
-        self._voxel.render()
+        # Every zoom level some sprite has been pulled from, in one go; the others would otherwise each rerun gorender
+        self._voxel.request_scale(self.scale)
+        self._voxel.render(scales=self._voxel.wanted_scales)
         super().load()
-
-
-def make_image_file(voxel, path):
+        image = self._image
+        if image is not None:
+            image_cache.touch(self, image[0].width * image[0].height * len(image[0].getbands()))
+
+    def unload(self):
+        super().unload()
+        image_cache.forget(self)
+        self._crops = None
+
+    def split(self, context):
+        """
+        Cropped layers and crop bounds of every sprite cut from this sheet, keyed as stored in `split_path`.
+
+        The sheet is decoded at most once for all of them, and the archive read once until the sheet is unloaded; the
+        split is redone if the sheet changes.
+        """
+        with self._split_lock:
+            self._voxel.request_scale(self.scale)
+            self._voxel.render(scales=self._voxel.wanted_scales)
+            wanted = set(sprite.split_key for sprite in self.sprites)
+            path = split_path(self.path)
+            touch(path)
+            stamp = source_stamp(self.path)
+            if self._crops is not None and self._split_stamp.tolist() == stamp.tolist() and wanted <= self._split_keys:
+                return self._crops
+            if os.path.exists(path):
+                with np.load(path) as f:
+                    keys = set(f["keys"].tolist())
+                    if f["source"].tolist() == stamp.tolist() and wanted <= keys:
+                        self._crops, self._split_keys, self._split_stamp = {k: f[k] for k in f.files}, keys, stamp
+                        return self._crops
+
+            arrays = {}
+            for sprite in self.sprites:
+                key = sprite.split_key
+                if f"{key}_bounds" in arrays:
+                    continue
+                w, h, *layers = grf.FileSprite.get_data_layers(sprite, context)
+                x0, y0, x1, y1 = bounds = used_bounds(*layers)
+                arrays[f"{key}_bounds"] = np.array(bounds, dtype=np.int64)
+                for name, layer in zip(LAYERS, layers):
+                    if layer is not None:
+                        arrays[f"{key}_{name}"] = np.ascontiguousarray(layer[y0:y1, x0:x1])
+            self.unload()
+
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp, source=stamp, keys=np.array(sorted(wanted)), **arrays)
+            os.replace(tmp, path)
+            self._crops, self._split_keys, self._split_stamp = arrays, wanted, stamp
+            return arrays
+
+
+def make_image_file(voxel, path, scale):
     if path in __image_file_cache:
         return __image_file_cache[path]
-    __image_file_cache[path] = VoxelFile(voxel, path)
+    __image_file_cache[path] = VoxelFile(voxel, path, scale)
     return __image_file_cache[path]
 
 
@@ -53,6 +217,87 @@ def guess_dimens(width, height, angle, bbox, z_scale):
     return height, delta, z
 
 
+def guess_dimens_array(widths, heights, angles, bbox, z_scale):
+    """`guess_dimens` of all directions at once, as `(heights, deltas, z_heights)` arrays."""
+    cos, sin = trig(angles)
+    widths = np.asarray(widths, dtype=np.int64)
+    heights = np.asarray(heights, dtype=np.int64)
+    x, y, z = bbox["x"], bbox["y"], bbox["z"] * z_scale
+
+    horizontal_height = (np.abs(x * cos) + np.abs(y * sin)) * 0.5
+    horizontal_width = np.abs(x * sin) + np.abs(y * cos)
+    real_height = (horizontal_height + z) / horizontal_width * widths
+    heights = np.where(heights == 0, np.ceil(real_height), heights).astype(np.int64)
+    return heights, heights - real_height, z / horizontal_width * widths
+
+
+class SheetGeometry:
+    """Sizes, strip positions and offsets of every direction (rows) at every scale (columns) of a spritesheet."""
+
+    def __init__(self, widths, heights, positions, xofs, yofs):
+        self.widths = widths
+        self.heights = heights
+        self.positions = positions
+        self.xofs = xofs
+        self.yofs = yofs
+
+
+@functools.lru_cache(maxsize=None)
+def sheet_geometry(
+    dimens, angles, bbox, z_scale, scales, mode, xdiff, ydiff, deltas, ydeltas, offsets, yoffsets, bbox_joggle, kwargs
+):
+    # Arguments are frozen (see agrf.utils.freeze), so sheets with the same layout share one computation
+    bbox, kwargs = dict(bbox), dict(kwargs)
+    widths = np.array([w for w, _ in dimens], dtype=np.int64)
+    heights, z_ydiff, z_height = guess_dimens_array(widths, [h for _, h in dimens], angles, bbox, z_scale)
+    positions = np.cumsum(widths) - widths + 8 * np.arange(len(widths))
+
+    # Same operations, in the same order, as the per-sprite code this replaces, so that rounding is unchanged
+    scale = np.array(scales)[None, :]
+    w, h = widths[:, None] * scale, heights[:, None] * scale
+    if mode == "road":
+        xrel = -((w - 1) // (scale * 2) * scale + 1)
+        yrel = -(z_height[:, None] * scale)
+    elif mode == "cargo":
+        xrel = np.zeros(w.shape)
+        yrel = w - h
+    else:
+        # XXX
+        # Actually, this is unverified legacy code
+        # Vehicle people have much disagreement with what's the right offset anyways...
+        xrel = -w / 2
+        yrel = -h / 2
+
+    xrel = xrel + xdiff * scale
+    yrel = yrel + ydiff * scale
+    yrel = yrel - z_ydiff[:, None] * scale
+
+    def shift(table, factor):
+        nonlocal xrel, yrel
+        table = np.array(table)
+        xrel = xrel + table[:, 0:1] * factor * scale
+        yrel = yrel + table[:, 1:2] * factor * scale
+
+    if kwargs["xdiff"] != 0:
+        shift(deltas, kwargs["xdiff"])
+    if mode == "road" and kwargs["xspan"] != 16:
+        shift(offsets, 16 - kwargs["xspan"])
+    if kwargs["ydiff"] != 0:
+        shift(ydeltas, kwargs["ydiff"])
+    if mode == "road" and kwargs["yspan"] != 16:
+        shift(yoffsets, 16 - kwargs["yspan"])
+    if bbox_joggle is not None:
+        shift(bbox_joggle, 1)
+
+    return SheetGeometry(
+        widths.tolist(),
+        heights.tolist(),
+        positions.tolist(),
+        np.trunc(xrel + 0.5).astype(np.int64).tolist(),
+        np.trunc(yrel + 0.5).astype(np.int64).tolist(),
+    )
+
+
 class LazyAlternativeSprites(grf.AlternativeSprites):
     def __init__(self, voxel, part, kwargs=None, *sprites):
         super().__init__(*sprites)
@@ -66,12 +311,22 @@ class LazyAlternativeSprites(grf.AlternativeSprites):
     def get_fingerprint(self):
         return {"name": self.voxel.name, "part": self.part, "prefix": self.voxel.prefix}
 
+    @property
+    def scales(self):
+        return sorted(set(ZOOM_TO_SCALE[s.zoom] for s in self.sprites))
+
+    def render(self):
+        # Only reached for sprites grf writes, and it writes every zoom level of them
+        for scale in self.scales:
+            self.voxel.request_scale(scale)
+        self.voxel.render(scales=self.voxel.wanted_scales)
+
     def get_resources(self):
-        self.voxel.render()
+        self.render()
         return super().get_resources()
 
     def get_resource_files(self):
-        self.voxel.render()
+        self.render()
         return tuple(super().get_resource_files())
 
     def __repr__(self):
@@ -84,6 +339,9 @@ class LazyAlternativeSprites(grf.AlternativeSprites):
 
 
 class CustomCropMixin:
+    # Set by get_cropped_layers when the used area is already known
+    crop_bounds = None
+
     def __init__(self, *args, fixed_crop=False, crop_amount=(0, 0), keep_br_space=False, **kw):
         super().__init__(*args, **kw)
         self.fixed_crop = fixed_crop
@@ -137,16 +395,123 @@ class CustomCropMixin:
 
         return crop_x, crop_y, w, h, rgb, alpha, mask
 
+    def get_cropped_layers(self, context):
+        """
+        `(x0, y0, w, h, rgb, alpha, mask)`: the area grf would crop the layers to and where it sits in the sprite, if
+        known without scanning the whole sprite; None otherwise.
+        """
+        return None
+
+    def get_real_data(self, context):
+        cropped = None if self.fixed_crop or not self.crop else self.get_cropped_layers(context)
+        if cropped is None:
+            return super().get_real_data(context)
+        # Encoded as is, rather than padded back out to the whole sprite for grf to scan and crop again
+        return grf.Sprite.get_real_data(CroppedSprite(self, *cropped), context)
+
     def get_resource_files(self):
         return super().get_resource_files() + (THIS_FILE,)
 
 
+class CroppedSprite(grf.Sprite):
+    def __init__(self, sprite, x0, y0, w, h, rgb, alpha, mask):
+        super().__init__(w, h, xofs=sprite.xofs + x0, yofs=sprite.yofs + y0, zoom=sprite.zoom, crop=False)
+        self.sprite = sprite
+        self.layers = (rgb, alpha, mask)
+
+    @property
+    def name(self):
+        return self.sprite.name
+
+    def get_data_layers(self, context):
+        return (self.w, self.h, *self.layers)
+
+
 class CustomCropFileSprite(CustomCropMixin, grf.FileSprite):
-    pass
+    def __init__(self, file, *args, **kw):
+        super().__init__(file, *args, **kw)
+        self._holds_file = False
+        if isinstance(file, VoxelFile):
+            file.add_sprite(self)
+
+    def prepare_files(self):
+        super().prepare_files()
+        # grf prepares exactly the sprites it is going to decode, so sprites served from its cache, or cut for sheet
+        # variants that are never written, do not keep the sheet loaded
+        if isinstance(self.file, VoxelFile) and not self._holds_file:
+            self.file.voxel.request_scale(self.file.scale)
+            self._holds_file = True
+            self.file.add_user()
+
+    @property
+    def split_key(self):
+        return f"{self.x}_{self.y}_{self.w}_{self.h}_{self.bpp}"
+
+    def release_file(self):
+        if self._holds_file:
+            self._holds_file = False
+            self.file.release()
+
+    def get_data_layers(self, context):
+        cropped = self.get_cropped_layers(context)
+        if cropped is None:
+            ret = super().get_data_layers(context)
+            self.release_file()
+            return ret
+        x0, y0, w, h, *layers = cropped
+        return (self.w, self.h, *[None if x is None else place(x, (x0, y0), (0, 0, self.w, self.h)) for x in layers])
+
+    def get_cropped_layers(self, context):
+        if not SPLIT_SHEETS or not isinstance(self.file, VoxelFile) or self.file.colourkey is not None:
+            return None
+        crops = self.file.split(context)
+        timer = context.start_timer()
+        key = self.split_key
+        x0, y0, x1, y1 = self.crop_bounds = tuple(crops[f"{key}_bounds"].tolist())
+        layers = [crops.get(f"{key}_{name}") for name in LAYERS]
+        if x1 == 0:
+            # grf keeps a single pixel of fully empty sprites
+            x1, y1 = 1, 1
+            layers = [None if x is None else np.zeros((1, 1) + x.shape[2:], dtype=x.dtype) for x in layers]
+        timer.count_loading()
+        self.release_file()
+        return (x0, y0, x1 - x0, y1 - y0, *layers)
 
 
 class CustomCropWithMask(CustomCropMixin, grf.WithMask):
-    pass
+    def prepare_files(self):
+        # grf.WithMask does not forward this, and the sheets count their users by it
+        self.sprite.prepare_files()
+        self.mask.prepare_files()
+
+    def get_cropped_layers(self, context):
+        if self.mode != grf.MaskMode.DEFAULT:
+            return None
+        sprite = self.sprite.get_cropped_layers(context) if isinstance(self.sprite, CustomCropMixin) else None
+        mask = self.mask.get_cropped_layers(context) if isinstance(self.mask, CustomCropMixin) else None
+        if sprite is None or mask is None:
+            return None
+
+        timer = context.start_timer()
+        sx0, sy0, sw, sh, rgb, alpha, smask = sprite
+        mx0, my0, _, _, mrgb, malpha, mmask = mask
+        if mrgb is not None or malpha is not None:
+            raise context.failure(self, "Mask has an RGB or alpha layer")
+        # grf crops to the sprite's alpha or colour if it has them, else to the merged masks
+        if rgb is not None or alpha is not None:
+            self.crop_bounds = self.sprite.crop_bounds
+            box = (sx0, sy0, sx0 + sw, sy0 + sh)
+        else:
+            self.crop_bounds = union_bounds(self.sprite.crop_bounds, self.mask.crop_bounds)
+            box = self.crop_bounds if self.crop_bounds[2] > 0 else (0, 0, 1, 1)
+        mmask = place(mmask, (mx0, my0), box)
+        if smask is not None:
+            smask = place(smask, (sx0, sy0), box)
+            has_mask = mmask != 0
+            smask[has_mask] = mmask[has_mask]
+            mmask = smask
+        timer.count_composing()
+        return (box[0], box[1], box[2] - box[0], box[3] - box[1], rgb, alpha, mmask)
 
 
 def spritesheet_template(
@@ -173,64 +538,61 @@ def spritesheet_template(
     relative_childsprite=False,
     nomask=False,
     kwargs=None,
+    image_voxel=None,
+    positions=None,
+    zoom_out=(),
 ):
-    guessed_dimens = []
-    for i in range(len(dimens)):
-        x, y = dimens[i]
-        y, z_ydiff, z_height = guess_dimens(x, y, angles[i], bbox, z_scale)
-        guessed_dimens.append((x, y, z_ydiff, z_height))
-
     kwargs = kwargs or {}
-    oxdiff = kwargs["xdiff"]
-    oxspan = kwargs["xspan"]
-    oydiff = kwargs["ydiff"]
-    oyspan = kwargs["yspan"]
+    # Zoom-out sprites are cut from sheets downsampled from the 1x one, so they follow the 1x geometry
+    geometry_scales = tuple(scales) + ((1,) if zoom_out and 1 not in scales else ())
+    geometry = sheet_geometry(
+        freeze(dimens),
+        freeze(angles),
+        freeze(bbox),
+        z_scale,
+        geometry_scales,
+        mode,
+        xdiff,
+        ydiff,
+        freeze(deltas),
+        freeze(ydeltas),
+        freeze(offsets),
+        freeze(yoffsets),
+        freeze(bbox_joggle),
+        freeze(kwargs),
+    )
+
+    # Strips may be cut from another voxel's sheet, e.g. one this voxel is a rotation of
+    image_voxel = image_voxel or voxel
+    if positions is None:
+        positions = geometry.positions
 
     def get_rels(direction, scale):
-        w, h, z_ydiff, z_height = map(lambda a: a * scale, guessed_dimens[direction])
-        if mode == "road":
-            xrel = -((w - 1) // (scale * 2) * scale + 1)
-        elif mode == "cargo":
-            xrel = 0
-        else:
-            # XXX
-            # Actually, this is unverified legacy code
-            # Vehicle people have much disagreement with what's the right offset anyways...
-            xrel = -w / 2
-        if mode == "road":
-            yrel = -z_height
-        elif mode == "cargo":
-            yrel = w - h
+        j = geometry_scales.index(scale)
+        return geometry.xofs[direction][j], geometry.yofs[direction][j]
+
+    def get_box(i, scale):
+        """`(x, w, h, x_shift)` of strip `i` on the sheet of `scale`, `x_shift` being how far its left edge was moved."""
+        if scale >= 1:
+            return positions[i] * scale, geometry.widths[i] * scale, geometry.heights[i] * scale, 0
+        # Downsampled strips may start or end mid-pixel; take every pixel they touch
+        x0 = math.floor(positions[i] * scale)
+        x1 = math.ceil((positions[i] + geometry.widths[i]) * scale)
+        return x0, x1 - x0, math.ceil(geometry.heights[i] * scale), positions[i] * scale - x0
+
+    def get_offsets(i, scale, x_shift):
+        base = max(scale, 1)
+        if relative_childsprite:
+            xofs = get_rels(i, base)[0] - relative_childsprite[0] * base
+            yofs = get_rels(i, base)[1] - relative_childsprite[1] * base
+        elif childsprite:
+            xofs, yofs = childsprite[0] * base, childsprite[1] * base
         else:
-            yrel = -h / 2
-
-        xrel += xdiff * scale
-        yrel += ydiff * scale
-        yrel -= z_ydiff
-
-        if oxdiff != 0:
-            xrel += deltas[direction][0] * oxdiff * scale
-            yrel += deltas[direction][1] * oxdiff * scale
-
-        if mode == "road" and oxspan != 16:
-            offset = 16 - oxspan
-            xrel += offsets[direction][0] * offset * scale
-            yrel += offsets[direction][1] * offset * scale
-
-        if oydiff != 0:
-            xrel += ydeltas[direction][0] * oydiff * scale
-            yrel += ydeltas[direction][1] * oydiff * scale
-
-        if mode == "road" and oyspan != 16:
-            offset = 16 - oyspan
-            xrel += yoffsets[direction][0] * offset * scale
-            yrel += yoffsets[direction][1] * offset * scale
-
-        if bbox_joggle is not None:
-            xrel += bbox_joggle[direction][0] * scale
-            yrel += bbox_joggle[direction][1] * scale
-
-        return int(xrel + 0.5), int(yrel + 0.5)
+            xofs, yofs = get_rels(i, base)
+        if scale < 1:
+            xofs = math.floor(xofs * scale - x_shift + 0.5)
+            yofs = math.floor(yofs * scale + 0.5)
+        return xofs, yofs
 
     def with_optional_mask(sprite, mask):
         if mask is None:
@@ -243,53 +605,42 @@ def spritesheet_template(
             keep_br_space=sprite.keep_br_space,
         )
 
+    def make_sprite(i, bpp, scale):
+        x, w, h, x_shift = get_box(i, scale)
+        xofs, yofs = get_offsets(i, scale, x_shift)
+        if manual_crop is None:
+            crop = {}
+        elif scale >= 1:
+            crop = {"fixed_crop": True, "crop_amount": (manual_crop[0] * scale, manual_crop[1] * scale)}
+        else:
+            crop = {
+                "fixed_crop": True,
+                "crop_amount": (math.floor(manual_crop[0] * scale), math.floor(manual_crop[1] * scale)),
+            }
+        return with_optional_mask(
+            CustomCropFileSprite(
+                make_image_file(image_voxel, f"{path}_{scale}x_{bpp}bpp.png", scale),
+                x,
+                0,
+                w,
+                h,
+                xofs=xofs,
+                yofs=yofs,
+                bpp=bpp,
+                zoom=SCALE_TO_ZOOM[scale],
+                keep_br_space=keep_br_space,
+                **crop,
+            ),
+            (
+                CustomCropFileSprite(make_image_file(image_voxel, f"{path}_{scale}x_mask.png", scale), x, 0, w, h)
+                if bpp == 32 and not nomask
+                else None
+            ),
+        )
+
     return [
         LazyAlternativeSprites(
-            voxel,
-            idx,
-            kwargs,
-            *(
-                with_optional_mask(
-                    CustomCropFileSprite(
-                        make_image_file(voxel, f"{path}_{scale}x_{bpp}bpp.png"),
-                        (sum(guessed_dimens[j][0] for j in range(i)) + i * 8) * scale,
-                        0,
-                        guessed_dimens[i][0] * scale,
-                        guessed_dimens[i][1] * scale,
-                        xofs=(
-                            get_rels(i, scale)[0] - relative_childsprite[0] * scale
-                            if relative_childsprite
-                            else childsprite[0] * scale if childsprite else get_rels(i, scale)[0]
-                        ),
-                        yofs=(
-                            get_rels(i, scale)[1] - relative_childsprite[1] * scale
-                            if relative_childsprite
-                            else childsprite[1] * scale if childsprite else get_rels(i, scale)[1]
-                        ),
-                        bpp=bpp,
-                        zoom=SCALE_TO_ZOOM[scale],
-                        keep_br_space=keep_br_space,
-                        **(
-                            {}
-                            if manual_crop is None
-                            else {"fixed_crop": True, "crop_amount": (manual_crop[0] * scale, manual_crop[1] * scale)}
-                        ),
-                    ),
-                    (
-                        CustomCropFileSprite(
-                            make_image_file(voxel, f"{path}_{scale}x_mask.png"),
-                            (sum(guessed_dimens[j][0] for j in range(i)) + i * 8) * scale,
-                            0,
-                            guessed_dimens[i][0] * scale,
-                            guessed_dimens[i][1] * scale,
-                        )
-                        if bpp == 32 and not nomask
-                        else None
-                    ),
-                )
-                for bpp in bpps
-                for scale in scales
-            ),
+            voxel, idx, kwargs, *(make_sprite(i, bpp, scale) for bpp in bpps for scale in (*scales, *zoom_out))
         )
         for idx in range(len(dimens))
         if (i := (idx + shift) % len(dimens)) or True
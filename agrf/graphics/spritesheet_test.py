@@ -0,0 +1,241 @@
+import os
+import grf
+import numpy as np
+from unittest.mock import Mock, patch
+from PIL import Image
+from agrf.graphics import spritesheet
+from agrf.graphics.spritesheet import (
+    CustomCropFileSprite,
+    CustomCropWithMask,
+    ImageCache,
+    VoxelFile,
+    guess_dimens,
+    guess_dimens_array,
+    sheet_geometry,
+    split_path,
+)
+from agrf.graphics.scheduler import RenderGraph
+from agrf.graphics.voxel import LazyVoxel
+from agrf.utils import freeze
+
+
+def make_file(tmp_path, name, size=(16, 8)):
+    path = str(tmp_path / f"{name}.png")
+    Image.fromarray(np.full((size[1], size[0], 4), 255, dtype=np.uint8), "RGBA").save(path)
+    return VoxelFile(Mock(), path, 1)
+
+
+def test_sheet_is_released_after_its_last_sprite(tmp_path, monkeypatch):
+    monkeypatch.setattr(spritesheet, "image_cache", ImageCache())
+    monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", False)
+    file = make_file(tmp_path, "sheet")
+    sprites = [CustomCropFileSprite(file, x, 0, 8, 8, bpp=32) for x in (0, 8, 0)]
+    context = grf.DummyWriteContext()
+
+    # grf only prepares the sprites it will decode; the last one stands for a sprite served from its cache
+    for sprite in sprites[:2]:
+        sprite.prepare_files()
+        sprite.prepare_files()
+    assert file.users == 2
+
+    sprites[0].get_data_layers(context)
+    assert file._image is not None
+    sprites[1].get_data_layers(context)
+    assert file._image is None
+    assert spritesheet.image_cache.size == 0
+
+    # Decoding a sprite again reloads the sheet on demand
+    w, h, rgb, alpha, mask = sprites[0].get_data_layers(context)
+    assert (w, h) == (8, 8) and alpha.all()
+    assert file._image is not None
+
+    # Masked 32bpp sprites hold both their sheets, whether decoded from the sheets or from their split crops
+    for split in [False, True]:
+        monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", split)
+        make_sheets(tmp_path)
+        masked = make_sprites(tmp_path)
+        sheet, mask = masked[0].sprite.file, masked[0].mask.file
+        for sprite in masked:
+            sprite.prepare_files()
+        assert (sheet.users, mask.users) == (3, 3)
+
+        for sprite in masked:
+            sprite.get_real_data(RawWriteContext())
+        assert (sheet.users, mask.users) == (0, 0)
+        assert sheet._image is None and sheet._crops is None
+        assert mask._image is None and mask._crops is None
+
+
+def test_sheets_of_a_voxel_share_one_render(tmp_path):
+    config = {"sprites": [{"width": 8, "height": 8, "angle": 0}], "agrf_scales": [1, 2, 4]}
+    voxel = LazyVoxel("model", prefix=str(tmp_path), voxel_getter=lambda: "model.vox", config=config)
+    sprites = []
+    for scale in [1, 2, 4]:
+        path = tmp_path / f"model_{scale}x_32bpp.png"
+        Image.new("RGBA", (8 * scale, 8 * scale)).save(path)
+        sprites.append(CustomCropFileSprite(VoxelFile(voxel, str(path), scale), 0, 0, 8 * scale, 8 * scale, bpp=32))
+    assert not voxel.requested_scales
+
+    # Only the scales some written sprite is cut from are scheduled, and loading any sheet renders all of them at once
+    for sprite in sprites[:2]:
+        sprite.prepare_files()
+    assert RenderGraph().add(voxel).run.keywords["scales"] == [1, 2]
+    with patch("agrf.graphics.voxel.render") as render:
+        for sprite in sprites[:2]:
+            sprite.file.load()
+    render.assert_called_once()
+    assert render.call_args.kwargs["scales"] == [1, 2]
+    assert not voxel.has_rendered([4])
+
+
+def test_image_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    # Each 16x8 RGBA sheet decodes to 512 bytes
+    monkeypatch.setattr(spritesheet, "image_cache", ImageCache(limit=1024))
+    a, b, c = [make_file(tmp_path, name) for name in "abc"]
+
+    a.get_image()
+    b.get_image()
+    a.get_image()
+    c.get_image()
+
+    assert a._image is not None and c._image is not None
+    assert b._image is None
+    assert spritesheet.image_cache.size == 1024
+
+
+class RawWriteContext(grf.DummyWriteContext):
+    def sprite_compress(self, raw_data):
+        return raw_data.tobytes()
+
+
+def make_sheets(tmp_path):
+    rng = np.random.default_rng(0)
+    rgba = np.zeros((12, 40, 4), dtype=np.uint8)
+    rgba[2:7, 3:9] = rng.integers(1, 255, (5, 6, 4))
+    rgba[4:11, 21:25] = rng.integers(1, 255, (7, 4, 4))
+    mask = np.zeros((12, 40), dtype=np.uint8)
+    mask[1:3, 5:12] = 0xC6
+    Image.fromarray(rgba, "RGBA").save(tmp_path / "sheet_1x_32bpp.png")
+    im = Image.fromarray(mask, "P")
+    im.putpalette(grf.PIL_PALETTE)
+    im.save(tmp_path / "sheet_1x_mask.png")
+
+
+def make_sprites(tmp_path):
+    sheet = VoxelFile(Mock(), str(tmp_path / "sheet_1x_32bpp.png"), 1)
+    mask = VoxelFile(Mock(), str(tmp_path / "sheet_1x_mask.png"), 1)
+    # The third strip is empty
+    return [
+        CustomCropWithMask(
+            CustomCropFileSprite(sheet, x, 0, 12, 12, xofs=-6, yofs=-6, bpp=32),
+            CustomCropFileSprite(mask, x, 0, 12, 12),
+        )
+        for x in (0, 18, 28)
+    ]
+
+
+def test_split_sheets_encode_identically(tmp_path, monkeypatch):
+    make_sheets(tmp_path)
+    context = RawWriteContext()
+
+    monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", False)
+    expected = [s.get_real_data(context) for s in make_sprites(tmp_path)]
+
+    monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", True)
+    sprites = make_sprites(tmp_path)
+    assert [s.get_real_data(context) for s in sprites] == expected
+    assert [s.crop_bounds for s in sprites] == [(3, 2, 9, 7), (3, 4, 7, 11), (0, 0, 0, 0)]
+    assert os.path.exists(split_path(str(tmp_path / "sheet_1x_32bpp.png")))
+
+    # Later builds read the persisted crops without decoding the sheets
+    sprites = make_sprites(tmp_path)
+    with patch("grf.FileSprite.get_data_layers") as decode:
+        assert [s.get_real_data(context) for s in sprites] == expected
+    assert decode.call_count == 0
+
+
+def test_split_sprites_are_encoded_from_their_crops(tmp_path, monkeypatch):
+    make_sheets(tmp_path)
+    context = RawWriteContext()
+    monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", False)
+    expected = [s.get_data_layers(context) for s in make_sprites(tmp_path)]
+
+    monkeypatch.setattr(spritesheet, "SPLIT_SHEETS", True)
+    make_sprites(tmp_path)[0].get_real_data(context)
+    sprites = make_sprites(tmp_path)
+    encoded = []
+    real_get_real_data = grf.Sprite.get_real_data
+
+    def get_real_data(sprite, context):
+        encoded.append(sprite.get_data_layers(context))
+        return real_get_real_data(sprite, context)
+
+    with patch("grf.Sprite.get_real_data", get_real_data), patch("numpy.load", wraps=np.load) as load:
+        for sprite in sprites:
+            sprite.get_real_data(context)
+    # One archive read per sheet, and only the used area of each sprite reaches the encoder
+    assert load.call_count == 2
+    assert [(w, h) for w, h, *_ in encoded] == [(6, 5), (4, 7), (1, 1)]
+
+    # Wrappers still get the whole sprite
+    for sprite, (w, h, rgb, alpha, mask) in zip(make_sprites(tmp_path), expected):
+        layers = sprite.get_data_layers(context)
+        assert layers[:2] == (w, h) == (12, 12)
+        assert all((a == b).all() for a, b in zip(layers[2:], (rgb, alpha, mask)))
+
+
+def test_split_is_redone_when_the_sheet_changes(tmp_path):
+    make_sheets(tmp_path)
+    context = RawWriteContext()
+    sprite = make_sprites(tmp_path)[0]
+    sprite.get_real_data(context)
+
+    Image.fromarray(np.full((12, 40, 4), 255, dtype=np.uint8), "RGBA").save(tmp_path / "sheet_1x_32bpp.png")
+    os.utime(tmp_path / "sheet_1x_32bpp.png", ns=(1, 1))
+    sprite = make_sprites(tmp_path)[0]
+    sprite.get_real_data(context)
+    assert sprite.crop_bounds == (0, 0, 12, 12)
+
+
+def test_sheet_geometry_matches_guess_dimens():
+    dimens = ((32, 0), (40, 0), (24, 30))
+    angles = (0, 30, 135)
+    bbox = {"x": 20, "y": 10, "z": 12}
+    heights, deltas, z_heights = guess_dimens_array([w for w, _ in dimens], [h for _, h in dimens], angles, bbox, 1.2)
+    for (w, h), angle, height, delta, z_height in zip(dimens, angles, heights, deltas, z_heights):
+        assert (height, delta, z_height) == guess_dimens(w, h, angle, bbox, 1.2)
+
+    geometry = sheet_geometry(
+        dimens,
+        angles,
+        freeze(bbox),
+        1.2,
+        (1, 2),
+        "vehicle",
+        0.5,
+        0,
+        None,
+        None,
+        None,
+        None,
+        None,
+        freeze({"xdiff": 0, "ydiff": 0, "xspan": 16, "yspan": 16}),
+    )
+    assert geometry.positions == [0, 40, 88]
+    assert geometry.heights == heights.tolist()
+    assert geometry is sheet_geometry(
+        dimens,
+        angles,
+        freeze(bbox),
+        1.2,
+        (1, 2),
+        "vehicle",
+        0.5,
+        0,
+        None,
+        None,
+        None,
+        None,
+        None,
+        freeze({"xdiff": 0, "ydiff": 0, "xspan": 16, "yspan": 16}),
+    )
@@ -1,22 +1,187 @@
 import math
 import os
 import functools
+import threading
+import weakref
 from agrf.gorender import (
     Config,
     render,
-    hill_positor_1,
-    stairstep,
-    compose,
-    self_compose,
-    produce_empty,
+    positor_many,
+    positor_output,
+    rotate_y_operation,
+    stairstep_operation,
+    compose_operation,
+    self_compose_operation,
+    produce_empty_operation,
     discard_layers,
     keep_layers,
 )
-from agrf.graphics.rotator import unnatural_dimens
+from agrf.gorender.aio import default_pool
+from agrf.gorender.preview import load_voxels, render_layers
+from agrf.gorender.trace import tracer
+from agrf.graphics.layered_image import LayeredImage
+from agrf.graphics.misc import SCALE_TO_ZOOM
+from agrf.graphics.downsample import downsample_render
+from agrf.graphics.mirror import mirror_mapping, mirror_render, strip_positions
+from agrf.graphics.rotator import unnatural_sprite_dimens, rotation_mapping
 from agrf.graphics.spritesheet import spritesheet_template
-from copy import deepcopy
 from agrf.actions import FakeReferencingGenericSpriteLayout
 from agrf.magic import CachedFunctorMixin
+from agrf.utils import freeze
+
+
+class VoxelGetter:
+    """Produces a derived .vox file at most once, remembering which getters it reads from."""
+
+    def __init__(self, getter, dependencies=()):
+        self.getter = getter
+        self.dependencies = tuple(dependencies)
+        self.wanted = False
+        self.node = None
+        self._lock = threading.Lock()
+        self._path = None
+
+    @property
+    def done(self):
+        return self._path is not None
+
+    def want(self):
+        if self.wanted:
+            return
+        self.wanted = True
+        for dependency in self.dependencies:
+            want(dependency)
+
+    def __call__(self):
+        if self._path is not None:
+            return self._path
+        for dependency in self.dependencies:
+            dependency()
+        with self._lock:
+            if self._path is None:
+                with tracer.span("voxel", "voxel", nodes=[self.node]):
+                    self._path = self.getter()
+            return self._path
+
+
+class PositorGroup:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Weak, so that neither the steps nor (through them) their source are kept alive by the registry
+        self.steps = []
+
+
+# Keyed by the source getter itself; an entry goes away with the source, once no step reading it is left
+__positor_groups = weakref.WeakKeyDictionary()
+__positor_groups_lock = threading.Lock()
+
+
+def join_positor_group(source, step):
+    with __positor_groups_lock:
+        group = __positor_groups.get(source)
+        if group is None:
+            group = __positor_groups[source] = PositorGroup()
+        group.steps.append(weakref.ref(step))
+        return group
+
+
+def positor_siblings(group):
+    with __positor_groups_lock:
+        steps = [ref() for ref in group.steps]
+        group.steps = [ref for ref, step in zip(group.steps, steps) if step is not None]
+        return [step for step in steps if step is not None]
+
+
+class PositorStep(VoxelGetter):
+    """
+    A single positor operation applied to the output of `source`.
+
+    `operation` builds the positor operation from the paths of `source` and of the extra `dependencies`, so that the
+    step can be planned without running anything. Steps reading the same source are lowered together: the first one
+    needed also runs every wanted sibling whose inputs are ready, all in one positor process.
+    """
+
+    def __init__(self, source, new_path, operation, dependencies=()):
+        super().__init__(None, (source,) + tuple(dependencies))
+        self.source = source
+        self.new_path = new_path
+        self.operation = operation
+        self.group = join_positor_group(source, self)
+
+    @property
+    def ready(self):
+        return all(is_done(dependency) for dependency in self.dependencies[1:])
+
+    def __call__(self):
+        if self._path is not None:
+            return self._path
+        self.want()
+        for dependency in self.dependencies:
+            dependency()
+        with self.group.lock:
+            if self._path is None:
+                source_path = self.source()
+                siblings = positor_siblings(self.group)
+                batch = [self] + [s for s in siblings if s is not self and s.wanted and not s.done and s.ready]
+                jobs = [(s.operation(source_path, *(d() for d in s.dependencies[1:])), s.new_path) for s in batch]
+                with tracer.span("positor", "voxel", nodes=[s.node for s in batch]):
+                    positor_many(source_path, jobs)
+                for step, (operation, new_path) in zip(batch, jobs):
+                    step._path = positor_output(source_path, new_path, operation)
+            return self._path
+
+
+class LayerFilterStep(VoxelGetter):
+    """Keeps or discards some layers of the output of `source`."""
+
+    def __init__(self, source, new_path, flag, layers):
+        super().__init__(self.run, (source,))
+        self.source = source
+        self.new_path = new_path
+        self.flag = flag
+        self.layers = layers
+
+    def run(self):
+        {"discard": discard_layers, "keep": keep_layers}[self.flag](self.layers, self.source(), self.new_path)
+        return self.new_path
+
+
+def getter_dependencies(voxel_getter):
+    if isinstance(voxel_getter, VoxelGetter):
+        return voxel_getter.dependencies
+    return ()
+
+
+def is_done(voxel_getter):
+    # Source voxels are plain callables that merely return a path
+    return voxel_getter.done if isinstance(voxel_getter, VoxelGetter) else True
+
+
+def want(voxel_getter):
+    if isinstance(voxel_getter, VoxelGetter):
+        voxel_getter.want()
+
+
+def traced_transform(method):
+    """Record which LazyVoxels a transform derives its result from."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if tracer.enabled:
+            tracer.edge(self.trace_key, result.trace_key, method.__name__)
+            for arg in args:
+                if isinstance(arg, LazyVoxel):
+                    tracer.edge(arg.trace_key, result.trace_key, method.__name__)
+        return result
+
+    return wrapper
+
+
+def subvoxel_getter(subvoxel):
+    if isinstance(subvoxel, str):
+        return lambda: subvoxel
+    return subvoxel.voxel_getter
 
 
 class LazyVoxel(Config):
@@ -27,41 +192,74 @@ class LazyVoxel(Config):
         self.name = name
         self.prefix = prefix
         self.voxel_getter = voxel_getter
+        self._render_lock = threading.Lock()
+        self._rendered_scales = set()
+        # Scales sprite sheets were built for; rendered together so that gorender runs once per voxel
+        self.requested_scales = set()
+        self.mirror_of = None
+        self.rotation_of = None
         self._update_dimensions()
+        if isinstance(voxel_getter, VoxelGetter) and voxel_getter.node is None:
+            voxel_getter.node = self.trace_key
+        tracer.node(self.trace_key, name=name, prefix=prefix)
+
+    @property
+    def trace_key(self):
+        return os.path.join(self.prefix or "", self.name)
 
     def _update_dimensions(self):
         if "agrf_unnaturalness" not in self.config:
             return
-        bounding_box = self.config["size"]
-        for x in self.config["sprites"]:
-            x["width"], x["height"] = map(
-                math.ceil,
-                unnatural_dimens(
-                    x["angle"], bounding_box, self.config["agrf_scale"], unnaturalness=self.config["agrf_unnaturalness"]
-                ),
-            )
+        widths, heights = unnatural_sprite_dimens(
+            tuple(x["angle"] for x in self.config["sprites"]),
+            freeze(self.config["size"]),
+            self.config["agrf_scale"],
+            self.config["agrf_unnaturalness"],
+        )
+        self.config["sprites"] = [
+            {**x, "width": width, "height": height} for x, width, height in zip(self.config["sprites"], widths, heights)
+        ]
 
     def in_place_subset(self, subset):
         self.config["agrf_subset"] = subset
 
     @functools.cache
+    @traced_transform
     def rotate(self, delta, suffix):
-        new_config = deepcopy(self.config)
-        for x in new_config["sprites"]:
-            x["angle"] += delta
-        return LazyVoxel(
+        new_config = {**self.config, "sprites": [{**x, "angle": x["angle"] + delta} for x in self.config["sprites"]]}
+        ret = LazyVoxel(
             self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=self.voxel_getter, config=new_config
         )
+        ret.rotation_of = self
+        return ret
+
+    @functools.cache
+    def shared_strips(self):
+        """
+        If every view of this rotated voxel was already rendered for the voxel it was rotated from, return
+        `(voxel, mapping)`: the voxel whose sheet holds the views, and which of its strips each sprite uses.
+        """
+        if self.rotation_of is None:
+            return None
+        source = self.rotation_of
+        mapping = rotation_mapping(source.final_config["sprites"], self.final_config["sprites"])
+        if mapping is None:
+            return None
+        # Rotations of rotations resolve to the voxel that actually renders
+        shared = source.shared_strips()
+        if shared is not None:
+            source, source_mapping = shared
+            mapping = [source_mapping[j] for j in mapping]
+        return source, mapping
 
     @functools.cache
+    @traced_transform
     def change_pitch(self, delta, suffix):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
-            hill_positor_1(old_path, new_path, delta)
-            return os.path.join(new_path, f"{self.name}.vox")
+        voxel_getter = PositorStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix), lambda old_path: rotate_y_operation(delta)
+        )
 
-        new_config = deepcopy(self.config)
+        new_config = dict(self.config)
         new_config["agrf_zdiff"] = new_config.get("agrf_zdiff", 0.0) + new_config.get(
             "agrf_real_x", new_config["size"]["x"]
         ) / 4 * math.sin(math.radians(abs(delta)))
@@ -71,14 +269,13 @@ class LazyVoxel(Config):
         )
 
     @functools.cache
+    @traced_transform
     def stairstep(self, x_steps, suffix):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
-            stairstep(old_path, new_path, x_steps)
-            return os.path.join(new_path, f"{self.name}.vox")
+        voxel_getter = PositorStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix), lambda old_path: stairstep_operation(x_steps)
+        )
 
-        new_config = deepcopy(self.config)
+        new_config = dict(self.config)
         real_x = new_config.get("agrf_real_x", new_config["size"]["x"])
         if new_config.get("agrf_road_mode"):
             real_x -= new_config["size"]["x"]
@@ -88,119 +285,138 @@ class LazyVoxel(Config):
             self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=new_config
         )
 
+    @traced_transform
     def update_config(self, new_config, suffix):
         return LazyVoxel(
             self.name,
             prefix=os.path.join(self.prefix, suffix),
             voxel_getter=self.voxel_getter,
-            config={**deepcopy(self.config), **new_config},
+            config={**self.config, **new_config},
         )
 
     @functools.cache
+    @traced_transform
     def flip(self, suffix):
-        new_config = deepcopy(self.config)
-        for x in new_config["sprites"]:
-            x["flip"] = not x.get("flip", False)
-        return LazyVoxel(
+        new_config = {
+            **self.config,
+            "sprites": [{**x, "flip": not x.get("flip", False)} for x in self.config["sprites"]],
+        }
+
+        # Opt-in: views whose mirror image is already in this sheet are produced by flipping pixels instead
+        mapping = None
+        if self.config.get("agrf_mirror_flip", False):
+            sprites = self.final_config["sprites"]
+            mapping = mirror_mapping(sprites, [{**x, "flip": not x.get("flip", False)} for x in sprites])
+        if mapping is not None:
+            # Each view is its mirror image's strip flipped, so per-view shifts follow that strip with x negated
+            subset = new_config.get("agrf_subset", range(len(mapping)))
+            for k in ["agrf_deltas", "agrf_offsets", "agrf_ydeltas", "agrf_yoffsets"]:
+                if k in new_config:
+                    table = list(new_config[k])
+                    for i, j in enumerate(mapping):
+                        x, y = new_config[k][subset[j]]
+                        table[subset[i]] = (-x, y)
+                    new_config[k] = table
+        if mapping is not None and "agrf_bbox_joggle" in new_config:
+            joggle = new_config["agrf_bbox_joggle"]
+            new_config["agrf_bbox_joggle"] = [(-joggle[j][0], joggle[j][1]) for j in mapping] + list(
+                joggle[len(mapping) :]
+            )
+
+        ret = LazyVoxel(
             self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=self.voxel_getter, config=new_config
         )
+        if mapping is not None:
+            ret.mirror_of = (self, mapping)
+        return ret
 
     @functools.cache
+    @traced_transform
     def compose(self, subvoxel, suffix, ignore_mask=False, colour_map=None):
-        def voxel_getter(subvoxel=subvoxel):
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
-            if isinstance(subvoxel, str):
-                subvoxel_path = subvoxel
-            else:
-                subvoxel_path = subvoxel.voxel_getter()
+        def operation(old_path, subvoxel_path):
             if colour_map is not None:
                 extra_config = colour_map.positor_config()
             else:
                 extra_config = {}
-            compose(old_path, subvoxel_path, new_path, {**extra_config, "ignore_mask": ignore_mask})
-            return os.path.join(new_path, f"{self.name}.vox")
+            return compose_operation(subvoxel_path, {**extra_config, "ignore_mask": ignore_mask})
+
+        voxel_getter = PositorStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix), operation, (subvoxel_getter(subvoxel),)
+        )
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def self_compose(self, suffix, colour_map=None):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
+        def operation(old_path):
             if colour_map is not None:
                 extra_config = colour_map.positor_config()
             else:
                 extra_config = {}
-            self_compose(old_path, new_path, extra_config)
-            return os.path.join(new_path, f"{self.name}.vox")
+            return self_compose_operation(old_path, extra_config)
+
+        voxel_getter = PositorStep(self.voxel_getter, os.path.join(self.prefix, suffix), operation)
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def produce_empty(self, suffix):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
-            produce_empty(old_path, new_path)
-            return os.path.join(new_path, f"{self.name}.vox")
+        voxel_getter = PositorStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix), lambda old_path: produce_empty_operation()
+        )
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def mask_clip_away(self, subvoxel, suffix):
-        def voxel_getter(subvoxel=subvoxel):
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix)
-            if isinstance(subvoxel, str):
-                subvoxel_path = subvoxel
-            else:
-                subvoxel_path = subvoxel.voxel_getter()
-            compose(
-                old_path,
-                subvoxel_path,
-                new_path,
-                {"ignore_mask": True, "overwrite": True, "n": 0, "truncate": True, "blend_mode": "atop"},
-            )
-            return os.path.join(new_path, f"{self.name}.vox")
+        voxel_getter = PositorStep(
+            self.voxel_getter,
+            os.path.join(self.prefix, suffix),
+            lambda old_path, subvoxel_path: compose_operation(
+                subvoxel_path, {"ignore_mask": True, "overwrite": True, "n": 0, "truncate": True, "blend_mode": "atop"}
+            ),
+            (subvoxel_getter(subvoxel),),
+        )
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def discard_layers(self, discards, suffix):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix, f"{self.name}.vox")
-            discard_layers(discards, old_path, new_path)
-            return new_path
+        voxel_getter = LayerFilterStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix, f"{self.name}.vox"), "discard", discards
+        )
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def keep_layers(self, keeps, suffix):
-        def voxel_getter():
-            old_path = self.voxel_getter()
-            new_path = os.path.join(self.prefix, suffix, f"{self.name}.vox")
-            keep_layers(keeps, old_path, new_path)
-            return new_path
+        voxel_getter = LayerFilterStep(
+            self.voxel_getter, os.path.join(self.prefix, suffix, f"{self.name}.vox"), "keep", keeps
+        )
 
         return LazyVoxel(
-            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=deepcopy(self.config)
+            self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=voxel_getter, config=self.config
         )
 
     @functools.cache
+    @traced_transform
     def squash(self, ratio, suffix):
-        new_config = deepcopy(self.config)
+        new_config = dict(self.config)
         new_config["z_scale"] = new_config.get("z_scale", 1.0) * ratio
         new_config["agrf_scales"] = [x for x in new_config["agrf_scales"] if x < 4]
         if "agrf_manual_crop" in new_config:
@@ -217,13 +433,101 @@ class LazyVoxel(Config):
             self.name, prefix=os.path.join(self.prefix, suffix), voxel_getter=self.voxel_getter, config=new_config
         )
 
-    @functools.cache
-    def render(self):
-        voxel_path = self.voxel_getter()
-        render(self, voxel_path, os.path.join(self.prefix, self.name))
+    def mirror_source(self):
+        """The voxel whose sheet a mirrored flip is cut from, and which of its strips each sprite mirrors."""
+        source, mapping = self.mirror_of
+        shared = source.shared_strips()
+        if shared is not None:
+            source, source_mapping = shared
+            mapping = [source_mapping[j] for j in mapping]
+        return source, mapping
+
+    @property
+    def scales(self):
+        return self.config.get("agrf_scales", [1])
+
+    def request_scale(self, scale):
+        self.requested_scales.add(scale)
+
+    @property
+    def wanted_scales(self):
+        return sorted(self.requested_scales) or self.scales
+
+    def has_rendered(self, scales=None):
+        return self._rendered_scales.issuperset(self.scales if scales is None else scales)
+
+    @property
+    def rendered(self):
+        return self.has_rendered()
+
+    def render(self, scales=None):
+        with self._render_lock:
+            missing = [x for x in (self.scales if scales is None else scales) if x not in self._rendered_scales]
+            if len(missing) == 0:
+                return
+            if self.shared_strips() is not None:
+                self.shared_strips()[0].render(scales=missing)
+                self._rendered_scales.update(missing)
+                return
+
+            # Zoom-out sheets are downsampled from the 1x ones rather than rendered
+            derived = [x for x in missing if x < 1]
+            direct = [x for x in missing if x >= 1]
+            if derived and 1 not in self._rendered_scales and 1 not in direct:
+                direct.append(1)
+
+            if direct and self.mirror_of is not None:
+                self.mirror_of[0].render(scales=direct)
+                source, mapping = self.mirror_source()
+                with tracer.span("mirror", "voxel", nodes=[self.trace_key]):
+                    for scale in direct:
+                        mirror_render(
+                            os.path.join(source.prefix, source.name),
+                            os.path.join(self.prefix, self.name),
+                            [x["width"] for x in source.final_config["sprites"]],
+                            [x["width"] for x in self.final_config["sprites"]],
+                            mapping,
+                            scale,
+                        )
+            elif direct:
+                voxel_path = self.voxel_getter()
+                with tracer.span("render", "voxel", nodes=[self.trace_key]):
+                    render(self, voxel_path, os.path.join(self.prefix, self.name), scales=direct)
+            if derived:
+                with tracer.span("downsample", "voxel", nodes=[self.trace_key]):
+                    for scale in derived:
+                        downsample_render(os.path.join(self.prefix, self.name), scale)
+            self._rendered_scales.update(direct + derived)
+
+    async def render_async(self, scales=None, pool=None):
+        """Awaitable `render`, run on `pool` or the event loop's default `ToolPool`."""
+        await (pool or default_pool()).run(f"render {self.trace_key}", self.render, scales)
+
+    def preview(self, direction=0, scale=1):
+        """Approximate image of one view from the NumPy renderer; fast enough for an edit/preview loop."""
+        positions, colours, palette = load_voxels(self.voxel_getter())
+        final_config = self.final_config
+        _, rgb, alpha, mask = render_layers(
+            positions,
+            colours,
+            palette,
+            final_config["sprites"][direction],
+            final_config["size"],
+            final_config.get("z_scale", 1.0),
+            scale,
+        )
+        sprite = self.spritesheet()[direction].get_sprite(zoom=SCALE_TO_ZOOM[scale])
+        h, w = alpha.shape
+        return LayeredImage(sprite.xofs, sprite.yofs, w, h, rgb, alpha, mask)
 
     @functools.cache
-    def spritesheet(self, xdiff=0, ydiff=0, zdiff=0, shift=0, xspan=16, yspan=16):
+    def spritesheet(self, xdiff=0, ydiff=0, zdiff=0, shift=0, xspan=16, yspan=16, zoom_out=()):
+        """
+        One LazyAlternativeSprites per direction. `zoom_out` adds alternatives at scales below 1 (0.5 and/or 0.25),
+        box filtered from the 1x render instead of rendered.
+        """
+        # Sprites cut from this voxel will be pulled eventually, so its derivation chain is worth running eagerly
+        want(self.voxel_getter)
         if self.config.get("agrf_road_mode", False):
             real_xdiff = 0
             mode = "road"
@@ -235,9 +539,16 @@ class LazyVoxel(Config):
             mode = "vehicle"
         real_ydiff = (self.config.get("agrf_zdiff", 0) + zdiff) * self.config.get("agrf_scale", 1)
 
+        image_voxel, positions = self, None
+        shared = self.shared_strips()
+        if shared is not None:
+            image_voxel, mapping = shared
+            source_positions = strip_positions([x["width"] for x in image_voxel.final_config["sprites"]], 1)
+            positions = [source_positions[j] for j in mapping]
+
         return spritesheet_template(
             self,
-            os.path.join(self.prefix, self.name),
+            os.path.join(image_voxel.prefix, image_voxel.name),
             [(x["width"], x.get("height", 0)) for x in self.final_config["sprites"]],
             [x["angle"] for x in self.final_config["sprites"]],
             bbox=self.config["size"],
@@ -258,7 +569,18 @@ class LazyVoxel(Config):
             childsprite=self.config.get("agrf_childsprite", False),
             relative_childsprite=self.config.get("agrf_relative_childsprite", False),
             nomask=self.config.get("agrf_no_mask", False),
-            kwargs={"xdiff": xdiff, "ydiff": ydiff, "zdiff": zdiff, "shift": shift, "xspan": xspan, "yspan": yspan},
+            zoom_out=tuple(zoom_out),
+            kwargs={
+                "xdiff": xdiff,
+                "ydiff": ydiff,
+                "zdiff": zdiff,
+                "shift": shift,
+                "xspan": xspan,
+                "yspan": yspan,
+                "zoom_out": tuple(zoom_out),
+            },
+            image_voxel=image_voxel,
+            positions=positions,
         )
 
     @functools.cache
@@ -278,6 +600,11 @@ class LazySpriteSheet(CachedFunctorMixin):
     def fmap(self, f):
         return LazySpriteSheet(tuple(f(x) for x in self.sprites), self.indices)
 
+    def preview(self, direction=0, scale=1):
+        """`LazyVoxel.preview` of the voxel and view this sheet takes the given direction from."""
+        i, j = self.indices[direction]
+        return self.sprites[i].preview(j, scale)
+
     @functools.cache
     def spritesheet(self, xdiff=0, zdiff=0, shift=0):
         spritesheets = [x.spritesheet(xdiff, shift) for x in self.sprites]
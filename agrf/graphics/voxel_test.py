@@ -2,7 +2,10 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 import os
 import math
+import grf
+import numpy as np
 from agrf.graphics.voxel import LazyVoxel, LazySpriteSheet, LazyAlternatives
+from agrf.graphics.rotator import unnatural_sprite_dimens
 
 
 class TestLazyVoxel:
@@ -16,18 +19,22 @@ class TestLazyVoxel:
             "agrf_scale": 1.0,
         }
 
-        with patch("agrf.graphics.voxel.unnatural_dimens") as mock_unnatural:
-            mock_unnatural.return_value = (35.5, 35.5)
+        unnatural_sprite_dimens.cache_clear()
+        with patch("agrf.graphics.rotator.unnatural_dimens_array") as mock_unnatural:
+            mock_unnatural.return_value = (np.array([35.5, 35.5]), np.array([35.5, 35.5]))
 
             voxel = LazyVoxel(name="test_voxel", config=config)
+            LazyVoxel(name="test_voxel", config=config)
+        unnatural_sprite_dimens.cache_clear()
 
-            # Verify that unnatural_dimens was called for each sprite
-            assert mock_unnatural.call_count == 2
+        # All sprites at once, and only once for the same configuration
+        assert mock_unnatural.call_count == 1
+        assert list(mock_unnatural.call_args.args[0]) == [45, 90]
 
-            # Verify dimensions were updated
-            for sprite in voxel.config["sprites"]:
-                assert sprite["width"] == 36  # math.ceil(35.5)
-                assert sprite["height"] == 36
+        # Verify dimensions were updated
+        for sprite in voxel.config["sprites"]:
+            assert sprite["width"] == 36  # math.ceil(35.5)
+            assert sprite["height"] == 36
 
     def test_lazy_voxel_rotate(self):
         """Test rotate method creates rotated voxel instance."""
@@ -47,6 +54,21 @@ class TestLazyVoxel:
         assert rotated.config["sprites"][0]["angle"] == 135  # 45 + 90
         assert isinstance(rotated, LazyVoxel)
 
+    def test_lazy_voxel_transforms_share_unchanged_config(self):
+        """Test derived voxels share untouched config subtrees and never mutate their parent."""
+        voxel_getter = Mock(return_value="/path/to/test.vox")
+        config = {"sprites": [{"width": 32, "height": 32, "angle": 45}], "size": {"x": 10, "y": 10, "z": 20}}
+
+        voxel = LazyVoxel(name="test_voxel", prefix="/base", voxel_getter=voxel_getter, config=config)
+        rotated = voxel.rotate(90, "rotated")
+        flipped = rotated.flip("flipped")
+
+        assert voxel.config["sprites"][0]["angle"] == 45
+        assert "flip" not in rotated.config["sprites"][0]
+        assert rotated.config["size"] is voxel.config["size"]
+        assert flipped.config["size"] is voxel.config["size"]
+        assert flipped.config["sprites"][0]["angle"] == 135
+
     def test_lazy_voxel_flip(self):
         """Test flip method creates flipped voxel instance."""
         voxel_getter = Mock(return_value="/path/to/test.vox")
@@ -79,3 +101,76 @@ class TestLazyVoxel:
 
         flipped_twice = voxel_with_flip.flip("flipped_twice")
         assert flipped_twice.config["sprites"][0]["flip"] is False
+
+    def test_lazy_voxel_renders_demanded_scales_together(self):
+        """Test that zoom levels are rendered only once a sprite is pulled from them, together in one gorender run."""
+        voxel_getter = Mock(return_value="/path/to/test.vox")
+        config = {
+            "sprites": [{"width": 32, "height": 32, "angle": 45}],
+            "size": {"x": 10, "y": 10, "z": 20},
+            "agrf_scales": [1, 2, 4],
+            "agrf_bpps": [8, 32],
+        }
+
+        voxel = LazyVoxel(name="test_voxel", prefix="/base", voxel_getter=voxel_getter, config=config)
+        sprites = voxel.spritesheet()[0]
+        assert not voxel.requested_scales
+
+        with patch("agrf.graphics.voxel.render") as mock_render, patch("grf.ImageFile.load"):
+            # grf prepares every sprite it is going to decode before decoding any of them
+            for zoom in [grf.ZOOM_2X, grf.ZOOM_NORMAL]:
+                sprites.get_sprite(zoom=zoom, bpp=8).prepare_files()
+            sprites.get_sprite(zoom=grf.ZOOM_2X, bpp=8).file.load()
+            sprites.get_sprite(zoom=grf.ZOOM_NORMAL, bpp=8).file.load()
+
+        assert [c.kwargs["scales"] for c in mock_render.call_args_list] == [[1, 2]]
+        assert voxel.has_rendered([1, 2])
+        # Nothing was pulled from the 4x sheet
+        assert not voxel.has_rendered([4])
+
+    def test_lazy_voxel_renders_every_zoom_of_written_sprites(self):
+        """Test that sprites grf writes render all their zoom levels, and sheets never pulled are not rendered."""
+        voxel_getter = Mock(return_value="/path/to/test.vox")
+        config = {
+            "sprites": [{"width": 32, "height": 32, "angle": 45}],
+            "size": {"x": 10, "y": 10, "z": 20},
+            "agrf_scales": [1, 2],
+            "agrf_bpps": [8],
+        }
+
+        voxel = LazyVoxel(name="test_voxel", prefix="/base", voxel_getter=voxel_getter, config=config)
+        other = LazyVoxel(name="other_voxel", prefix="/base", voxel_getter=voxel_getter, config=config)
+        other.spritesheet()
+
+        with patch("agrf.graphics.voxel.render") as mock_render:
+            voxel.spritesheet()[0].get_resources()
+
+        assert [c.kwargs["scales"] for c in mock_render.call_args_list] == [[1, 2]]
+        assert not other.requested_scales
+
+    def test_lazy_voxel_rotate_reuses_closed_angle_set(self):
+        """Test that rotating onto already rendered views cuts sprites from the original sheet."""
+        voxel_getter = Mock(return_value="/path/to/test.vox")
+        config = {
+            "sprites": [{"width": 8 * (1 + a % 90 // 45), "angle": a} for a in range(0, 360, 45)],
+            "size": {"x": 10, "y": 10, "z": 20},
+            "agrf_scales": [1],
+            "agrf_bpps": [32],
+            "agrf_no_mask": True,
+        }
+
+        voxel = LazyVoxel(name="test_voxel", prefix="/base", voxel_getter=voxel_getter, config=config)
+        rotated = voxel.rotate(90, "r90").rotate(90, "r180")
+        assert rotated.shared_strips() == (voxel, [4, 5, 6, 7, 0, 1, 2, 3])
+        # Views at 45 degrees are wider, so they cannot stand in for axis-aligned ones
+        assert voxel.rotate(45, "r45").shared_strips() is None
+
+        sprite = rotated.spritesheet()[0].sprites[0]
+        assert sprite.file.path == "/base/test_voxel_1x_32bpp.png"
+        assert sprite.x == 8 + 16 + 8 + 16 + 4 * 8
+        assert sprite.w == 8
+
+        with patch("agrf.graphics.voxel.render") as mock_render:
+            rotated.render()
+        assert mock_render.call_args.args[0] is voxel
+        assert rotated.rendered
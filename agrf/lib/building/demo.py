@@ -124,6 +124,7 @@ class Demo:
                 has_mask=remap is None,
             )
 
+            layers = []
             for r, row in enumerate(self.tiles):
                 for c, sprite in enumerate(row[::-1]):
                     if sprite is None:
@@ -132,12 +133,12 @@ class Demo:
                     tile_slope = self.tile_slope(r, c2)
                     sprite = sprite.enable_foundation(tile_slope, render_context=self._smart_render_contexts[r][c2])
                     subimg = sprite.graphics(scale, bpp, remap=remap, render_context=self._smart_render_contexts[r][c2])
-                    img.blend_over(
+                    layers.append(
                         subimg.move(
                             (32 * r - 32 * c) * scale, (16 * r + 16 * c - 8 * self.tile_altitude(r, c2)) * scale
                         )
                     )
-            return img
+            return img.blend_all(layers)
         except Exception as e:
             # Error message is generally particularly hard to understand when something goes wrong here
             # Hence, we always print the demo title when an exception happens
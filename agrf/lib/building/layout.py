@@ -44,10 +44,13 @@ class DefaultGraphics:
 
     climate_dependent_tiles = {}
     climate_independent_tiles = {}
+    # (climate, sprite id) -> {scale: LayeredImage}, the 2x and 1x versions box filtered from the 4x one
+    pyramids = {}
 
     @staticmethod
     def register_third_party_image(img_path, climate, sprite_id):
         DefaultGraphics.climate_dependent_tiles[(climate, sprite_id)] = Image.open(img_path)
+        DefaultGraphics.pyramids.pop((climate, sprite_id), None)
 
     def graphics(self, scale, bpp, render_context: RenderContext = DEFAULT_RENDER_CONTEXT):
         if 3981 <= self.sprite_id <= 4012 and render_context.subclimate != "default":
@@ -64,28 +67,28 @@ class DefaultGraphics:
         elif self.sprite_id in [1011, 1012] and render_context.rail_type == "maglev":
             sprite_id_to_load += 164
 
-        if (render_context.climate, sprite_id_to_load) in DefaultGraphics.climate_dependent_tiles:
-            img = DefaultGraphics.climate_dependent_tiles[(render_context.climate, sprite_id_to_load)]
-        elif render_context.climate in DefaultGraphics.climate_independent_tiles:
-            img = DefaultGraphics.climate_independent_tiles[sprite_id_to_load]
-        else:
-            try:
-                img = load_third_party_image(f"third_party/opengfx2/{render_context.climate}/{sprite_id_to_load}.png")
-                DefaultGraphics.climate_dependent_tiles[(render_context.climate, sprite_id_to_load)] = img
-            except:
-                img = load_third_party_image(f"third_party/opengfx2/{sprite_id_to_load}.png")
-                DefaultGraphics.climate_independent_tiles[sprite_id_to_load] = img
-
-        img = np.asarray(img)
-        h = img.shape[0]
-        ret = LayeredImage(-124, 127 + self.yofs * 4 - h, 256, h, img[:, :, :3], img[:, :, 3], None)
-        if scale == 4:
-            ret = ret.copy()
-        elif scale == 2:
-            ret.resize(128, 63)
-        elif scale == 1:
-            ret.resize(64, 31)
-        return ret
+        key = (render_context.climate, sprite_id_to_load)
+        if key not in DefaultGraphics.pyramids:
+            if key in DefaultGraphics.climate_dependent_tiles:
+                img = DefaultGraphics.climate_dependent_tiles[key]
+            elif render_context.climate in DefaultGraphics.climate_independent_tiles:
+                img = DefaultGraphics.climate_independent_tiles[sprite_id_to_load]
+            else:
+                try:
+                    img = load_third_party_image(
+                        f"third_party/opengfx2/{render_context.climate}/{sprite_id_to_load}.png"
+                    )
+                    DefaultGraphics.climate_dependent_tiles[key] = img
+                except:
+                    img = load_third_party_image(f"third_party/opengfx2/{sprite_id_to_load}.png")
+                    DefaultGraphics.climate_independent_tiles[sprite_id_to_load] = img
+
+            img = np.asarray(img)
+            h = img.shape[0]
+            full = LayeredImage(-124, 127 - h, 256, h, img[:, :, :3], img[:, :, 3], None)
+            DefaultGraphics.pyramids[key] = {4: full, **{4 // f: x for f, x in full.pyramid((2, 4)).items()}}
+
+        return DefaultGraphics.pyramids[key][scale].copy().move(0, self.yofs * scale)
 
     def to_spriteref(self, sprite_list):
         return grf.SpriteRef(
@@ -437,6 +440,7 @@ class NewGeneralSprite(TaggedCachedFunctorMixin):
 
         ret = self.sprite.graphics(scale, bpp, render_context=render_context)
 
+        children = []
         for c in self.child_sprites:
             masked_sprite = c.graphics(scale, bpp, render_context=render_context)
             if remap is not None:
@@ -450,9 +454,9 @@ class NewGeneralSprite(TaggedCachedFunctorMixin):
                 parentsprite_offset[0] - childsprite_offset[0], parentsprite_offset[1] - childsprite_offset[1]
             )
 
-            ret.blend_over(masked_sprite)
+            children.append(masked_sprite)
 
-        return ret
+        return ret.blend_all(children)
 
     def to_parentsprite(self, low=False):
         height = 0 if low else 1
@@ -747,10 +751,7 @@ class ALayout:
 
     def graphics(self, scale, bpp, remap=None, context=None, render_context: RenderContext = DEFAULT_RENDER_CONTEXT):
         context = context or grf.DummyWriteContext()
-        img = LayeredImage.empty()
-
-        new_img = self.ground_sprite.graphics(scale, bpp, render_context=render_context).copy()
-        img.blend_over(new_img)
+        layers = [self.ground_sprite.graphics(scale, bpp, render_context=render_context)]
 
         for sprite in self.sorted_parent_sprites:
             masked_sprite = sprite.graphics(scale, bpp, remap=remap, render_context=render_context)
@@ -758,14 +759,14 @@ class ALayout:
                 masked_sprite.remap(remap)
                 masked_sprite.apply_mask()
 
-            img.blend_over(
+            layers.append(
                 masked_sprite.move(
                     (-sprite.offset[0] * 2 + sprite.offset[1] * 2) * scale,
                     (sprite.offset[0] + sprite.offset[1] - sprite.offset[2]) * scale,
                 )
             )
 
-        return img.move(0, -self.altitude * 8 * scale)
+        return LayeredImage.empty().blend_all(layers).move(0, -self.altitude * 8 * scale)
 
     def to_index(self, layout_pool):
         return layout_pool.index(self)
@@ -4,3 +4,12 @@ def unique(things):
 
 def unique_tuple(things):
     return tuple(dict.fromkeys(things))
+
+
+def freeze(value):
+    """A hashable copy of nested lists, tuples and dicts, for use as a cache key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(x) for x in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark LayeredImage.blend_over's kernel against the plain 32-bit formula it replaced.
+
+Overlays are shaped like rendered sprites: mostly transparent, an opaque body and a thin antialiased edge.
+
+Usage:
+    python tools/bench_blend.py [--size 1024] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agrf.graphics.layered_image import blend_rgba
+
+
+def reference_blend(rgb, alpha, other_rgb, other_alpha, opacity=255):
+    alpha1 = alpha.astype(np.uint32)
+    alpha2 = other_alpha.astype(np.uint32)
+    alpha1_component = np.expand_dims(alpha1 * (65025 - alpha2 * opacity), 2)
+    alpha2_component = np.expand_dims(alpha2 * opacity * 255, 2)
+    new_alpha = alpha1_component + alpha2_component
+    rgb[:, :] = (alpha1_component * rgb + alpha2_component * other_rgb + new_alpha // 2) // np.maximum(new_alpha, 1)
+    alpha[:, :] = (new_alpha[:, :, 0] + 32513) // 65025
+
+
+def sprite_alpha(size, rng):
+    y, x = np.mgrid[:size, :size]
+    distance = np.hypot(x - size / 2, y - size / 2) / (size / 3)
+    alpha = np.clip((1 - distance) * size / 8, 0, 1) * 255
+    alpha[rng.random((size, size)) < 0.01] = 128
+    return alpha.astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    other_rgb = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    other_alpha = sprite_alpha(args.size, rng)
+    bases = {"opaque base": np.full_like(other_alpha, 255), "sprite base": sprite_alpha(args.size, rng)[::-1]}
+
+    for base_name, alpha in bases.items():
+        for opacity in [255, 128]:
+            results = []
+            for kernel in [reference_blend, blend_rgba]:
+                out_rgb, out_alpha = rgb.copy(), alpha.copy()
+                kernel(out_rgb, out_alpha, other_rgb, other_alpha, opacity)
+                results.append((out_rgb, out_alpha))
+                elapsed = min(
+                    timeit.repeat(
+                        lambda: kernel(rgb.copy(), alpha.copy(), other_rgb, other_alpha, opacity),
+                        number=1,
+                        repeat=args.repeat,
+                    )
+                )
+                print(f"{base_name:12} opacity={opacity:3} {kernel.__name__:16} {elapsed * 1000:8.2f} ms")
+            assert all((a == b).all() for a, b in zip(*results)), "kernels disagree"
+
+
+if __name__ == "__main__":
+    main()